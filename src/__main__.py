@@ -0,0 +1,5 @@
+import sys
+
+from src.main import main
+
+sys.exit(main())
@@ -1,6 +1,15 @@
-from typing import Dict, List, Optional, Protocol
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Set, Tuple
 
-from src.domain.stock import Portfolio, Stock, StockAggregate, StockMetrics
+from src.domain.prices import PriceSeries, PriceSummary
+from src.domain.ranking import SectorMedians, StockRank
+from src.domain.stock import Portfolio, Stock, StockAggregate, StockMetrics, StockValuation
+
+
+class AggregationEngineInterface(Protocol):
+
+    def calculate_aggregation(self, stocks: Iterable[Stock]) -> None:
+        ...
 
 
 class PersistenceInterface(Protocol):
@@ -12,6 +21,18 @@ class PersistenceInterface(Protocol):
         ...
 
 
+class RecordReaderInterface(Protocol):
+
+    def read_records(self, filename: str) -> Iterator[Dict[str, str]]:
+        ...
+
+
+class QuoteProviderInterface(Protocol):
+
+    async def fetch_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        ...
+
+
 class RepositoryInterface(Protocol):
 
     def add_stock(self, stock: Stock) -> None:
@@ -20,7 +41,22 @@ class RepositoryInterface(Protocol):
     def add_year_data(self, symbol: str, metrics: StockMetrics) -> None:
         ...
 
-    def get_stocks(self) -> List[Stock]:
+    def add_year_data_batch(self, entries: List[Tuple[str, StockMetrics]]) -> None:
+        ...
+
+    def update_current_price(self, symbol: str, current_price: float) -> None:
+        ...
+
+    def add_prices(self, symbol: str, prices: PriceSeries) -> None:
+        ...
+
+    def get_prices(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> Optional[PriceSeries]:
+        ...
+
+    def save_aggregate_data(self, stocks: List[Stock]) -> None:
+        ...
+
+    def get_stocks(self) -> Iterator[Stock]:
         ...
 
     def get_stock(self, symbol: str) -> Optional[Stock]:
@@ -32,6 +68,27 @@ class RepositoryInterface(Protocol):
     def set_portfolio(self, portfolio: Portfolio) -> None:
         ...
 
+    def get_dirty_years(self) -> Dict[str, Optional[Set[int]]]:
+        ...
+
+    def get_aggregate_version(self) -> int:
+        ...
+
+    def clear_dirty(self) -> None:
+        ...
+
+    def get_sector_symbols(self, sector: str) -> Set[str]:
+        ...
+
+    def find_symbols(self, year: int, source: str, field: str, operator: str, value: float) -> Set[str]:
+        ...
+
+
+class StatsProviderInterface(Protocol):
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        ...
+
 
 class PresenterInterface(Protocol):
 
@@ -41,5 +98,26 @@ class PresenterInterface(Protocol):
     def show_aggregate_data(self, aggregate_data: Dict[int, StockAggregate]) -> None:
         ...
 
-    def show_stock_data(self, stock: Stock) -> None:
+    def show_stock_data(self, stock: Stock, valuation: Optional[StockValuation]) -> None:
+        ...
+
+    def show_valuations(self, stocks: List[Stock], valuations: List[StockValuation]) -> None:
+        ...
+
+    def show_screen_results(self, year: int, stocks: List[Stock], fields: List[Tuple[str, str]]) -> None:
+        ...
+
+    def show_stats(self, stats: Dict[str, Dict[str, Any]]) -> None:
+        ...
+
+    def show_price_data(self, summaries: List[PriceSummary]) -> None:
+        ...
+
+    def show_scenario_comparison(self, year: int, rows: List[Tuple[str, str, Optional[StockAggregate]]]) -> None:
+        ...
+
+    def show_rankings(self, year: int, ranks: List[StockRank]) -> None:
+        ...
+
+    def show_sector_medians(self, year: int, medians: List[SectorMedians]) -> None:
         ...
@@ -0,0 +1,25 @@
+import threading
+from typing import Optional, Tuple
+
+from src.application.interface import RepositoryInterface
+from src.domain.ranking import PortfolioRanking, rank_portfolio
+
+
+class RankingCache:
+    # The ranking of the whole portfolio, kept until the repository's aggregate version moves.
+
+    def __init__(self, repository: RepositoryInterface) -> None:
+        self.repository = repository
+        self.entry: Optional[Tuple[int, PortfolioRanking]] = None
+        # Concurrent queries that find the ranking stale wait for a single rebuild.
+        self.lock = threading.Lock()
+
+    def get_ranking(self) -> PortfolioRanking:
+        version = self.repository.get_aggregate_version()
+        entry = self.entry
+        if entry is None or entry[0] != version:
+            with self.lock:
+                entry = self.entry
+                if entry is None or entry[0] != version:
+                    entry = self.entry = (version, rank_portfolio(self.repository.get_stocks()))
+        return entry[1]
@@ -0,0 +1,197 @@
+import operator
+import re
+from collections import ChainMap
+from dataclasses import dataclass, replace
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from src.application.interface import RepositoryInterface
+from src.application.screen import get_field_value, parse_number
+from src.domain.prices import PriceSeries
+from src.domain.stock import Portfolio, Stock, StockMetrics
+
+# The StockMetrics fields a scenario can change; the ratios follow from them.
+SCENARIO_FIELDS = ('market_capitalization', 'earnings_per_share', 'closing_price', 'book_value_per_share', 'dividend_per_share')
+CHANGE_OPERATORS = {'*=': operator.mul, '+=': operator.add, '-=': operator.sub, '=': lambda _, value: value}
+COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '=': operator.eq, '!=': operator.ne}
+
+CHANGE = re.compile(r'\s*(?P<field>\w+)\s*(?P<operator>\*=|\+=|-=|=)\s*(?P<value>\S+)\s*$')
+AND = re.compile(r'\s+and\s+', re.IGNORECASE)
+
+
+@dataclass
+class Change:
+    field: str
+    operator: str
+    value: float
+
+    def apply(self, metrics: StockMetrics) -> StockMetrics:
+        current = getattr(metrics, self.field)
+        if current is None and self.operator != '=':
+            return metrics
+        return replace(metrics, **{self.field: CHANGE_OPERATORS[self.operator](current, self.value)})
+
+
+def parse_changes(expression: str) -> List[Change]:
+    # Changes such as 'earnings_per_share *= 80% and dividend_per_share = 0'.
+    changes = []
+    for part in AND.split(expression.strip()):
+        match = CHANGE.match(part)
+        if match is None:
+            raise ValueError(f'Expected field *=, +=, -= or = value, got {part.strip()}')
+        if match.group('field') not in SCENARIO_FIELDS:
+            raise ValueError(f'Unknown field: {match.group("field")}, a scenario changes {", ".join(SCENARIO_FIELDS)}')
+        changes.append(Change(match.group('field'), match.group('operator'), parse_number(match.group('value'))))
+    return changes
+
+
+class ScenarioRepository(RepositoryInterface):
+    # A what-if layer over a repository that is never written to. A stock changed in the scenario is
+    # shadowed by a Stock whose year_data is a ChainMap of the changed years over the base stock's own
+    # dict, with copies of its aggregates to recompute; every other stock is the base's own object.
+    # So a scenario costs the changed metrics and the aggregates of the stocks it touches, and any
+    # number of scenarios can sit over the same portfolio.
+
+    def __init__(self, base: RepositoryInterface) -> None:
+        self.base = base
+        self.stocks: Dict[str, Stock] = {}
+        # Symbols of stocks added by the scenario that the base does not have.
+        self.added: Dict[str, None] = {}
+        self.dirty: Dict[str, Optional[Set[int]]] = {}
+        self.aggregate_version = 0
+        self.base_version = base.get_aggregate_version()
+
+    def add_stock(self, stock: Stock) -> None:
+        if self.base.get_stock(stock.symbol) is None:
+            self.added[stock.symbol] = None
+        self.stocks[stock.symbol] = stock
+        self.dirty[stock.symbol] = None
+
+    def add_year_data(self, symbol: str, metrics: StockMetrics) -> None:
+        stock = self._shadow(symbol)
+        if stock is not None:
+            stock.year_data[metrics.year] = metrics
+            years = self.dirty.setdefault(symbol, set())
+            if years is not None:
+                years.add(metrics.year)
+
+    def add_year_data_batch(self, entries: List[Tuple[str, StockMetrics]]) -> None:
+        for symbol, metrics in entries:
+            self.add_year_data(symbol, metrics)
+
+    def update_current_price(self, symbol: str, current_price: float) -> None:
+        stock = self._shadow(symbol)
+        if stock is not None:
+            stock.current_price = current_price
+
+    def add_prices(self, symbol: str, prices: PriceSeries) -> None:
+        stock = self._shadow(symbol)
+        if stock is not None:
+            # A repository may build its stocks without their prices, so an unchanged series is read from the base.
+            current = stock.prices if stock.prices is not None else self.base.get_prices(symbol)
+            merged = PriceSeries.from_arrays(current.days[:], current.prices[:]) if current is not None else PriceSeries()
+            merged.extend(prices.days, prices.prices)
+            stock.prices = merged
+
+    def get_prices(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> Optional[PriceSeries]:
+        stock = self.stocks.get(symbol)
+        if stock is not None and stock.prices is not None:
+            return stock.prices.between(start, end)
+        return self.base.get_prices(symbol, start, end)
+
+    def save_aggregate_data(self, stocks: List[Stock]) -> None:
+        # The aggregates were computed on the shadows, which only the scenario holds.
+        pass
+
+    def get_stocks(self) -> Iterator[Stock]:
+        for stock in self.base.get_stocks():
+            yield self.stocks.get(stock.symbol, stock)
+        for symbol in self.added:
+            yield self.stocks[symbol]
+
+    def get_stock(self, symbol: str) -> Optional[Stock]:
+        stock = self.stocks.get(symbol)
+        return stock if stock is not None else self.base.get_stock(symbol)
+
+    def get_portfolio(self) -> Portfolio:
+        return Portfolio({stock.symbol: stock for stock in self.get_stocks()})
+
+    def set_portfolio(self, portfolio: Portfolio) -> None:
+        raise ValueError('A scenario cannot replace the portfolio')
+
+    def get_dirty_years(self) -> Dict[str, Optional[Set[int]]]:
+        return self.dirty
+
+    def get_aggregate_version(self) -> int:
+        # Both counters only grow, so their sum moves whenever the base or the scenario changes.
+        return self.base.get_aggregate_version() + self.aggregate_version
+
+    def clear_dirty(self) -> None:
+        if self.dirty:
+            self.aggregate_version += 1
+        self.dirty = {}
+
+    def get_sector_symbols(self, sector: str) -> Set[str]:
+        symbols = self.base.get_sector_symbols(sector)
+        symbols.update(symbol for symbol in self.added if self.stocks[symbol].sector.lower() == sector.lower())
+        return symbols
+
+    def find_symbols(self, year: int, source: str, field: str, operator: str, value: float) -> Set[str]:
+        # The base answers for the stocks the scenario leaves alone, the shadows are compared directly.
+        compare = COMPARISONS[operator]
+        symbols = self.base.find_symbols(year, source, field, operator, value) - self.stocks.keys()
+        for stock in self.stocks.values():
+            stock_value = get_field_value(stock, year, source, field)
+            if stock_value is not None and stock_value == stock_value and compare(stock_value, value):
+                symbols.add(stock.symbol)
+        return symbols
+
+    def refresh(self) -> None:
+        # Once the base aggregates changed, the shadows are chained to the current base stocks and
+        # recomputed in full, since the base may have changed any of their years.
+        version = self.base.get_aggregate_version()
+        if version == self.base_version:
+            return
+        for symbol, stock in self.stocks.items():
+            base = self.base.get_stock(symbol)
+            if base is not None and isinstance(stock.year_data, ChainMap):
+                stock.year_data = ChainMap(stock.year_data.maps[0], base.year_data)
+                stock.name, stock.sector = base.name, base.sector
+            self.dirty[symbol] = None
+        self.base_version = version
+
+    def _shadow(self, symbol: str) -> Optional[Stock]:
+        stock = self.stocks.get(symbol)
+        if stock is None:
+            base = self.base.get_stock(symbol)
+            if base is None:
+                return None
+            # The aggregates are recomputed in place, so the shadow gets its own, sharing their statistics
+            # dicts, which the rolling statistics replace rather than update.
+            stock = self.stocks[symbol] = Stock(base.symbol, base.name, base.sector, base.current_price, ChainMap({}, base.year_data),
+                                                {year: replace(aggregate) for year, aggregate in base.aggregate_data.items()},
+                                                base.aggregate_fingerprint, base.prices)
+        return stock
+
+
+class Scenarios:
+    # The named scenarios of a session, all over the same repository.
+
+    def __init__(self, repository: RepositoryInterface) -> None:
+        self.repository = repository
+        self.scenarios: Dict[str, ScenarioRepository] = {}
+
+    def get(self, name: str) -> Optional[ScenarioRepository]:
+        return self.scenarios.get(name)
+
+    def get_or_create(self, name: str) -> ScenarioRepository:
+        scenario = self.scenarios.get(name)
+        if scenario is None:
+            scenario = self.scenarios[name] = ScenarioRepository(self.repository)
+        return scenario
+
+    def remove(self, name: str) -> bool:
+        return self.scenarios.pop(name, None) is not None
+
+    def names(self) -> List[str]:
+        return list(self.scenarios)
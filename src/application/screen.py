@@ -0,0 +1,111 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+from src.domain.stock import Stock
+
+AGGREGATE = 'aggregate'
+METRICS = 'metrics'
+SECTOR = 'sector'
+AGGREGATE_FIELDS = ('earnings_per_share', 'pe_ratio', 'growth', 'price_per_book_value', 'multiplier', 'dividend_yield')
+METRICS_FIELDS = ('market_capitalization', 'earnings_per_share', 'closing_price', 'book_value_per_share', 'dividend_per_share',
+                  'pe_ratio', 'price_per_book_value', 'dividend_yield')
+OPERATORS = ('<=', '>=', '!=', '==', '<', '>', '=')
+
+TOKEN = re.compile(r'\s*(?:(?P<operator><=|>=|!=|==|<|>|=)|(?P<string>"[^"]*"|\'[^\']*\')|(?P<comma>,)|(?P<word>[^\s<>=!,"\']+))')
+
+
+@dataclass
+class Condition:
+    source: str
+    field: str
+    operator: str
+    value: Union[float, str]
+
+
+@dataclass
+class SortKey:
+    source: str
+    field: str
+    descending: bool = False
+
+
+def parse_filter(expression: str) -> List[Condition]:
+    tokens = _tokenize(expression)
+    conditions = []
+    while tokens:
+        name = tokens.pop(0)
+        if not tokens or tokens[0] not in OPERATORS:
+            raise ValueError(f'Expected an operator after {name}')
+        operator = tokens.pop(0)
+        if not tokens:
+            raise ValueError(f'Expected a value after {name} {operator}')
+        value = tokens.pop(0)
+        if name.lower() == SECTOR:
+            if operator not in ('=', '=='):
+                raise ValueError('Sector only supports =')
+            conditions.append(Condition(SECTOR, SECTOR, '=', value.strip('"\'')))
+        else:
+            source, field = parse_field(name)
+            conditions.append(Condition(source, field, '=' if operator == '==' else operator, parse_number(value)))
+        if tokens:
+            if tokens.pop(0).lower() != 'and':
+                raise ValueError('Conditions must be joined with and')
+            if not tokens:
+                raise ValueError('Expected a condition after and')
+    return conditions
+
+
+def parse_sort(expression: str) -> List[SortKey]:
+    keys = []
+    for part in expression.split(','):
+        words = part.split()
+        if not words:
+            continue
+        if len(words) > 2 or (len(words) == 2 and words[1].lower() not in ('asc', 'desc')):
+            raise ValueError(f'Invalid sort key: {part.strip()}')
+        source, field = parse_field(words[0])
+        keys.append(SortKey(source, field, len(words) == 2 and words[1].lower() == 'desc'))
+    return keys
+
+
+def parse_field(name: str) -> Tuple[str, str]:
+    source, _, field = name.rpartition('.')
+    if source == '':
+        source = AGGREGATE if field in AGGREGATE_FIELDS else METRICS
+    if (source == AGGREGATE and field in AGGREGATE_FIELDS) or (source == METRICS and field in METRICS_FIELDS):
+        return source, field
+    raise ValueError(f'Unknown field: {name}')
+
+
+def get_field_value(stock: Stock, year: int, source: str, field: str) -> Optional[float]:
+    data = stock.aggregate_data if source == AGGREGATE else stock.year_data
+    record = data.get(year)
+    if record is None:
+        return None
+    try:
+        return getattr(record, field)
+    except ZeroDivisionError:
+        return None
+
+
+def _tokenize(expression: str) -> List[str]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if match is None or match.group('comma'):
+            raise ValueError(f'Unexpected input at: {expression[position:]}')
+        tokens.append(match.group(match.lastgroup))
+        position = match.end()
+    return tokens
+
+
+def parse_number(value: str) -> float:
+    try:
+        if value.endswith('%'):
+            return float(value[:-1]) / 100
+        return float(value)
+    except ValueError:
+        raise ValueError(f'Invalid number: {value}') from None
@@ -1,6 +1,22 @@
-from prettytable import PrettyTable
-from src.domain.stock import Stock, StockMetrics
-from src.application.interface import PersistenceInterface, PresenterInterface, RepositoryInterface
+import math
+import time
+from array import array
+from dataclasses import replace
+from datetime import date
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+from src.domain.prices import PriceSeries, PriceSummary
+from src.domain.rolling import RollingWindow, calculate_rolling_statistics, stored_windows
+from src.domain.stock import Stock, StockAggregate, StockMetrics
+from src.application.ranking import RankingCache
+from src.application.scenario import ScenarioRepository, Scenarios, parse_changes
+from src.application.screen import AGGREGATE, AGGREGATE_FIELDS, SECTOR, Condition, get_field_value, parse_filter, parse_sort
+from src.application.valuation import ValuationCache
+from src.application.interface import AggregationEngineInterface, PersistenceInterface, PresenterInterface, QuoteProviderInterface, RecordReaderInterface, RepositoryInterface, StatsProviderInterface
+
+# Stocks whose aggregates are computed and saved together, so a recalculation holds at most this many
+# stocks in memory whatever the number of dirty ones.
+CHUNK_SIZE = 500
 
 
 class CreateStockUseCase:
@@ -26,12 +42,51 @@ class AddStockYearDataUseCase:
 
 class CalculateAggregateDataUseCase:
 
-    def __init__(self, repository: RepositoryInterface) -> None:
+    def __init__(self, repository: RepositoryInterface, engine: Optional[AggregationEngineInterface] = None,
+                 windows: Optional[List[RollingWindow]] = None) -> None:
         self.repository = repository
+        self.engine = engine
+        # Rolling windows to compute; None keeps the windows each stock's aggregates already carry.
+        self.windows = windows
 
     def execute(self) -> None:
-        for stock in self.repository.get_stocks():
-            stock.calculate_aggregation()
+        pending: List[Tuple[Stock, Optional[Set[int]]]] = []
+        for symbol, years in self.repository.get_dirty_years().items():
+            stock = self.repository.get_stock(symbol)
+            if stock is None:
+                continue
+            pending.append((stock, years))
+            if len(pending) == CHUNK_SIZE:
+                self._calculate(pending)
+                pending = []
+        self._calculate(pending)
+        self.repository.clear_dirty()
+
+    def _calculate(self, pending: List[Tuple[Stock, Optional[Set[int]]]]) -> None:
+        full = []
+        updated = []
+        windows: Dict[str, List[RollingWindow]] = {}
+        fingerprints: Dict[str, str] = {}
+        for stock, years in pending:
+            symbol = stock.symbol
+            windows[symbol] = self.windows if self.windows is not None else stored_windows(stock)
+            fingerprints[symbol] = stock.calculate_fingerprint(window.name for window in windows[symbol])
+            if fingerprints[symbol] == stock.aggregate_fingerprint:
+                # Unchanged since the aggregates were computed, e.g. a stock added again as it was.
+                continue
+            if years is None and self.engine is not None:
+                full.append(stock)
+            else:
+                stock.update_aggregation(years)
+                updated.append(stock)
+        if full:
+            self.engine.calculate_aggregation(full)
+        for stock in updated + full:
+            if windows[stock.symbol] or self.windows is not None:
+                calculate_rolling_statistics(stock, windows[stock.symbol])
+            stock.aggregate_fingerprint = fingerprints[stock.symbol]
+        if updated or full:
+            self.repository.save_aggregate_data(updated + full)
 
 
 class GetStockYearDataUseCase:
@@ -62,15 +117,132 @@ class GetStockAggregateDataUseCase:
 
 class GetStockCurrentDataUseCase:
 
-    def __init__(self, repository: RepositoryInterface, presenter: PresenterInterface) -> None:
+    def __init__(self, repository: RepositoryInterface, presenter: PresenterInterface, valuations: ValuationCache) -> None:
         self.repository = repository
         self.presenter = presenter
+        self.valuations = valuations
 
     def execute(self, symbol: str) -> None:
         stock = self.repository.get_stock(symbol)
         if stock is None:
             return
-        self.presenter.show_stock_data(stock)
+        self.presenter.show_stock_data(stock, self.valuations.get_valuation(symbol))
+
+
+class GetPortfolioValuationUseCase:
+
+    def __init__(self, repository: RepositoryInterface, presenter: PresenterInterface, valuations: ValuationCache) -> None:
+        self.repository = repository
+        self.presenter = presenter
+        self.valuations = valuations
+
+    def execute(self) -> int:
+        valuations = self.valuations.get_valuations()
+        stocks = [stock for stock in self.repository.get_stocks() if stock.symbol in valuations]
+        self.presenter.show_valuations(stocks, [valuations[stock.symbol] for stock in stocks])
+        return len(stocks)
+
+
+class UpdateCurrentPricesUseCase:
+    # Quotes are fetched in batches of batch_size with at most concurrency requests in flight. Symbols
+    # fetched less than ttl seconds ago are skipped, and a failing batch is retried with exponential backoff.
+    # asyncio is imported where it is used, it is only worth its import time once prices are refreshed.
+
+    def __init__(self, repository: RepositoryInterface, provider: QuoteProviderInterface, batch_size: int = 100,
+                 concurrency: int = 8, ttl: float = 60.0, retries: int = 2, retry_delay: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.repository = repository
+        self.provider = provider
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.fetched: Dict[str, float] = {}
+        self.failed: List[str] = []
+
+    def execute(self, symbols: Optional[List[str]] = None) -> int:
+        import asyncio
+        return asyncio.run(self.refresh(symbols))
+
+    async def refresh(self, symbols: Optional[List[str]] = None) -> int:
+        import asyncio
+        now = self.clock()
+        if symbols is None:
+            symbols = [stock.symbol for stock in self.repository.get_stocks()]
+        stale = [symbol for symbol in dict.fromkeys(symbols) if now - self.fetched.get(symbol, -math.inf) >= self.ttl]
+        batches = [stale[start:start + self.batch_size] for start in range(0, len(stale), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._fetch(batch, semaphore) for batch in batches))
+        self.failed = []
+        updated = 0
+        for batch, quotes in zip(batches, results):
+            for symbol in batch:
+                stock = self.repository.get_stock(symbol)
+                current_price = quotes.get(symbol)
+                if stock is None or current_price is None:
+                    self.failed.append(symbol)
+                    continue
+                self.fetched[symbol] = now
+                if stock.current_price != current_price:
+                    self.repository.update_current_price(symbol, current_price)
+                updated += 1
+        return updated
+
+    async def _fetch(self, batch: List[str], semaphore: 'asyncio.Semaphore') -> Dict[str, float]:
+        import asyncio
+        for attempt in range(self.retries + 1):
+            try:
+                async with semaphore:
+                    return await self.provider.fetch_quotes(batch)
+            except (OSError, ValueError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    return {}
+            await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        return {}
+
+
+class ScreenStocksUseCase:
+
+    def __init__(self, repository: RepositoryInterface, presenter: PresenterInterface) -> None:
+        self.repository = repository
+        self.presenter = presenter
+
+    def execute(self, year: int, filter_expression: str, sort_expression: str = '', limit: Optional[int] = None) -> None:
+        conditions = parse_filter(filter_expression)
+        sort_keys = parse_sort(sort_expression)
+        candidates = find_candidates(self.repository, year, conditions)
+        if candidates is None:
+            stocks = list(self.repository.get_stocks())
+        else:
+            stocks = [self.repository.get_stock(symbol) for symbol in sorted(candidates)]
+        # Only stocks with aggregates for the year, whichever way they were found.
+        stocks = [stock for stock in stocks if stock is not None and year in stock.aggregate_data]
+        stocks.sort(key=lambda stock: stock.symbol)
+        for key in reversed(sort_keys):
+            values = [(get_field_value(stock, year, key.source, key.field), stock) for stock in stocks]
+            present = [entry for entry in values if entry[0] is not None and entry[0] == entry[0]]
+            present.sort(key=lambda entry: entry[0], reverse=key.descending)
+            stocks = [entry[1] for entry in present] + [stock for value, stock in values if value is None or value != value]
+        if limit is not None:
+            stocks = stocks[:limit]
+
+        fields = [(AGGREGATE, field) for field in AGGREGATE_FIELDS]
+        for source, field in [(condition.source, condition.field) for condition in conditions] + [(key.source, key.field) for key in sort_keys]:
+            if source != SECTOR and (source, field) not in fields:
+                fields.append((source, field))
+        self.presenter.show_screen_results(year, stocks, fields)
+
+
+class ShowStatsUseCase:
+
+    def __init__(self, stats_provider: StatsProviderInterface, presenter: PresenterInterface) -> None:
+        self.stats_provider = stats_provider
+        self.presenter = presenter
+
+    def execute(self) -> None:
+        self.presenter.show_stats(self.stats_provider.to_dict())
 
 
 class SavePortfolioUseCase:
@@ -91,3 +263,270 @@ class LoadPortfolioUseCase:
 
     def execute(self, filename: str) -> None:
         self.repository.set_portfolio(self.persistence.load_portfolio(filename))
+
+
+class BulkImportUseCase:
+
+    def __init__(self, repository: RepositoryInterface, persistence: PersistenceInterface, reader: RecordReaderInterface,
+                 batch_size: int = 1000) -> None:
+        self.repository = repository
+        self.persistence = persistence
+        self.reader = reader
+        self.batch_size = batch_size
+
+    def execute(self, import_filename: str, filename: Optional[str] = None, checkpoint_interval: Optional[int] = None) -> int:
+        records = self._parse_records(self.reader.read_records(import_filename))
+        imported = 0
+        checkpoint = 0
+        # Symbols known to be in the repository, so each is looked up once.
+        known: Set[str] = set()
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                return imported
+            self._check_symbols(batch, known)
+            self._add_batch([record for _, record in batch])
+            imported += len(batch)
+            if filename is not None and checkpoint_interval and imported - checkpoint >= checkpoint_interval:
+                self.persistence.save_portfolio(filename, self.repository.get_portfolio())
+                checkpoint = imported
+
+    def _parse_records(self, records: Iterator[Dict[str, Any]]) -> Iterator[Tuple[int, Union[Stock, Tuple[str, StockMetrics]]]]:
+        for line, record in enumerate(records, start=1):
+            try:
+                symbol = self._required(record, 'symbol')
+                if self._is_blank(record.get('year')):
+                    yield line, Stock(symbol, self._required(record, 'name'), self._required(record, 'sector'),
+                                      float(self._required(record, 'current_price')))
+                else:
+                    yield line, (symbol, StockMetrics(int(self._required(record, 'year')),
+                                                    self._optional_float(record, 'market_capitalization'),
+                                                    float(self._required(record, 'earnings_per_share')),
+                                                    float(self._required(record, 'closing_price')),
+                                                    self._optional_float(record, 'book_value_per_share'),
+                                                    float(self._required(record, 'dividend_per_share'))))
+            except ValueError as error:
+                raise ValueError(f'Record {line}: {error}') from error
+
+    def _check_symbols(self, batch: List[Tuple[int, Union[Stock, Tuple[str, StockMetrics]]]], known: Set[str]) -> None:
+        # Year data needs its stock, defined in the repository or by an earlier record. The whole batch
+        # is checked before any of it is added, as it is for malformed records.
+        for line, record in batch:
+            if isinstance(record, Stock):
+                known.add(record.symbol)
+            elif record[0] not in known:
+                if self.repository.get_stock(record[0]) is None:
+                    raise ValueError(f'Record {line}: unknown symbol {record[0]}')
+                known.add(record[0])
+
+    def _add_batch(self, batch: List[Union[Stock, Tuple[str, StockMetrics]]]) -> None:
+        entries: List[Tuple[str, StockMetrics]] = []
+        for record in batch:
+            if isinstance(record, Stock):
+                self.repository.add_year_data_batch(entries)
+                entries = []
+                existing = self.repository.get_stock(record.symbol)
+                if existing is not None:
+                    # A redefinition sets the name, sector and current price and keeps the rest, the
+                    # daily prices read separately since get_stock leaves them out.
+                    record.year_data = existing.year_data
+                    record.aggregate_data = existing.aggregate_data
+                    record.aggregate_fingerprint = existing.aggregate_fingerprint
+                    record.prices = self.repository.get_prices(record.symbol)
+                self.repository.add_stock(record)
+            else:
+                entries.append(record)
+        self.repository.add_year_data_batch(entries)
+
+    def _required(self, record: Dict[str, Any], name: str) -> Any:
+        value = record.get(name)
+        if self._is_blank(value):
+            raise ValueError(f'missing {name}')
+        return value
+
+    def _optional_float(self, record: Dict[str, Any], name: str) -> Optional[float]:
+        value = record.get(name)
+        return None if self._is_blank(value) else float(value)
+
+    def _is_blank(self, value: Any) -> bool:
+        return value is None or (isinstance(value, str) and value.strip() == '')
+
+
+class AddDailyPricesUseCase:
+    # Adds daily closing prices to a stock's price series and, for each year they fall in that the
+    # stock has year data for, sets the year's closing price to the last price of that year, like
+    # add_stock_year_data with the other values unchanged would.
+
+    def __init__(self, repository: RepositoryInterface) -> None:
+        self.repository = repository
+
+    def execute(self, symbol: str, prices: PriceSeries) -> List[PriceSummary]:
+        self.repository.add_prices(symbol, prices)
+        years = prices.years()
+        if not years:
+            return []
+        stock = self.repository.get_stock(symbol)
+        # Only the years the new prices fall in are read back.
+        series = self.repository.get_prices(symbol, date(years[0], 1, 1), date(years[-1], 12, 31))
+        if stock is None or not series:
+            return []
+        summaries = series.summarize(years)
+        self.repository.add_year_data_batch([(symbol, replace(stock.year_data[summary.year], closing_price=summary.close))
+                                             for summary in summaries
+                                             if summary.year in stock.year_data and stock.year_data[summary.year].closing_price != summary.close])
+        return summaries
+
+
+class ImportDailyPricesUseCase:
+    # Reads symbol, date (ISO) and close columns, collects each symbol's prices in arrays and adds
+    # them with one AddDailyPricesUseCase call per symbol.
+
+    def __init__(self, repository: RepositoryInterface, reader: RecordReaderInterface) -> None:
+        self.reader = reader
+        self.add_daily_prices_use_case = AddDailyPricesUseCase(repository)
+
+    def execute(self, import_filename: str) -> int:
+        columns: Dict[str, Tuple[array, array]] = {}
+        imported = 0
+        for line, record in enumerate(self.reader.read_records(import_filename), start=1):
+            try:
+                symbol = self._required(record, 'symbol')
+                day = date.fromisoformat(str(self._required(record, 'date'))).toordinal()
+                price = float(self._required(record, 'close'))
+            except ValueError as error:
+                raise ValueError(f'Record {line}: {error}') from error
+            days, prices = columns.setdefault(symbol, (array('i'), array('d')))
+            days.append(day)
+            prices.append(price)
+            imported += 1
+        for symbol, (days, prices) in columns.items():
+            self.add_daily_prices_use_case.execute(symbol, PriceSeries(days, prices))
+        return imported
+
+    def _required(self, record: Dict[str, Any], name: str) -> Any:
+        value = record.get(name)
+        if value is None or (isinstance(value, str) and value.strip() == ''):
+            raise ValueError(f'missing {name}')
+        return value
+
+
+class GetStockPriceDataUseCase:
+
+    def __init__(self, repository: RepositoryInterface, presenter: PresenterInterface) -> None:
+        self.repository = repository
+        self.presenter = presenter
+
+    def execute(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> None:
+        prices = self.repository.get_prices(symbol, start, end)
+        if not prices:
+            return
+        self.presenter.show_price_data(prices.summarize())
+
+
+class ApplyScenarioUseCase:
+    # Changes the year data of the stocks matching a filter in a named scenario, created on first use,
+    # and recomputes the aggregates of just those stocks there. Changes to a scenario build on each
+    # other, and the stocks are selected by their values in the portfolio itself.
+
+    def __init__(self, repository: RepositoryInterface, scenarios: Scenarios) -> None:
+        self.repository = repository
+        self.scenarios = scenarios
+
+    def execute(self, name: str, year: int, changes_expression: str, filter_expression: str = '') -> int:
+        changes = parse_changes(changes_expression)
+        candidates = find_candidates(self.repository, year, parse_filter(filter_expression))
+        symbols = [stock.symbol for stock in self.repository.get_stocks()] if candidates is None else sorted(candidates)
+        scenario = self.scenarios.get_or_create(name)
+        scenario.refresh()
+        entries = []
+        for symbol in symbols:
+            stock = scenario.get_stock(symbol)
+            metrics = stock.year_data.get(year) if stock is not None else None
+            if metrics is None:
+                continue
+            for change in changes:
+                metrics = change.apply(metrics)
+            entries.append((symbol, metrics))
+        scenario.add_year_data_batch(entries)
+        calculate_scenario(scenario)
+        return len(entries)
+
+
+class CompareScenariosUseCase:
+    # The aggregates of a year of every stock the given scenarios (all by default) change, in the
+    # portfolio and in each scenario.
+
+    def __init__(self, repository: RepositoryInterface, scenarios: Scenarios, presenter: PresenterInterface) -> None:
+        self.repository = repository
+        self.scenarios = scenarios
+        self.presenter = presenter
+
+    def execute(self, year: int, names: Optional[List[str]] = None) -> int:
+        selected = []
+        for name in names or self.scenarios.names():
+            scenario = self.scenarios.get(name)
+            if scenario is None:
+                raise ValueError(f'Unknown scenario: {name}')
+            scenario.refresh()
+            calculate_scenario(scenario)
+            selected.append((name, scenario))
+        rows: List[Tuple[str, str, Optional[StockAggregate]]] = []
+        for symbol in sorted({symbol for _, scenario in selected for symbol in scenario.stocks}):
+            for name, repository in [('base', self.repository)] + selected:
+                stock = repository.get_stock(symbol)
+                rows.append((symbol, name, stock.aggregate_data.get(year) if stock is not None else None))
+        self.presenter.show_scenario_comparison(year, rows)
+        return len(rows)
+
+
+class DropScenarioUseCase:
+
+    def __init__(self, scenarios: Scenarios) -> None:
+        self.scenarios = scenarios
+
+    def execute(self, name: str) -> bool:
+        return self.scenarios.remove(name)
+
+
+class RankPortfolioUseCase:
+    # Percentile ranks and composite scores of the stocks for a year, best score first, and the
+    # sector medians, optionally for one sector. All years are ranked at once and kept until the
+    # aggregates change, so asking for another year or sector costs no more than the output.
+
+    def __init__(self, repository: RepositoryInterface, presenter: PresenterInterface) -> None:
+        self.presenter = presenter
+        self.rankings = RankingCache(repository)
+
+    def execute(self, year: int, sector: Optional[str] = None, limit: Optional[int] = None) -> int:
+        ranking = self.rankings.get_ranking()
+        ranks = list(ranking.ranks.get(year, {}).values())
+        medians = list(ranking.medians.get(year, {}).values())
+        if sector:
+            ranks = [rank for rank in ranks if rank.sector.lower() == sector.lower()]
+            medians = [entry for entry in medians if entry.sector.lower() == sector.lower()]
+        ranks.sort(key=lambda rank: rank.symbol)
+        ranks.sort(key=lambda rank: -rank.score if rank.score is not None else math.inf)
+        if limit is not None:
+            ranks = ranks[:limit]
+        self.presenter.show_rankings(year, ranks)
+        self.presenter.show_sector_medians(year, sorted(medians, key=lambda entry: entry.sector))
+        return len(ranks)
+
+
+def find_candidates(repository: RepositoryInterface, year: int, conditions: List[Condition]) -> Optional[Set[str]]:
+    # The symbols matching all conditions, None without conditions.
+    candidates = None
+    for condition in conditions:
+        if condition.source == SECTOR:
+            symbols = repository.get_sector_symbols(condition.value)
+        else:
+            symbols = repository.find_symbols(year, condition.source, condition.field, condition.operator, condition.value)
+        candidates = symbols if candidates is None else candidates & symbols
+        if not candidates:
+            break
+    return candidates
+
+
+def calculate_scenario(scenario: ScenarioRepository) -> None:
+    if scenario.get_dirty_years():
+        CalculateAggregateDataUseCase(scenario).execute()
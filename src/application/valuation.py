@@ -0,0 +1,54 @@
+import threading
+from typing import Dict, Optional, Tuple
+from src.application.interface import RepositoryInterface
+from src.domain.stock import Stock, StockValuation
+
+
+class ValuationCache:
+    # Valuations of the whole portfolio, kept until the aggregates change (the repository's aggregate
+    # version moves) or a stock differs from the one its valuation was computed from, so a price refresh
+    # only recomputes the stocks whose price moved. A stock is compared by its current price and the
+    # fingerprint of its aggregates, which also tells a replaced stock from the one it replaced.
+
+    def __init__(self, repository: RepositoryInterface) -> None:
+        self.repository = repository
+        self.version: Optional[int] = None
+        self.entries: Dict[str, Tuple[Optional[float], Optional[str], Optional[StockValuation]]] = {}
+        # Held while the entries are checked and filled, which concurrent queries would otherwise race on.
+        self.lock = threading.Lock()
+
+    def get_valuations(self) -> Dict[str, StockValuation]:
+        with self.lock:
+            self._check_version()
+            # Rebuilt from the stocks there are now, which drops the entries of removed ones.
+            entries = {}
+            valuations = {}
+            for stock in self.repository.get_stocks():
+                entry = entries[stock.symbol] = self._entry(stock)
+                if entry[2] is not None:
+                    valuations[stock.symbol] = entry[2]
+            self.entries = entries
+            return valuations
+
+    def get_valuation(self, symbol: str) -> Optional[StockValuation]:
+        # Checks or fills the entry of a single stock.
+        with self.lock:
+            self._check_version()
+            stock = self.repository.get_stock(symbol)
+            if stock is None:
+                self.entries.pop(symbol, None)
+                return None
+            entry = self.entries[symbol] = self._entry(stock)
+            return entry[2]
+
+    def _check_version(self) -> None:
+        version = self.repository.get_aggregate_version()
+        if version != self.version:
+            self.entries = {}
+            self.version = version
+
+    def _entry(self, stock: Stock) -> Tuple[Optional[float], Optional[str], Optional[StockValuation]]:
+        entry = self.entries.get(stock.symbol)
+        if entry is None or entry[0] != stock.current_price or entry[1] != stock.aggregate_fingerprint:
+            entry = (stock.current_price, stock.aggregate_fingerprint, stock.calculate_valuation())
+        return entry
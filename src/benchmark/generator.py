@@ -0,0 +1,25 @@
+import random
+from typing import Optional
+
+from src.domain.stock import Portfolio, Stock, StockMetrics
+
+SECTORS = ('Energy', 'Financials', 'Health Care', 'Industrials', 'Materials', 'Technology', 'Utilities')
+
+
+def generate_portfolio(stocks: int, years: int, seed: int = 0, last_year: int = 2023) -> Portfolio:
+    generator = random.Random(seed)
+    portfolio = Portfolio()
+    for index in range(stocks):
+        symbol = f'S{index:05d}'
+        stock = Stock(symbol, f'Synthetic {index}', generator.choice(SECTORS), round(generator.uniform(5, 300), 2))
+        price = generator.uniform(5, 300)
+        earnings_per_share = price / generator.uniform(5, 30)
+        for year in range(last_year - years + 1, last_year + 1):
+            price = max(0.5, price * generator.uniform(0.7, 1.4))
+            earnings_per_share = earnings_per_share * generator.uniform(0.6, 1.5) if generator.random() > 0.05 else -abs(earnings_per_share)
+            book_value_per_share: Optional[float] = price / generator.uniform(0.5, 6) if generator.random() > 0.05 else None
+            stock.year_data[year] = StockMetrics(year, round(price * generator.uniform(0.01, 2), 3), round(earnings_per_share, 2),
+                                                 round(price, 2), book_value_per_share and round(book_value_per_share, 2),
+                                                 round(price * generator.uniform(0, 0.08), 2))
+        portfolio.stocks[symbol] = stock
+    return portfolio
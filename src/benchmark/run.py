@@ -0,0 +1,175 @@
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from src.application.screen import AGGREGATE, AGGREGATE_FIELDS
+from src.application.stock_interactor import CalculateAggregateDataUseCase
+from src.benchmark.generator import generate_portfolio
+from src.domain.stock import Portfolio
+from src.infrastructure.aggregation import NumpyAggregationEngine
+from src.infrastructure.json_coder import StockEncoder, decode_stock, portfolio_from_dict
+from src.infrastructure.persistence import BinaryPersistence, JSONPersistence
+from src.infrastructure.presenter import Presenter
+from src.infrastructure.repository import InMemoryRepository
+from src.infrastructure.view import CliView
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    seconds: float
+    rows: int
+    peak_memory: int
+
+    @property
+    def throughput(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float('inf')
+
+
+@dataclass
+class Benchmark:
+    name: str
+    rows: int
+    run: Callable[[], None]
+    setup: Optional[Callable[[], None]] = None
+
+
+def create_benchmarks(portfolio: Portfolio, directory: str) -> List[Benchmark]:
+    stocks = list(portfolio.stocks.values())
+    year_rows = sum(len(stock.year_data) for stock in stocks)
+    aggregated = copy.deepcopy(portfolio)
+    for stock in aggregated.stocks.values():
+        stock.calculate_aggregation()
+    repository = InMemoryRepository(aggregated)
+    json_filename = os.path.join(directory, 'portfolio.json')
+    binary_filename = os.path.join(directory, 'portfolio.bin')
+    encoded = json.dumps(aggregated, cls=StockEncoder)
+    presenter = Presenter(CliView())
+    last_year = max((year for stock in stocks for year in stock.year_data), default=0)
+    screen_fields = [(AGGREGATE, field) for field in AGGREGATE_FIELDS]
+
+    def save_json() -> None:
+        JSONPersistence().save_portfolio(json_filename, aggregated)
+
+    def save_binary() -> None:
+        BinaryPersistence().save_portfolio(binary_filename, aggregated)
+
+    def show_year_data() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for stock in aggregated.stocks.values():
+                presenter.show_year_data(list(stock.year_data.values()))
+
+    def show_aggregate_data() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for stock in aggregated.stocks.values():
+                presenter.show_aggregate_data(list(stock.aggregate_data.values()))
+
+    def show_screen_results(output_format: str) -> Callable[[], None]:
+        screened = list(aggregated.stocks.values())
+        return lambda: Presenter(CliView(output_format, output=io.StringIO())).show_screen_results(last_year, screened, screen_fields)
+
+    benchmarks = [
+        Benchmark('stock.calculate_aggregation', year_rows, lambda: [stock.calculate_aggregation() for stock in stocks]),
+        Benchmark('use_case.calculate_aggregate', year_rows, lambda: CalculateAggregateDataUseCase(repository).execute(),
+                  lambda: repository.set_portfolio(aggregated)),
+    ]
+    try:
+        engine = NumpyAggregationEngine()
+        benchmarks.append(Benchmark('use_case.calculate_aggregate[numpy]', year_rows,
+                                    lambda: CalculateAggregateDataUseCase(repository, engine).execute(),
+                                    lambda: repository.set_portfolio(aggregated)))
+    except ImportError:
+        pass
+    benchmarks += [
+        Benchmark('json.save', year_rows, save_json),
+        Benchmark('json.load', year_rows, lambda: JSONPersistence().load_portfolio(json_filename), save_json),
+        Benchmark('json.decode_stock', year_rows, lambda: json.loads(encoded, object_hook=decode_stock)),
+        Benchmark('json.decode', year_rows, lambda: portfolio_from_dict(json.loads(encoded))),
+        Benchmark('binary.save', year_rows, save_binary),
+        Benchmark('binary.load', year_rows, lambda: BinaryPersistence().load_portfolio(binary_filename), save_binary),
+        Benchmark('presenter.show_year_data', year_rows, show_year_data),
+        Benchmark('presenter.show_aggregate_data', year_rows, show_aggregate_data),
+        Benchmark('presenter.show_screen_results[table]', len(stocks), show_screen_results('table')),
+        Benchmark('presenter.show_screen_results[tsv]', len(stocks), show_screen_results('tsv')),
+    ]
+    return benchmarks
+
+
+def measure(benchmark: Benchmark, repeat: int) -> BenchmarkResult:
+    best = float('inf')
+    for _ in range(repeat):
+        if benchmark.setup is not None:
+            benchmark.setup()
+        start = time.perf_counter()
+        benchmark.run()
+        best = min(best, time.perf_counter() - start)
+    if benchmark.setup is not None:
+        benchmark.setup()
+    tracemalloc.start()
+    try:
+        benchmark.run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(benchmark.name, best, benchmark.rows, peak_memory)
+
+
+def run_benchmarks(stocks: int, years: int, repeat: int = 3, only: Optional[List[str]] = None) -> List[BenchmarkResult]:
+    portfolio = generate_portfolio(stocks, years)
+    with tempfile.TemporaryDirectory() as directory:
+        return [measure(benchmark, repeat) for benchmark in create_benchmarks(portfolio, directory)
+                if not only or any(name in benchmark.name for name in only)]
+
+
+def find_regressions(results: List[BenchmarkResult], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    return [result.name for result in results
+            if result.name in baseline and result.seconds > baseline[result.name] * (1 + tolerance)]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Times the aggregation, persistence and rendering hot paths on a synthetic portfolio')
+    parser.add_argument('--stocks', type=int, default=500)
+    parser.add_argument('--years', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='*', help='run only benchmarks whose name contains one of these strings')
+    parser.add_argument('--baseline', help='JSON file with the baseline seconds per benchmark')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.stocks, args.years, args.repeat, args.only)
+    baseline: Dict[str, float] = {}
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as baseline_file:
+            stored = json.load(baseline_file)
+        if (stored['stocks'], stored['years']) == (args.stocks, args.years):
+            baseline = stored['seconds']
+        else:
+            print(f'Baseline was recorded for {stored["stocks"]} stocks x {stored["years"]} years, not comparing')
+    regressions = find_regressions(results, baseline, args.tolerance)
+
+    print(f'{args.stocks} stocks x {args.years} years')
+    print(f'{"Benchmark":<40}{"Seconds":>10}{"Rows/s":>14}{"Peak MiB":>10}{"Baseline":>10}')
+    for result in results:
+        reference = f'{baseline[result.name]:.4f}' if result.name in baseline else '-'
+        flag = '  REGRESSION' if result.name in regressions else ''
+        print(f'{result.name:<40}{result.seconds:>10.4f}{result.throughput:>14,.0f}{result.peak_memory / 2 ** 20:>10.1f}{reference:>10}{flag}')
+
+    if args.save_baseline and args.baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({'stocks': args.stocks, 'years': args.years, 'seconds': {result.name: result.seconds for result in results}},
+                      baseline_file, indent=4)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Modules a plain script run without options must not import; each is only needed by some commands or options.
+DEFERRED_MODULES = ('numpy', 'prettytable', 'asyncio', 'sqlite3', 'http.server', 'cProfile', 'pstats')
+IMPORTED_MODULES = '''
+import io, sys
+from src.main import main
+sys.stdin = io.StringIO({script!r})
+main({arguments!r})
+print('imported:' + ','.join(name for name in {modules!r} if name in sys.modules))
+'''
+
+
+def measure_startup(arguments: List[str], script: str = '', repeat: int = 5) -> float:
+    # Best wall time of running the program in a fresh interpreter with the script on stdin.
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'src'] + arguments, input=script, text=True, capture_output=True, check=True, cwd=ROOT)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_interpreter(repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True, cwd=ROOT)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def find_deferred_imports(arguments: List[str], script: str = '') -> List[str]:
+    code = IMPORTED_MODULES.format(script=script, arguments=arguments + ['--script', '-'], modules=DEFERRED_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], text=True, capture_output=True, check=True, cwd=ROOT)
+    imported = result.stdout.rpartition('imported:')[2].strip()
+    return imported.split(',') if imported else []
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Times the start of a script run in a fresh interpreter against a budget')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=0.25, help='maximum seconds for an empty script run')
+    parser.add_argument('--script', default='', help='commands to run, e.g. "help"')
+    parser.add_argument('arguments', nargs='*', help='options passed to the program, after --')
+    args = parser.parse_args(argv)
+
+    timings: Dict[str, float] = {
+        'interpreter': measure_interpreter(args.repeat),
+        'startup': measure_startup(args.arguments + ['--script', '-'], args.script, args.repeat),
+    }
+    deferred = find_deferred_imports(args.arguments, args.script)
+    for name, seconds in timings.items():
+        print(f'{name:<20}{seconds:>10.4f}')
+    over_budget = timings['startup'] > args.budget
+    print(f'{"budget":<20}{args.budget:>10.4f}' + ('  OVER BUDGET' if over_budget else ''))
+    if deferred:
+        print(f'Imported at startup: {", ".join(deferred)}')
+    return 1 if over_budget or (deferred and not args.arguments) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import operator
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+@dataclass(slots=True)
+class PriceSummary:
+    year: int
+    close: float
+    average: float
+    low: float
+    high: float
+    days: int
+
+
+class PriceSeries:
+    # Daily closing prices in two parallel arrays: the days as ascending date ordinals (int32) and the
+    # prices as float64, 12 bytes a day instead of a date and a float object. A range of days is a
+    # slice found by bisection, and the summaries reduce whole slices with the C builtins.
+    __slots__ = ('days', 'prices')
+
+    def __init__(self, days: Iterable[int] = (), prices: Iterable[float] = ()) -> None:
+        self.days = array('i')
+        self.prices = array('d')
+        self.extend(days, prices)
+
+    def extend(self, days: Iterable[int], prices: Iterable[float]) -> None:
+        # Appends in bulk; a day that is already in the series gets the new price.
+        days = array('i', days)
+        prices = array('d', prices)
+        if len(days) != len(prices):
+            raise ValueError(f'{len(days)} days but {len(prices)} prices')
+        if not days:
+            return
+        if (not self.days or days[0] > self.days[-1]) and all(map(operator.lt, days, islice(days, 1, None))):
+            self.days.extend(days)
+            self.prices.extend(prices)
+            return
+        merged = dict(zip(self.days, self.prices))
+        merged.update(zip(days, prices))
+        ordered = sorted(merged)
+        self.days = array('i', ordered)
+        self.prices = array('d', map(merged.__getitem__, ordered))
+
+    @classmethod
+    def from_arrays(cls, days: array, prices: array) -> 'PriceSeries':
+        # Takes over arrays that are already in order, without checking or copying them.
+        series = cls()
+        series.days = days
+        series.prices = prices
+        return series
+
+    def between(self, start: Optional[date] = None, end: Optional[date] = None) -> 'PriceSeries':
+        # The days from start to end, both included; None leaves that side open.
+        first, last = self._bounds(start, end)
+        return PriceSeries.from_arrays(self.days[first:last], self.prices[first:last])
+
+    def years(self) -> List[int]:
+        if not self.days:
+            return []
+        return list(range(date.fromordinal(self.days[0]).year, date.fromordinal(self.days[-1]).year + 1))
+
+    def summarize(self, years: Optional[Iterable[int]] = None) -> List[PriceSummary]:
+        # One summary per year with prices, the close being the price of the last day of the year.
+        summaries = []
+        for year in sorted(set(years)) if years is not None else self.years():
+            first, last = self._bounds(date(year, 1, 1), date(year, 12, 31))
+            if first == last:
+                continue
+            prices = self.prices[first:last]
+            summaries.append(PriceSummary(year, prices[-1], sum(prices) / len(prices), min(prices), max(prices), len(prices)))
+        return summaries
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __iter__(self) -> Iterator[Tuple[date, float]]:
+        return zip(map(date.fromordinal, self.days), self.prices)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PriceSeries):
+            return NotImplemented
+        return self.days == other.days and self.prices == other.prices
+
+    def __repr__(self) -> str:
+        if not self.days:
+            return 'PriceSeries()'
+        return f'PriceSeries({len(self)} days from {date.fromordinal(self.days[0])} to {date.fromordinal(self.days[-1])})'
+
+    def _bounds(self, start: Optional[date], end: Optional[date]) -> Tuple[int, int]:
+        first = 0 if start is None else bisect_left(self.days, start.toordinal())
+        last = len(self.days) if end is None else bisect_right(self.days, end.toordinal())
+        return first, max(first, last)
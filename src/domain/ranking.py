@@ -0,0 +1,129 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.domain.stock import Stock
+
+RANK_FIELDS = ('pe_ratio', 'price_per_book_value', 'multiplier', 'growth', 'dividend_yield')
+# Fields a stock scores better on the lower they are; the composite scores flip their percentiles.
+LOWER_IS_BETTER = frozenset({'pe_ratio', 'price_per_book_value', 'multiplier'})
+
+
+@dataclass(slots=True)
+class StockRank:
+    symbol: str
+    year: int
+    sector: str
+    # Percentile (0 to 100) of each field among the stocks with a value that year, overall and within
+    # the sector; fields the stock has no value for are left out.
+    percentiles: Dict[str, float] = field(default_factory=dict)
+    sector_percentiles: Dict[str, float] = field(default_factory=dict)
+    # Mean of the percentiles, flipped where lower is better, so 100 is the best on every field.
+    score: Optional[float] = None
+    sector_score: Optional[float] = None
+
+
+@dataclass(slots=True)
+class SectorMedians:
+    year: int
+    sector: str
+    stocks: int
+    medians: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class PortfolioRanking:
+    ranks: Dict[int, Dict[str, StockRank]] = field(default_factory=dict)
+    medians: Dict[int, Dict[str, SectorMedians]] = field(default_factory=dict)
+
+
+def rank_portfolio(stocks: Iterable[Stock]) -> PortfolioRanking:
+    # One pass over the stocks collects a row of the ranked fields per stock and year. Then per year
+    # and field the rows with a value are sorted once by it for the overall percentiles, and split by
+    # sector in that order, which leaves each sector's rows sorted for its percentiles and median.
+    # Percentiles are kept in columns aligned with the rows and only put in the ranks at the end.
+    rows: Dict[int, Tuple[List[str], List[str], List[Tuple[Optional[float], ...]]]] = {}
+    get_values = attrgetter(*RANK_FIELDS)
+    for stock in stocks:
+        for year, aggregate in stock.aggregate_data.items():
+            entry = rows.get(year)
+            if entry is None:
+                entry = rows[year] = ([], [], [])
+            entry[0].append(stock.symbol)
+            entry[1].append(stock.sector)
+            entry[2].append(get_values(aggregate))
+
+    ranking = PortfolioRanking()
+    for year, (symbols, sectors, values) in rows.items():
+        size = len(symbols)
+        medians = ranking.medians[year] = {sector: SectorMedians(year, sector, members) for sector, members in Counter(sectors).items()}
+        overall = _Columns(size)
+        in_sector = _Columns(size)
+        for name, column in zip(RANK_FIELDS, zip(*values)):
+            # The rows with a value, NaN (which never equals itself) counting as none.
+            ordered = [row for row, value in enumerate(column) if value is not None and value == value]
+            ordered.sort(key=column.__getitem__)
+            groups: Dict[str, List[int]] = {}
+            for row in ordered:
+                groups.setdefault(sectors[row], []).append(row)
+            flip = name in LOWER_IS_BETTER
+            overall.add(ordered, _percentiles([column[row] for row in ordered]), flip)
+            in_sector.add_empty()
+            for sector, group in groups.items():
+                group_values = [column[row] for row in group]
+                in_sector.update(group, _percentiles(group_values), flip)
+                medians[sector].medians[name] = _median(group_values)
+        ranks = ranking.ranks[year] = {}
+        for symbol, sector, percentiles, score, sector_percentiles, sector_score in zip(symbols, sectors, *overall.rows(), *in_sector.rows()):
+            ranks[symbol] = StockRank(symbol, year, sector, percentiles, sector_percentiles, score, sector_score)
+    return ranking
+
+
+class _Columns:
+    # A percentile column per field aligned with the rows of a year, None where a row has no value,
+    # and the running total and count of each row's score.
+
+    def __init__(self, size: int) -> None:
+        self.columns: List[List[Optional[float]]] = []
+        self.totals = [0.0] * size
+        self.counts = [0] * size
+
+    def add_empty(self) -> None:
+        self.columns.append([None] * len(self.totals))
+
+    def add(self, rows: List[int], percentiles: List[float], flip: bool) -> None:
+        self.add_empty()
+        self.update(rows, percentiles, flip)
+
+    def update(self, rows: List[int], percentiles: List[float], flip: bool) -> None:
+        column = self.columns[-1]
+        for row, percentile in zip(rows, percentiles):
+            column[row] = percentile
+            self.totals[row] += 100.0 - percentile if flip else percentile
+            self.counts[row] += 1
+
+    def rows(self) -> Tuple[Iterator[Dict[str, float]], List[Optional[float]]]:
+        # Each row's percentiles by field and score.
+        percentiles = ({name: value for name, value in zip(RANK_FIELDS, row) if value is not None} for row in zip(*self.columns))
+        return percentiles, [total / scored if scored else None for total, scored in zip(self.totals, self.counts)]
+
+
+def _percentiles(values: List[float]) -> List[float]:
+    # Share of the sorted values below plus half of the equal ones, so ties get the same percentile:
+    # a run of equal values from start to end has start values below it and end - start equal ones.
+    total = len(values)
+    percentiles: List[float] = []
+    start = 0
+    while start < total:
+        end = start + 1
+        while end < total and values[end] == values[start]:
+            end += 1
+        percentiles += [(start + end) * 50 / total] * (end - start)
+        start = end
+    return percentiles
+
+
+def _median(values: List[float]) -> float:
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
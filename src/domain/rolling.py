@@ -0,0 +1,209 @@
+import math
+from collections import deque
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.domain.stock import Stock
+
+STATISTICS = ('mean', 'median', 'cagr', 'stdev', 'min', 'max')
+FIELDS = ('market_capitalization', 'earnings_per_share', 'closing_price', 'book_value_per_share', 'dividend_per_share',
+          'pe_ratio', 'price_per_book_value', 'dividend_yield')
+
+
+@dataclass(frozen=True, slots=True)
+class RollingWindow:
+    field: str
+    statistic: str
+    length: int
+
+    @property
+    def name(self) -> str:
+        return f'{self.field}.{self.statistic}.{self.length}'
+
+
+def parse_window(text: str) -> List[RollingWindow]:
+    # field:statistic[,statistic...]:length[,length...], e.g. earnings_per_share:mean,median:3,5
+    parts = text.split(':')
+    if len(parts) != 3:
+        raise ValueError(f'Expected field:statistics:lengths, got {text}')
+    field, statistics, lengths = parts
+    if field not in FIELDS:
+        raise ValueError(f'Unknown field: {field}')
+    windows = []
+    for statistic in statistics.split(','):
+        if statistic not in STATISTICS:
+            raise ValueError(f'Unknown statistic: {statistic}')
+        for length in lengths.split(','):
+            if not length.isdigit() or int(length) < 1:
+                raise ValueError(f'Invalid window length: {length}')
+            windows.append(RollingWindow(field, statistic, int(length)))
+    return windows
+
+
+def stored_windows(stock: Stock) -> List[RollingWindow]:
+    # The windows a stock's aggregates were computed with, recovered from their statistic names.
+    names = dict.fromkeys(name for aggregate in stock.aggregate_data.values() for name in aggregate.statistics)
+    windows = []
+    for name in names:
+        field, statistic, length = name.rsplit('.', 2)
+        windows.append(RollingWindow(field, statistic, int(length)))
+    return windows
+
+
+def calculate_rolling_statistics(stock: Stock, windows: Iterable[RollingWindow]) -> None:
+    # A window of length n ending in year Y covers the years Y - n + 1 to Y that have a value. Each
+    # (field, length) pair is one forward pass over the years, adding the entering values and
+    # removing the leaving ones, so a pass is linear in the number of years (times the log of the
+    # window length for the median's heaps). The mean and stdev come from running sums kept exact,
+    # since a float sum loses the small values once large ones have left the window.
+    groups: Dict[Tuple[str, int], List[str]] = {}
+    for window in windows:
+        groups.setdefault((window.field, window.length), []).append(window.statistic)
+    years = sorted(stock.aggregate_data)
+    for aggregate in stock.aggregate_data.values():
+        aggregate.statistics = {}
+    for (field, length), statistics in groups.items():
+        series = _get_series(stock, field)
+        for year, values in zip(years, _slide(series, years, length, statistics)):
+            for statistic, value in zip(statistics, values):
+                stock.aggregate_data[year].statistics[f'{field}.{statistic}.{length}'] = value
+
+
+def _get_series(stock: Stock, field: str) -> List[Tuple[int, float]]:
+    series = []
+    for year in sorted(stock.year_data):
+        try:
+            value = getattr(stock.year_data[year], field)
+        except ZeroDivisionError:
+            continue
+        if value is not None:
+            series.append((year, value))
+    return series
+
+
+def _slide(series: List[Tuple[int, float]], years: List[int], length: int,
+           statistics: List[str]) -> Iterable[List[Optional[float]]]:
+    bits, scaled = _scale(series)
+    total = 0
+    squares = 0
+    median = _SlidingMedian()
+    minimum: deque = deque()
+    maximum: deque = deque()
+    start = 0
+    end = 0
+    for year in years:
+        while end < len(series) and series[end][0] <= year:
+            value = series[end][1]
+            total += scaled[end]
+            squares += scaled[end] * scaled[end]
+            if 'median' in statistics:
+                median.add(value)
+            while minimum and minimum[-1][1] > value:
+                minimum.pop()
+            minimum.append((end, value))
+            while maximum and maximum[-1][1] < value:
+                maximum.pop()
+            maximum.append((end, value))
+            end += 1
+        while start < end and series[start][0] <= year - length:
+            value = series[start][1]
+            total -= scaled[start]
+            squares -= scaled[start] * scaled[start]
+            if 'median' in statistics:
+                median.remove(value)
+            if minimum[0][0] == start:
+                minimum.popleft()
+            if maximum[0][0] == start:
+                maximum.popleft()
+            start += 1
+        yield [_statistic(statistic, series, start, end, bits, total, squares, median, minimum, maximum)
+               for statistic in statistics]
+
+
+def _scale(series: List[Tuple[int, float]]) -> Tuple[int, List[int]]:
+    # A float is a whole multiple of a power of two, so every value of the series times 2 ** bits of
+    # the finest one is an exact integer, and sums of those neither round nor cancel.
+    ratios = [value.as_integer_ratio() for _, value in series]
+    bits = max((denominator.bit_length() - 1 for _, denominator in ratios), default=0)
+    return bits, [numerator << (bits - denominator.bit_length() + 1) for numerator, denominator in ratios]
+
+
+def _statistic(statistic: str, series: List[Tuple[int, float]], start: int, end: int, bits: int, total: int, squares: int,
+               median: '_SlidingMedian', minimum: deque, maximum: deque) -> Optional[float]:
+    count = end - start
+    if count == 0:
+        return None
+    if statistic == 'mean':
+        return total / (count << bits)
+    elif statistic == 'median':
+        return median.median()
+    elif statistic == 'stdev':
+        if count < 2:
+            return None
+        # n * sum(x^2) - sum(x)^2 is exact, so equal values give exactly 0 whatever their magnitude.
+        return math.sqrt((count * squares - total * total) / ((count * (count - 1)) << (2 * bits)))
+    elif statistic == 'min':
+        return minimum[0][1]
+    elif statistic == 'max':
+        return maximum[0][1]
+    first_year, first = series[start]
+    last_year, last = series[end - 1]
+    if last_year == first_year or first <= 0 or last <= 0:
+        return None
+    return (last / first) ** (1 / (last_year - first_year)) - 1
+
+
+class _SlidingMedian:
+    # The lower half of the window in a max-heap (negated) and the upper half in a min-heap, the lower
+    # one holding the extra value of an odd count. Removed values stay in a heap until they reach its
+    # top, counted in removed, so adding and removing are logarithmic in the window length.
+    __slots__ = ('lower', 'upper', 'lower_count', 'upper_count', 'removed')
+
+    def __init__(self) -> None:
+        self.lower: List[float] = []
+        self.upper: List[float] = []
+        self.lower_count = 0
+        self.upper_count = 0
+        self.removed: Dict[float, int] = {}
+
+    def add(self, value: float) -> None:
+        if not self.lower or value <= -self.lower[0]:
+            heappush(self.lower, -value)
+            self.lower_count += 1
+        else:
+            heappush(self.upper, value)
+            self.upper_count += 1
+        self._balance()
+
+    def remove(self, value: float) -> None:
+        self.removed[value] = self.removed.get(value, 0) + 1
+        if value <= -self.lower[0]:
+            self.lower_count -= 1
+        else:
+            self.upper_count -= 1
+        self._balance()
+
+    def median(self) -> float:
+        if self.lower_count > self.upper_count:
+            return -self.lower[0]
+        return (-self.lower[0] + self.upper[0]) / 2
+
+    def _balance(self) -> None:
+        self._prune()
+        if self.lower_count > self.upper_count + 1:
+            heappush(self.upper, -heappop(self.lower))
+            self.lower_count -= 1
+            self.upper_count += 1
+        elif self.lower_count < self.upper_count:
+            heappush(self.lower, -heappop(self.upper))
+            self.lower_count += 1
+            self.upper_count -= 1
+        self._prune()
+
+    def _prune(self) -> None:
+        # Drops the removed values that reached the top of either heap.
+        while self.lower and self.removed.get(-self.lower[0]):
+            self.removed[-heappop(self.lower)] -= 1
+        while self.upper and self.removed.get(self.upper[0]):
+            self.removed[heappop(self.upper)] -= 1
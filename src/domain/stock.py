@@ -1,8 +1,21 @@
+import hashlib
+import struct
+from bisect import bisect_left
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Set
 
+from src.domain.prices import PriceSeries
 
-@dataclass
+EPS_PERIOD = 3
+DIVIDEND_PERIOD = 5
+GROWTH_PERIOD = 10
+FINGERPRINT_METRICS = struct.Struct('<q5d')
+NAN = float('nan')
+
+
+# Derived ratios are computed on access: a division costs about what checking a cache would, and
+# cache slots would add to every instance.
+@dataclass(slots=True)
 class StockMetrics:
     year: int
     market_capitalization: float
@@ -13,22 +26,18 @@ class StockMetrics:
 
     @property
     def pe_ratio(self) -> Optional[float]:
-        if self.earnings_per_share > 0:
-            return self.closing_price / self.earnings_per_share
-        return None
+        return self.closing_price / self.earnings_per_share if self.earnings_per_share > 0 else None
 
     @property
     def price_per_book_value(self) -> Optional[float]:
-        if self.book_value_per_share:
-            return self.closing_price / self.book_value_per_share
-        return None
-    
+        return self.closing_price / self.book_value_per_share if self.book_value_per_share else None
+
     @property
     def dividend_yield(self) -> float:
         return self.dividend_per_share / self.closing_price
-    
 
-@dataclass
+
+@dataclass(slots=True)
 class StockAggregate:
     year: int
     earnings_per_share: float
@@ -36,15 +45,29 @@ class StockAggregate:
     growth: float
     price_per_book_value: Optional[float]
     dividend_yield: float
+    # Rolling-window statistics keyed by window name (field.statistic.length, see src.domain.rolling).
+    statistics: Dict[str, Optional[float]] = field(default_factory=dict)
 
     @property
     def multiplier(self) -> Optional[float]:
-        if self.pe_ratio is not None and self.price_per_book_value is not None:
-            return self.pe_ratio * self.price_per_book_value
-        return None
+        if self.pe_ratio is None or self.price_per_book_value is None:
+            return None
+        return self.pe_ratio * self.price_per_book_value
+
+
+@dataclass(slots=True)
+class StockValuation:
+    symbol: str
+    year: int
+    current_price: float
+    pe_ratio: Optional[float]
+    price_per_book_value: Optional[float]
+    multiplier: Optional[float]
+    dividend_yield: Optional[float]
+    growth: Optional[float]
 
 
-@dataclass
+@dataclass(slots=True)
 class Stock:
     symbol: str
     name: str
@@ -52,6 +75,10 @@ class Stock:
     current_price: float
     year_data: Dict[int, StockMetrics] = field(default_factory=dict)
     aggregate_data: Dict[int, StockAggregate] = field(default_factory=dict)
+    # Fingerprint of the year data and parameters aggregate_data was last computed from.
+    aggregate_fingerprint: Optional[str] = None
+    # Daily closing prices, None until prices are added.
+    prices: Optional[PriceSeries] = None
 
     def calculate_aggregation(self) -> None:
         for year in self.year_data.keys():
@@ -59,21 +86,51 @@ class Stock:
             self.aggregate_data[year] = aggregate
         self.calculate_growth()
 
+    def update_aggregation(self, years: Optional[Iterable[int]] = None) -> None:
+        if years is None:
+            self.calculate_aggregation()
+            return
+        affected = {affected_year for year in years for affected_year in range(year, year + DIVIDEND_PERIOD)}
+        changed = [year for year in self.year_data.keys() if year in affected]
+        for year in changed:
+            self.aggregate_data[year] = self.create_aggregation(year)
+        growth_years = {growth_year for year in changed for growth_year in range(year, year + GROWTH_PERIOD + 1)}
+        for year in growth_years & self.aggregate_data.keys():
+            self.aggregate_data[year].growth = None
+        self.calculate_growth(growth_years)
+
     def create_aggregation(self, year: int) -> StockAggregate:
-        period = self.get_period(year, 3)
+        period = self.get_period(year, EPS_PERIOD)
         earnings_per_share = self.average([metric.earnings_per_share for metric in period])
         pe_ratio = period[0].closing_price / earnings_per_share if earnings_per_share > 0 else None
         price_per_book_value = self.average([metric.price_per_book_value for metric in period if metric.price_per_book_value is not None])        
-        period = self.get_period(year, 5)
+        period = self.get_period(year, DIVIDEND_PERIOD)
         dividends_yield = self.average([metric.dividend_yield for metric in period])
         return StockAggregate(year, earnings_per_share, pe_ratio, None, price_per_book_value, dividends_yield)
 
-    def calculate_growth(self) -> None:
+    def calculate_growth(self, years: Optional[Set[int]] = None) -> None:
+        aggregate_years = sorted(self.aggregate_data)
         for year, aggregate in self.aggregate_data.items():
-            compare_year = self.get_compare_year(year)
+            if years is not None and year not in years:
+                continue
+            compare_year = self.get_compare_year(year, aggregate_years)
             if self._is_eps_valid(aggregate.earnings_per_share) and self._is_eps_valid(self.aggregate_data[compare_year].earnings_per_share):
                 aggregate.growth = aggregate.earnings_per_share / self.aggregate_data[compare_year].earnings_per_share - 1
 
+    def calculate_valuation(self) -> Optional[StockValuation]:
+        # Live ratios: the current price against the normalized EPS of the latest aggregate and the
+        # book value and dividend of the same year.
+        if not self.aggregate_data or not self.current_price:
+            return None
+        year = max(self.aggregate_data)
+        aggregate = self.aggregate_data[year]
+        metrics = self.year_data.get(year)
+        pe_ratio = self.current_price / aggregate.earnings_per_share if self._is_eps_valid(aggregate.earnings_per_share) else None
+        price_per_book_value = self.current_price / metrics.book_value_per_share if metrics is not None and metrics.book_value_per_share else None
+        multiplier = pe_ratio * price_per_book_value if pe_ratio is not None and price_per_book_value is not None else None
+        dividend_yield = metrics.dividend_per_share / self.current_price if metrics is not None else None
+        return StockValuation(self.symbol, year, self.current_price, pe_ratio, price_per_book_value, multiplier, dividend_yield, aggregate.growth)
+
     def average(self, values: List[float]) -> Optional[float]:
         if len(values) == 0:
             return None
@@ -83,15 +140,30 @@ class Stock:
         period = [value for value in range(year, year-duration, -1)]
         return [metric for ye, metric in self.year_data.items() if ye in period]
 
-    def get_compare_year(self, year: int) -> int:
-        compare_year = year - 10
-        while compare_year not in self.aggregate_data:
-            compare_year += 1
-        return compare_year
+    def is_aggregated(self) -> bool:
+        # Whether aggregate_data was computed and fingerprinted, which files saved before the fingerprints are not.
+        return not self.year_data or (bool(self.aggregate_data) and self.aggregate_fingerprint is not None)
+
+    def calculate_fingerprint(self, parameters: Iterable[str] = ()) -> str:
+        # Year data in insertion order, which the aggregation sums in, plus the aggregation periods.
+        fingerprint = hashlib.blake2b(repr((EPS_PERIOD, DIVIDEND_PERIOD, GROWTH_PERIOD, tuple(parameters))).encode(), digest_size=16)
+        fingerprint.update(b''.join([FINGERPRINT_METRICS.pack(
+            metrics.year, NAN if metrics.market_capitalization is None else metrics.market_capitalization,
+            metrics.earnings_per_share, metrics.closing_price,
+            NAN if metrics.book_value_per_share is None else metrics.book_value_per_share, metrics.dividend_per_share)
+            for metrics in self.year_data.values()]))
+        return fingerprint.hexdigest()
+
+    def get_compare_year(self, year: int, aggregate_years: Optional[List[int]] = None) -> int:
+        # The earliest aggregate year at most GROWTH_PERIOD years back.
+        if aggregate_years is None:
+            aggregate_years = sorted(self.aggregate_data)
+        return aggregate_years[bisect_left(aggregate_years, year - GROWTH_PERIOD)]
     
     def _is_eps_valid(self, earning_per_share: Optional[float]) -> bool:
         return earning_per_share is not None and earning_per_share > 0
 
-@dataclass
+
+@dataclass(slots=True)
 class Portfolio:
     stocks: Dict[str, Stock] = field(default_factory=dict)
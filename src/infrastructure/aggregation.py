@@ -0,0 +1,135 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src.application.interface import AggregationEngineInterface
+from src.domain.stock import DIVIDEND_PERIOD, EPS_PERIOD, GROWTH_PERIOD, Stock, StockAggregate, StockMetrics
+
+
+class NumpyAggregationEngine(AggregationEngineInterface):
+
+    def __init__(self) -> None:
+        if np is None:
+            raise ImportError('NumpyAggregationEngine requires numpy')
+
+    def calculate_aggregation(self, stocks: Iterable[Stock]) -> None:
+        stocks = list(stocks)
+        for stock in stocks:
+            if not stock.year_data:
+                stock.calculate_growth()
+        stocks = [stock for stock in stocks if stock.year_data]
+        if not stocks:
+            return
+        counts = np.array([len(stock.year_data) for stock in stocks], dtype=np.int64)
+        metrics = [metric for stock in stocks for metric in stock.year_data.values()]
+        size = len(metrics)
+
+        years = np.fromiter((year for stock in stocks for year in stock.year_data), dtype=np.int64, count=size)
+        earnings_per_share = np.array([metric.earnings_per_share for metric in metrics], dtype=np.float64)
+        closing_price = np.array([metric.closing_price for metric in metrics], dtype=np.float64)
+        book_value_per_share = np.array([metric.book_value_per_share or 0.0 for metric in metrics], dtype=np.float64)
+        dividend_per_share = np.array([metric.dividend_per_share for metric in metrics], dtype=np.float64)
+        if (closing_price == 0).any():
+            raise ZeroDivisionError('float division by zero')
+
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        stock_index = np.repeat(np.arange(len(stocks), dtype=np.int64), counts)
+        position = np.arange(size, dtype=np.int64) - np.repeat(offsets, counts)
+
+        # Each (stock, year) pair gets a sortable key; the padding keeps look-backs inside the stock.
+        span = int(years.max() - years.min()) + 1 + GROWTH_PERIOD
+        keys = stock_index * span + (years - years.min() + GROWTH_PERIOD)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        has_book_value = book_value_per_share != 0
+        price_per_book_value = np.divide(closing_price, book_value_per_share, out=np.zeros(size), where=has_book_value)
+        dividend_yield = dividend_per_share / closing_price
+
+        eps_window, eps_found = self._window(keys, sorted_keys, order, position, EPS_PERIOD)
+        eps_sum, eps_count, first = self._window_sum(earnings_per_share, eps_window, eps_found)
+        average_eps = eps_sum / eps_count
+        pbv_sum, pbv_count, _ = self._window_sum(price_per_book_value, eps_window, eps_found & has_book_value[eps_window])
+        average_pbv = np.divide(pbv_sum, pbv_count, out=np.zeros(size), where=pbv_count > 0)
+        dividend_window, dividend_found = self._window(keys, sorted_keys, order, position, DIVIDEND_PERIOD)
+        dividend_sum, dividend_count, _ = self._window_sum(dividend_yield, dividend_window, dividend_found)
+        average_dividend_yield = dividend_sum / dividend_count
+
+        valid_eps = average_eps > 0
+        pe_ratio = np.divide(closing_price[first], average_eps, out=np.zeros(size), where=valid_eps)
+        compare = order[np.searchsorted(sorted_keys, keys - GROWTH_PERIOD, side='left')]
+        has_growth = valid_eps & valid_eps[compare]
+        growth = np.divide(average_eps, average_eps[compare], out=np.ones(size), where=has_growth) - 1
+
+        aggregates = [
+            StockAggregate(year, eps, pe if valid else None, gr if grows else None, pbv if pbv_valid else None, dy)
+            for year, eps, pe, valid, gr, grows, pbv, pbv_valid, dy in zip(
+                years.tolist(), average_eps.tolist(), pe_ratio.tolist(), valid_eps.tolist(), growth.tolist(),
+                has_growth.tolist(), average_pbv.tolist(), (pbv_count > 0).tolist(), average_dividend_yield.tolist())
+        ]
+
+        start = 0
+        for stock, count in zip(stocks, counts.tolist()):
+            stock_aggregates = aggregates[start:start + count]
+            start += count
+            stock.aggregate_data.update(zip(stock.year_data, stock_aggregates))
+            if len(stock.aggregate_data) != count:
+                # Aggregates of years without data take part in the growth lookback.
+                for aggregate in stock_aggregates:
+                    aggregate.growth = None
+                stock.calculate_growth()
+
+    def _window(self, keys: 'np.ndarray', sorted_keys: 'np.ndarray', order: 'np.ndarray', position: 'np.ndarray',
+                duration: int) -> Tuple['np.ndarray', 'np.ndarray']:
+        size = len(keys)
+        window = np.empty((size, duration), dtype=np.int64)
+        found = np.empty((size, duration), dtype=bool)
+        for offset in range(duration):
+            index = np.minimum(np.searchsorted(sorted_keys, keys - offset), size - 1)
+            window[:, offset] = order[index]
+            found[:, offset] = sorted_keys[index] == keys - offset
+        # Stock.get_period keeps the insertion order of year_data, so sum in that order too.
+        rank = np.where(found, position[window], np.iinfo(np.int64).max)
+        permutation = np.argsort(rank, axis=1, kind='stable')
+        return np.take_along_axis(window, permutation, axis=1), np.take_along_axis(found, permutation, axis=1)
+
+    def _window_sum(self, values: 'np.ndarray', window: 'np.ndarray',
+                    mask: 'np.ndarray') -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        total = np.zeros(len(window))
+        for column in range(window.shape[1]):
+            total = total + np.where(mask[:, column], values[window[:, column]], 0.0)
+        first = window[:, 0]
+        return total, mask.sum(axis=1), first
+
+
+class ProcessPoolAggregationEngine(AggregationEngineInterface):
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 100) -> None:
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def calculate_aggregation(self, stocks: Iterable[Stock]) -> None:
+        stocks = list(stocks)
+        chunks = [stocks[start:start + self.chunk_size] for start in range(0, len(stocks), self.chunk_size)]
+        if len(chunks) <= 1 or self.workers == 1:
+            for stock in stocks:
+                stock.calculate_aggregation()
+            return
+        payloads = [[(stock.year_data, stock.aggregate_data) for stock in chunk] for chunk in chunks]
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for chunk, results in zip(chunks, executor.map(aggregate_chunk, payloads)):
+                for stock, aggregate_data in zip(chunk, results):
+                    stock.aggregate_data.update(aggregate_data)
+
+
+def aggregate_chunk(chunk: List[Tuple[Dict[int, StockMetrics], Dict[int, StockAggregate]]]) -> List[Dict[int, StockAggregate]]:
+    results = []
+    for year_data, aggregate_data in chunk:
+        stock = Stock('', '', '', 0.0, year_data, aggregate_data)
+        stock.calculate_aggregation()
+        results.append(stock.aggregate_data)
+    return results
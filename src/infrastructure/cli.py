@@ -1,46 +1,141 @@
 import cmd
+import shlex
+import sys
+import time
+from typing import Iterable, Optional
 from src.infrastructure.controller_cli import CliController
+from src.infrastructure.instrumentation import Instrumentation
 
 
 class StockCmd(cmd.Cmd):
     prompt = 'stock> '
 
-    def __init__(self, controller: CliController):
+    def __init__(self, controller: Optional[CliController], instrumentation: Optional[Instrumentation] = None):
         super().__init__()
         self.controller = controller
+        self.instrumentation = instrumentation
 
-    def do_create_stock(self, _: str) -> None:
-        """create_stock: Creates a new stock"""
-        self.controller.create_stock()
+    def onecmd(self, line: str) -> bool:
+        if self.instrumentation is None:
+            return super().onecmd(line)
+        command = self.parseline(line)[0] or 'empty'
+        profiler = self.instrumentation.profiler
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            return super().onecmd(line)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            self.instrumentation.record(f'command.{command}', time.perf_counter() - start)
 
-    def do_add_stock_year_data(self, _: str) -> None:
-        """add_stock_year_data: Adds stock year data"""
-        self.controller.add_stock_year_data()
+    def do_create_stock(self, argument: str) -> None:
+        """create_stock [symbol name sector price]: Creates a new stock"""
+        self.controller.create_stock(shlex.split(argument))
+
+    def do_add_stock_year_data(self, argument: str) -> None:
+        """add_stock_year_data [symbol year market_cap eps closing_price book_value dividends]: Adds stock year data, - leaves an optional value empty"""
+        self.controller.add_stock_year_data(shlex.split(argument))
 
     def do_calculate_aggregate(self, _: str) -> None:
         """calculate_aggregate: Calculates the aggregate for all stocks"""
         self.controller.calculate_aggregate()
 
-    def do_get_stock_year_data(self, _: str) -> None:
-        """get_stock_year_data: Gets year data of a stock"""
-        self.controller.get_stock_year_data()
+    def do_get_stock_year_data(self, argument: str) -> None:
+        """get_stock_year_data [symbol]: Gets year data of a stock"""
+        self.controller.get_stock_year_data(shlex.split(argument))
+
+    def do_get_stock_aggregate_data(self, argument: str) -> None:
+        """get_stock_aggregate_data [symbol]: Gets aggregate data of a stock"""
+        self.controller.get_stock_aggregate_data(shlex.split(argument))
+
+    def do_get_stock_current_data(self, argument: str) -> None:
+        """get_stock_current_data [symbol]: Gets current data of a stock"""
+        self.controller.get_stock_current_data(shlex.split(argument))
+
+    def do_get_stock_price_data(self, argument: str) -> None:
+        """get_stock_price_data [symbol [from [to]]]: Shows the yearly close, average, low and high of a stock's daily prices"""
+        self.controller.get_stock_price_data(shlex.split(argument))
+
+    def do_valuation(self, _: str) -> None:
+        """valuation: Shows the P/E, Price / BV and dividend yield of all stocks at their current price"""
+        self.controller.get_portfolio_valuation()
+
+    def do_update_prices(self, argument: str) -> None:
+        """update_prices [symbol ...]: Refreshes the current price of all or the given stocks from the quote source"""
+        self.controller.update_prices(shlex.split(argument))
+
+    def do_screen(self, argument: str) -> None:
+        """screen [year "filter" ["sort" [limit]]]: Lists the stocks matching a filter such as 'pe_ratio < 10 and dividend_yield > 5% and sector = Energy'"""
+        self.controller.screen(shlex.split(argument))
 
-    def do_get_stock_aggregate_data(self, _: str) -> None:
-        """get_stock_aggregate_data: Gets aggregate data of a stock"""
-        self.controller.get_stock_aggregate_data()
+    def do_rank(self, argument: str) -> None:
+        """rank [year [sector [limit]]]: Ranks the stocks by percentile of P/E, Price / BV, multiplier, growth and dividend yield, overall and in their sector, with the sector medians"""
+        self.controller.rank(shlex.split(argument))
 
-    def do_get_stock_current_data(self, _: str) -> None:
-        """get_stock_current_data: Gets current data of a stock"""
-        self.controller.get_stock_current_data()
+    def do_scenario(self, argument: str) -> None:
+        """scenario [name year "changes" ["filter"]]: Changes year data in a what-if scenario, e.g. scenario recession 2024 'earnings_per_share *= 80%' 'sector = Energy'"""
+        self.controller.apply_scenario(shlex.split(argument))
 
-    def do_save(self, _: str) -> None:
-        """save: Saves portfolio"""
-        self.controller.save_portfolio()
+    def do_compare_scenarios(self, argument: str) -> None:
+        """compare_scenarios [year [name ...]]: Shows the aggregates of the stocks changed in all or the given scenarios next to the portfolio's"""
+        self.controller.compare_scenarios(shlex.split(argument))
 
-    def do_load(self, _: str) -> None:
-        """load: Loads portfolio"""
-        self.controller.load_portfolio()
+    def do_drop_scenario(self, argument: str) -> None:
+        """drop_scenario [name]: Discards a scenario"""
+        self.controller.drop_scenario(shlex.split(argument))
+
+    def do_save(self, argument: str) -> None:
+        """save [file]: Saves portfolio"""
+        self.controller.save_portfolio(shlex.split(argument))
+
+    def do_load(self, argument: str) -> None:
+        """load [file]: Loads portfolio"""
+        self.controller.load_portfolio(shlex.split(argument))
+
+    def do_bulk_import(self, argument: str) -> None:
+        """bulk_import [file [checkpoint_interval]]: Imports stocks and year data from a CSV or JSONL file"""
+        self.controller.bulk_import(shlex.split(argument))
+
+    def do_import_prices(self, argument: str) -> None:
+        """import_prices [file]: Imports daily closing prices (symbol, date, close) from a CSV or JSONL file and updates the yearly closing prices"""
+        self.controller.import_prices(shlex.split(argument))
+
+    def do_stats(self, argument: str) -> None:
+        """stats [dump <file> | reset]: Shows, dumps as JSON or resets the timing statistics"""
+        self.controller.stats(argument)
+
+    def do_profile(self, argument: str) -> None:
+        """profile start | profile stop [file]: Profiles the following commands with cProfile"""
+        self.controller.profile(argument)
 
     def do_quit(self, _: str) -> bool:
         """quit: Quits the program"""
         return True
+
+    def run_script(self, lines: Iterable[str]) -> int:
+        # Runs one command per line without prompting; blank lines and lines starting with # are skipped.
+        # Returns the number of failed commands.
+        errors = 0
+        if self.controller is not None:
+            self.controller.begin_batch()
+        try:
+            for number, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if not hasattr(self, f'do_{self.parseline(line)[0]}'):
+                    errors += 1
+                    print(f'Line {number}: unknown command: {line}', file=sys.stderr)
+                    continue
+                try:
+                    if self.onecmd(line):
+                        break
+                except Exception as error:
+                    errors += 1
+                    print(f'Line {number}: {error}', file=sys.stderr)
+        finally:
+            if self.controller is not None:
+                self.controller.end_batch()
+        return errors
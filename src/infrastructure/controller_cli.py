@@ -1,5 +1,8 @@
 import os
-from src.application.stock_interactor import AddStockYearDataUseCase, CalculateAggregateDataUseCase, CreateStockUseCase, GetStockAggregateDataUseCase, GetStockCurrentDataUseCase, GetStockYearDataUseCase, LoadPortfolioUseCase, SavePortfolioUseCase
+from datetime import date
+from typing import List, Optional, Sequence
+from src.application.stock_interactor import AddStockYearDataUseCase, ApplyScenarioUseCase, BulkImportUseCase, CalculateAggregateDataUseCase, CompareScenariosUseCase, CreateStockUseCase, DropScenarioUseCase, GetPortfolioValuationUseCase, GetStockAggregateDataUseCase, GetStockCurrentDataUseCase, GetStockPriceDataUseCase, GetStockYearDataUseCase, ImportDailyPricesUseCase, LoadPortfolioUseCase, RankPortfolioUseCase, SavePortfolioUseCase, ScreenStocksUseCase, ShowStatsUseCase, UpdateCurrentPricesUseCase
+from src.infrastructure.instrumentation import Instrumentation
 
 
 class CliController:
@@ -12,7 +15,20 @@ class CliController:
                  get_stock_aggregate_data_use_case: GetStockAggregateDataUseCase,
                  get_stock_current_data_use_case: GetStockCurrentDataUseCase,
                  save_portfolio_use_case: SavePortfolioUseCase,
-                 load_portfolio_use_case: LoadPortfolioUseCase) -> None:
+                 load_portfolio_use_case: LoadPortfolioUseCase,
+                 bulk_import_use_case: BulkImportUseCase,
+                 screen_stocks_use_case: ScreenStocksUseCase,
+                 get_portfolio_valuation_use_case: GetPortfolioValuationUseCase,
+                 instrumentation: Optional[Instrumentation] = None,
+                 show_stats_use_case: Optional[ShowStatsUseCase] = None,
+                 update_current_prices_use_case: Optional[UpdateCurrentPricesUseCase] = None,
+                 filename: Optional[str] = None,
+                 import_daily_prices_use_case: Optional[ImportDailyPricesUseCase] = None,
+                 get_stock_price_data_use_case: Optional[GetStockPriceDataUseCase] = None,
+                 apply_scenario_use_case: Optional[ApplyScenarioUseCase] = None,
+                 compare_scenarios_use_case: Optional[CompareScenariosUseCase] = None,
+                 drop_scenario_use_case: Optional[DropScenarioUseCase] = None,
+                 rank_portfolio_use_case: Optional[RankPortfolioUseCase] = None) -> None:
         self.create_stock_use_case = create_stock_use_case
         self.add_stock_year_data_use_case = add_stock_year_data_use_case
         self.calculate_aggregate_data_use_case = calculate_aggregate_data_use_case
@@ -21,55 +37,269 @@ class CliController:
         self.get_stock_current_data_use_case = get_stock_current_data_use_case
         self.save_portfolio_use_case = save_portfolio_use_case
         self.load_portfolio_use_case = load_portfolio_use_case
-        self.filename = None
+        self.bulk_import_use_case = bulk_import_use_case
+        self.screen_stocks_use_case = screen_stocks_use_case
+        self.instrumentation = instrumentation
+        self.show_stats_use_case = show_stats_use_case
+        self.update_current_prices_use_case = update_current_prices_use_case
+        self.get_portfolio_valuation_use_case = get_portfolio_valuation_use_case
+        self.import_daily_prices_use_case = import_daily_prices_use_case
+        self.get_stock_price_data_use_case = get_stock_price_data_use_case
+        self.apply_scenario_use_case = apply_scenario_use_case
+        self.compare_scenarios_use_case = compare_scenarios_use_case
+        self.drop_scenario_use_case = drop_scenario_use_case
+        self.rank_portfolio_use_case = rank_portfolio_use_case
+        self.filename = filename
+        self.batch = False
+        self.pending_aggregation = False
+        self.pending_save = False
 
-    def create_stock(self) -> None:
-        symbol = input('Symbol: ')
-        name = input('Name: ')
-        sector = input('Sector: ')
-        current_price = float(input('Current Price: '))
+    def create_stock(self, arguments: Sequence[str] = ()) -> None:
+        arguments = list(arguments)
+        symbol = self._ask(arguments, 'Symbol: ')
+        name = self._ask(arguments, 'Name: ')
+        sector = self._ask(arguments, 'Sector: ')
+        current_price = float(self._ask(arguments, 'Current Price: '))
         self.create_stock_use_case.execute(symbol, name, sector, current_price)
+        self.pending_save = True
 
-    def add_stock_year_data(self) -> None:
-        symbol = input('Symbol: ')
-        year = int(input('Year: '))
+    def add_stock_year_data(self, arguments: Sequence[str] = ()) -> None:
+        arguments = list(arguments)
+        symbol = self._ask(arguments, 'Symbol: ')
+        year = int(self._ask(arguments, 'Year: '))
         try:
-            market_capitalization = float(input('Market Capitalization (B): '))
+            market_capitalization = float(self._ask(arguments, 'Market Capitalization (B): '))
         except ValueError:
             market_capitalization = None
-        earnings_per_share = float(input('Earnings per Share: '))
-        closing_price = float(input('Closing Price: '))
+        earnings_per_share = float(self._ask(arguments, 'Earnings per Share: '))
+        closing_price = float(self._ask(arguments, 'Closing Price: '))
         try:
-            book_value_per_share = float(input('Book Value per Share: '))
+            book_value_per_share = float(self._ask(arguments, 'Book Value per Share: '))
         except ValueError:
             book_value_per_share = None
-        dividend_per_share = float(input('Dividends per Share: '))
+        dividend_per_share = float(self._ask(arguments, 'Dividends per Share: '))
         self.add_stock_year_data_use_case.execute(symbol, year, market_capitalization, earnings_per_share, closing_price, book_value_per_share, dividend_per_share)
-        self.save_portfolio()
+        self.pending_aggregation = True
+        self.pending_save = True
+        if not self.batch:
+            self.calculate_aggregate()
+            self.save_portfolio()
 
     def calculate_aggregate(self) -> None:
         self.calculate_aggregate_data_use_case.execute()
+        self.pending_aggregation = False
 
-    def get_stock_year_data(self) -> None:
-        symbol = input('Symbol: ')
+    def get_stock_year_data(self, arguments: Sequence[str] = ()) -> None:
+        symbol = self._ask(list(arguments), 'Symbol: ')
         self.get_stock_year_data_use_case.execute(symbol)
 
-    def get_stock_aggregate_data(self) -> None:
-        symbol = input('Symbol: ')
+    def get_stock_aggregate_data(self, arguments: Sequence[str] = ()) -> None:
+        symbol = self._ask(list(arguments), 'Symbol: ')
+        self._refresh_aggregate()
         self.get_stock_aggregate_data_use_case.execute(symbol)
 
-    def get_stock_current_data(self) -> None:
-        symbol = input('Symbol: ')
+    def get_stock_current_data(self, arguments: Sequence[str] = ()) -> None:
+        symbol = self._ask(list(arguments), 'Symbol: ')
+        self._refresh_aggregate()
         self.get_stock_current_data_use_case.execute(symbol)
 
-    def save_portfolio(self) -> None:
-        if self.filename is None:
-            self.filename = input('Filename: ')
-            self.filename = os.path.join('data', self.filename)
-        self.save_portfolio_use_case.execute(self.filename)
+    def get_stock_price_data(self, arguments: Sequence[str] = ()) -> None:
+        if self.get_stock_price_data_use_case is None:
+            print('Daily prices are not available')
+            return
+        inline = bool(arguments)
+        arguments = list(arguments)
+        symbol = self._ask(arguments, 'Symbol: ')
+        start = self._ask_optional(arguments, 'From (YYYY-MM-DD): ', inline)
+        end = self._ask_optional(arguments, 'To (YYYY-MM-DD): ', inline)
+        self.get_stock_price_data_use_case.execute(symbol, date.fromisoformat(start) if start else None,
+                                                   date.fromisoformat(end) if end else None)
+
+    def get_portfolio_valuation(self) -> None:
+        self._refresh_aggregate()
+        self.get_portfolio_valuation_use_case.execute()
+
+    def update_prices(self, arguments: Sequence[str] = ()) -> None:
+        if self.update_current_prices_use_case is None:
+            print('No quote source, start with --quotes')
+            return
+        updated = self.update_current_prices_use_case.execute(list(arguments) or None)
+        failed = self.update_current_prices_use_case.failed
+        print(f'Updated {updated} prices' + (f', no quote for {", ".join(failed)}' if failed else ''))
+        self.pending_save = True
+        if not self.batch:
+            self.save_portfolio()
+
+    def screen(self, arguments: Sequence[str] = ()) -> None:
+        inline = bool(arguments)
+        arguments = list(arguments)
+        year = int(self._ask(arguments, 'Year: '))
+        filter_expression = self._ask(arguments, 'Filter: ')
+        sort_expression = self._ask_optional(arguments, 'Sort: ', inline)
+        try:
+            limit = int(self._ask_optional(arguments, 'Limit: ', inline))
+        except ValueError:
+            limit = None
+        self._refresh_aggregate()
+        self.screen_stocks_use_case.execute(year, filter_expression, sort_expression, limit)
+
+    def rank(self, arguments: Sequence[str] = ()) -> None:
+        if self.rank_portfolio_use_case is None:
+            print('Ranking is not available')
+            return
+        inline = bool(arguments)
+        arguments = list(arguments)
+        year = int(self._ask(arguments, 'Year: '))
+        sector = self._ask_optional(arguments, 'Sector: ', inline)
+        try:
+            limit = int(self._ask_optional(arguments, 'Limit: ', inline))
+        except ValueError:
+            limit = None
+        self._refresh_aggregate()
+        self.rank_portfolio_use_case.execute(year, sector or None, limit)
+
+    def apply_scenario(self, arguments: Sequence[str] = ()) -> None:
+        if self.apply_scenario_use_case is None:
+            print('Scenarios are not available')
+            return
+        inline = bool(arguments)
+        arguments = list(arguments)
+        name = self._ask(arguments, 'Scenario: ')
+        year = int(self._ask(arguments, 'Year: '))
+        changes_expression = self._ask(arguments, 'Changes: ')
+        filter_expression = self._ask_optional(arguments, 'Filter: ', inline)
+        self._refresh_aggregate()
+        changed = self.apply_scenario_use_case.execute(name, year, changes_expression, filter_expression)
+        print(f'Changed {changed} stocks in scenario {name}')
+
+    def compare_scenarios(self, arguments: Sequence[str] = ()) -> None:
+        if self.compare_scenarios_use_case is None:
+            print('Scenarios are not available')
+            return
+        arguments = list(arguments)
+        year = int(self._ask(arguments, 'Year: '))
+        self._refresh_aggregate()
+        self.compare_scenarios_use_case.execute(year, arguments or None)
+
+    def drop_scenario(self, arguments: Sequence[str] = ()) -> None:
+        if self.drop_scenario_use_case is None:
+            print('Scenarios are not available')
+            return
+        name = self._ask(list(arguments), 'Scenario: ')
+        if not self.drop_scenario_use_case.execute(name):
+            print(f'No scenario {name}')
+
+    def save_portfolio(self, arguments: Sequence[str] = ()) -> None:
+        if arguments:
+            self.filename = os.path.join('data', arguments[0])
+        if self.batch:
+            self.pending_save = True
+            return
+        self.save_portfolio_use_case.execute(self._get_filename())
+        self.pending_save = False
+
+    def load_portfolio(self, arguments: Sequence[str] = ()) -> None:
+        if arguments:
+            self.filename = os.path.join('data', arguments[0])
+        self.load_portfolio_use_case.execute(self._get_filename())
+        self.pending_aggregation = False
+        self.pending_save = False
+
+    def bulk_import(self, arguments: Sequence[str] = ()) -> None:
+        inline = bool(arguments)
+        arguments = list(arguments)
+        import_filename = self._ask(arguments, 'Import file: ')
+        try:
+            checkpoint_interval = int(self._ask_optional(arguments, 'Checkpoint interval (rows): ', inline))
+        except ValueError:
+            checkpoint_interval = None
+        filename = self.filename if self.batch else self._get_filename()
+        imported = self.bulk_import_use_case.execute(import_filename, filename, checkpoint_interval)
+        self.pending_aggregation = True
+        self.pending_save = True
+        if not self.batch:
+            self.calculate_aggregate()
+            self.save_portfolio()
+        print(f'Imported {imported} records')
+
+    def import_prices(self, arguments: Sequence[str] = ()) -> None:
+        if self.import_daily_prices_use_case is None:
+            print('Daily prices are not available')
+            return
+        import_filename = self._ask(list(arguments), 'Import file: ')
+        imported = self.import_daily_prices_use_case.execute(import_filename)
+        self.pending_aggregation = True
+        self.pending_save = True
+        if not self.batch:
+            self.calculate_aggregate()
+            self.save_portfolio()
+        print(f'Imported {imported} prices')
+
+    def begin_batch(self) -> None:
+        self.batch = True
+
+    def end_batch(self) -> None:
+        # Aggregation and saving are deferred while a batch runs and done once here.
+        self.batch = False
+        if self.pending_aggregation:
+            self.calculate_aggregate()
+        if self.pending_save:
+            if self.filename is None:
+                print('Portfolio not saved: no file was given with load or save')
+            else:
+                self.save_portfolio()
+
+    def flush(self) -> None:
+        # Saves pending changes without leaving batch mode; nothing happens before a file is known.
+        if self.pending_save and self.filename is not None:
+            self.save_portfolio_use_case.execute(self.filename)
+            self.pending_save = False
+
+    def stats(self, argument: str) -> None:
+        if self.instrumentation is None or self.show_stats_use_case is None:
+            print('Instrumentation is disabled, start with --instrument')
+            return
+        command, _, filename = argument.strip().partition(' ')
+        if command == 'dump':
+            self.instrumentation.dump(filename.strip() or 'stats.json')
+        elif command == 'reset':
+            self.instrumentation.reset()
+        else:
+            self.show_stats_use_case.execute()
+
+    def profile(self, argument: str) -> None:
+        if self.instrumentation is None:
+            print('Instrumentation is disabled, start with --instrument')
+            return
+        command, _, filename = argument.strip().partition(' ')
+        if command == 'start':
+            self.instrumentation.start_profile()
+        elif command == 'stop':
+            print(self.instrumentation.stop_profile(filename.strip() or None))
+        else:
+            print('Usage: profile start | profile stop [file]')
+
+    def _ask(self, arguments: List[str], prompt: str) -> str:
+        if arguments:
+            return arguments.pop(0)
+        if self.batch:
+            raise ValueError(f'Missing argument: {prompt.rstrip(": ")}')
+        return input(prompt)
+
+    def _ask_optional(self, arguments: List[str], prompt: str, inline: bool) -> str:
+        # Trailing optional values may be left out of an inline command instead of being prompted for.
+        if arguments:
+            return arguments.pop(0)
+        return '' if inline else self._ask(arguments, prompt)
+
+    def _refresh_aggregate(self) -> None:
+        if self.pending_aggregation:
+            self.calculate_aggregate()
 
-    def load_portfolio(self) -> None:
+    def _get_filename(self) -> str:
         if self.filename is None:
+            if self.batch:
+                raise ValueError('No portfolio file, load or save one with a filename first')
             self.filename = input('Filename: ')
             self.filename = os.path.join('data', self.filename)
-        self.load_portfolio_use_case.execute(self.filename)
+        return self.filename
@@ -0,0 +1,430 @@
+import os
+import sqlite3
+import sys
+from array import array
+from collections.abc import MutableMapping
+from datetime import date
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from src.application.interface import PersistenceInterface, RepositoryInterface
+from src.application.screen import AGGREGATE
+from src.domain.prices import PriceSeries
+from src.domain.stock import Portfolio, Stock, StockAggregate, StockMetrics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS stocks (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    sector TEXT NOT NULL,
+    current_price REAL,
+    aggregate_fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS stocks_sector ON stocks (sector COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    market_capitalization REAL,
+    earnings_per_share REAL NOT NULL,
+    closing_price REAL NOT NULL,
+    book_value_per_share REAL,
+    dividend_per_share REAL NOT NULL,
+    UNIQUE (symbol, year)
+);
+CREATE INDEX IF NOT EXISTS metrics_year ON metrics (year);
+CREATE TABLE IF NOT EXISTS aggregates (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    earnings_per_share REAL,
+    pe_ratio REAL,
+    growth REAL,
+    price_per_book_value REAL,
+    dividend_yield REAL,
+    UNIQUE (symbol, year)
+);
+CREATE INDEX IF NOT EXISTS aggregates_year ON aggregates (year);
+CREATE TABLE IF NOT EXISTS aggregate_statistics (
+    symbol TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (symbol, year, name)
+);
+CREATE TABLE IF NOT EXISTS price_series (
+    symbol TEXT PRIMARY KEY,
+    days BLOB NOT NULL,
+    prices BLOB NOT NULL
+);
+-- A NULL year marks the whole stock; unique rows keep the table no larger than the changes.
+CREATE TABLE IF NOT EXISTS dirty (
+    symbol TEXT NOT NULL,
+    year INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS dirty_symbol_year ON dirty (symbol, year);
+'''
+
+# Rows keep the insertion order of the domain dicts: ids only grow, and an upsert of an existing
+# (symbol, year) keeps its id just like assigning an existing dict key keeps its position.
+UPSERT_STOCK = '''
+INSERT INTO stocks (symbol, name, sector, current_price, aggregate_fingerprint) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (symbol) DO UPDATE SET name = excluded.name, sector = excluded.sector, current_price = excluded.current_price,
+    aggregate_fingerprint = excluded.aggregate_fingerprint
+'''
+UPSERT_METRICS = '''
+INSERT INTO metrics (symbol, year, market_capitalization, earnings_per_share, closing_price, book_value_per_share, dividend_per_share)
+SELECT ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM stocks WHERE symbol = ?1)
+ON CONFLICT (symbol, year) DO UPDATE SET market_capitalization = excluded.market_capitalization,
+    earnings_per_share = excluded.earnings_per_share, closing_price = excluded.closing_price,
+    book_value_per_share = excluded.book_value_per_share, dividend_per_share = excluded.dividend_per_share
+'''
+UPSERT_AGGREGATE = '''
+INSERT INTO aggregates (symbol, year, earnings_per_share, pe_ratio, growth, price_per_book_value, dividend_yield)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (symbol, year) DO UPDATE SET earnings_per_share = excluded.earnings_per_share, pe_ratio = excluded.pe_ratio,
+    growth = excluded.growth, price_per_book_value = excluded.price_per_book_value, dividend_yield = excluded.dividend_yield
+'''
+MARK_DIRTY_YEAR = '''
+INSERT OR IGNORE INTO dirty (symbol, year) SELECT ?, ?
+WHERE EXISTS (SELECT 1 FROM stocks WHERE symbol = ?1)
+AND NOT EXISTS (SELECT 1 FROM dirty WHERE symbol = ?1 AND year IS NULL)
+'''
+SELECT_STOCK = 'SELECT id, symbol, name, sector, current_price, aggregate_fingerprint FROM stocks WHERE symbol = ?'
+SELECT_STOCKS = 'SELECT id, symbol, name, sector, current_price, aggregate_fingerprint FROM stocks WHERE id > ? ORDER BY id LIMIT ?'
+SELECT_METRICS = '''
+SELECT symbol, year, market_capitalization, earnings_per_share, closing_price, book_value_per_share, dividend_per_share
+FROM metrics WHERE symbol IN ({}) ORDER BY id
+'''
+SELECT_AGGREGATES = '''
+SELECT symbol, year, earnings_per_share, pe_ratio, growth, price_per_book_value, dividend_yield
+FROM aggregates WHERE symbol IN ({}) ORDER BY id
+'''
+# A stock's daily prices are one row holding the arrays of its PriceSeries as little-endian bytes,
+# so reading or writing a series is a single row instead of one row per day.
+UPSERT_PRICES = 'INSERT INTO price_series (symbol, days, prices) VALUES (?, ?, ?) ON CONFLICT (symbol) DO UPDATE SET days = excluded.days, prices = excluded.prices'
+SELECT_PRICES = 'SELECT symbol, days, prices FROM price_series WHERE symbol IN ({})'
+INSERT_STATISTIC = 'INSERT INTO aggregate_statistics (symbol, year, name, value) VALUES (?, ?, ?, ?)'
+SELECT_STATISTICS = 'SELECT symbol, year, name, value FROM aggregate_statistics WHERE symbol IN ({}) ORDER BY rowid'
+
+# SQL equivalents of the screenable fields, derived ratios included; division by zero yields NULL.
+AGGREGATE_EXPRESSIONS = {
+    'earnings_per_share': 'earnings_per_share',
+    'pe_ratio': 'pe_ratio',
+    'growth': 'growth',
+    'price_per_book_value': 'price_per_book_value',
+    'multiplier': 'pe_ratio * price_per_book_value',
+    'dividend_yield': 'dividend_yield',
+}
+METRICS_EXPRESSIONS = {
+    'market_capitalization': 'market_capitalization',
+    'earnings_per_share': 'earnings_per_share',
+    'closing_price': 'closing_price',
+    'book_value_per_share': 'book_value_per_share',
+    'dividend_per_share': 'dividend_per_share',
+    'pe_ratio': 'CASE WHEN earnings_per_share > 0 THEN closing_price / earnings_per_share END',
+    'price_per_book_value': 'CASE WHEN book_value_per_share != 0 THEN closing_price / book_value_per_share END',
+    'dividend_yield': 'dividend_per_share / closing_price',
+}
+SQL_OPERATORS = ('<', '<=', '>', '>=', '=', '!=')
+CHUNK_SIZE = 500
+# Kept in PRAGMA user_version. Version 1 databases, and those that predate the pragma, have no
+# aggregate_fingerprint column, version 2 ones keep daily prices one row per day in a prices table;
+# the other tables added since are created by the schema script itself.
+DATABASE_VERSION = 3
+
+
+class SqliteRepository(RepositoryInterface):
+    # Stocks live in the database and are built on request, so the portfolio does not have to fit in
+    # memory. Changes become durable on checkpoint(), which the sqlite persistence calls on save.
+
+    def __init__(self, filename: str) -> None:
+        self.filename = os.path.abspath(filename)
+        # Shared by the threads of the query server, which serializes writes.
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.executescript(SCHEMA)
+        try:
+            self._upgrade_schema()
+        except ValueError:
+            self.connection.close()
+            raise
+        self.aggregate_version = 0
+
+    def _upgrade_schema(self) -> None:
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version > DATABASE_VERSION:
+            raise ValueError(f'Database version {version} is newer than the supported {DATABASE_VERSION}')
+        if version == DATABASE_VERSION:
+            return
+        with self.connection:
+            columns = {row[1] for row in self.connection.execute('PRAGMA table_info(stocks)')}
+            if 'aggregate_fingerprint' not in columns:
+                self.connection.execute('ALTER TABLE stocks ADD COLUMN aggregate_fingerprint TEXT')
+            if self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prices'").fetchone():
+                rows = self.connection.execute('SELECT symbol, day, price FROM prices ORDER BY symbol, day').fetchall()
+                for symbol, group in groupby(rows, itemgetter(0)):
+                    series = PriceSeries()
+                    for _, day, price in group:
+                        series.days.append(day)
+                        series.prices.append(price)
+                    self.connection.execute(UPSERT_PRICES, _pack_prices(symbol, series))
+                self.connection.execute('DROP TABLE prices')
+            self.connection.execute(f'PRAGMA user_version = {DATABASE_VERSION}')
+
+    def add_stock(self, stock: Stock) -> None:
+        self.connection.execute(UPSERT_STOCK, self._stock_row(stock))
+        self.connection.execute('DELETE FROM metrics WHERE symbol = ?', (stock.symbol,))
+        self.connection.execute('DELETE FROM aggregates WHERE symbol = ?', (stock.symbol,))
+        self.connection.execute('DELETE FROM price_series WHERE symbol = ?', (stock.symbol,))
+        self.connection.executemany(UPSERT_METRICS, self._metrics_rows([stock]))
+        self.connection.executemany(UPSERT_PRICES, self._price_rows([stock]))
+        self._save_aggregates([stock])
+        self.connection.execute('DELETE FROM dirty WHERE symbol = ?', (stock.symbol,))
+        self.connection.execute('INSERT INTO dirty (symbol, year) VALUES (?, NULL)', (stock.symbol,))
+
+    def add_year_data(self, symbol: str, metrics: StockMetrics) -> None:
+        self.add_year_data_batch([(symbol, metrics)])
+
+    def add_year_data_batch(self, entries: List[Tuple[str, StockMetrics]]) -> None:
+        self.connection.executemany(UPSERT_METRICS, [self._metrics_row(symbol, metrics) for symbol, metrics in entries])
+        self.connection.executemany(MARK_DIRTY_YEAR, [(symbol, metrics.year) for symbol, metrics in entries])
+
+    def update_current_price(self, symbol: str, current_price: float) -> None:
+        self.connection.execute('UPDATE stocks SET current_price = ? WHERE symbol = ?', (current_price, symbol))
+
+    def add_prices(self, symbol: str, prices: PriceSeries) -> None:
+        # The stored series is read, merged and written back whole.
+        if self.connection.execute('SELECT 1 FROM stocks WHERE symbol = ?', (symbol,)).fetchone() is not None:
+            series = self.get_prices(symbol) or PriceSeries()
+            series.extend(prices.days, prices.prices)
+            self.connection.execute(UPSERT_PRICES, _pack_prices(symbol, series))
+
+    def get_prices(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> Optional[PriceSeries]:
+        row = self.connection.execute('SELECT days, prices FROM price_series WHERE symbol = ?', (symbol,)).fetchone()
+        if row is None:
+            return None
+        series = _unpack_prices(*row)
+        return series if start is None and end is None else series.between(start, end)
+
+    def save_aggregate_data(self, stocks: List[Stock]) -> None:
+        self._save_aggregates(stocks)
+
+    def get_stocks(self) -> Iterator[Stock]:
+        # Without their daily prices, which get_prices reads where they are needed.
+        return self._iter_stocks(False)
+
+    def get_stock(self, symbol: str) -> Optional[Stock]:
+        return self._get_stock(symbol, False)
+
+    def get_portfolio(self) -> Portfolio:
+        return Portfolio(SqliteStockMap(self))
+
+    def set_portfolio(self, portfolio: Portfolio) -> None:
+        if isinstance(portfolio.stocks, SqliteStockMap) and portfolio.stocks.repository is self:
+            return
+        stocks = list(portfolio.stocks.values())
+        for table in ('stocks', 'metrics', 'aggregates', 'aggregate_statistics', 'price_series', 'dirty'):
+            self.connection.execute(f'DELETE FROM {table}')
+        self.connection.executemany(UPSERT_STOCK, [self._stock_row(stock) for stock in stocks])
+        self.connection.executemany(UPSERT_METRICS, self._metrics_rows(stocks))
+        self.connection.executemany(UPSERT_AGGREGATE, self._aggregate_rows(stocks))
+        self.connection.executemany(INSERT_STATISTIC, self._statistic_rows(stocks))
+        self.connection.executemany(UPSERT_PRICES, self._price_rows(stocks))
+        # Like InMemoryRepository, only the stocks saved without their aggregates are dirty.
+        self.connection.executemany('INSERT INTO dirty (symbol, year) VALUES (?, NULL)',
+                                    [(stock.symbol,) for stock in stocks if not stock.is_aggregated()])
+        self.aggregate_version += 1
+
+    def get_dirty_years(self) -> Dict[str, Optional[Set[int]]]:
+        dirty: Dict[str, Optional[Set[int]]] = {}
+        for symbol, year in self.connection.execute('SELECT symbol, year FROM dirty ORDER BY rowid'):
+            if year is None:
+                dirty[symbol] = None
+            elif dirty.setdefault(symbol, set()) is not None:
+                dirty[symbol].add(year)
+        return dirty
+
+    def get_aggregate_version(self) -> int:
+        return self.aggregate_version
+
+    def clear_dirty(self) -> None:
+        if self.connection.execute('DELETE FROM dirty').rowcount:
+            self.aggregate_version += 1
+
+    def get_sector_symbols(self, sector: str) -> Set[str]:
+        return {row[0] for row in self.connection.execute('SELECT symbol FROM stocks WHERE sector = ? COLLATE NOCASE', (sector,))}
+
+    def find_symbols(self, year: int, source: str, field: str, operator: str, value: float) -> Set[str]:
+        if operator not in SQL_OPERATORS:
+            raise ValueError(f'Unknown operator: {operator}')
+        table, expressions = ('aggregates', AGGREGATE_EXPRESSIONS) if source == AGGREGATE else ('metrics', METRICS_EXPRESSIONS)
+        query = f'SELECT symbol FROM {table} WHERE year = ? AND {expressions[field]} {operator} ?'
+        return {row[0] for row in self.connection.execute(query, (year, value))}
+
+    def checkpoint(self) -> None:
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _delete_stock(self, symbol: str) -> None:
+        for table in ('stocks', 'metrics', 'aggregates', 'aggregate_statistics', 'price_series', 'dirty'):
+            self.connection.execute(f'DELETE FROM {table} WHERE symbol = ?', (symbol,))
+
+    def _iter_stocks(self, prices: bool) -> Iterator[Stock]:
+        last_id = 0
+        while True:
+            rows = self.connection.execute(SELECT_STOCKS, (last_id, CHUNK_SIZE)).fetchall()
+            if not rows:
+                return
+            yield from self._build_stocks(rows, prices)
+            last_id = rows[-1][0]
+
+    def _get_stock(self, symbol: str, prices: bool) -> Optional[Stock]:
+        rows = self.connection.execute(SELECT_STOCK, (symbol,)).fetchall()
+        return next(self._build_stocks(rows, prices), None)
+
+    def _build_stocks(self, rows: List[Tuple[int, str, str, str, Optional[float], Optional[str]]], prices: bool) -> Iterator[Stock]:
+        symbols = [row[1] for row in rows]
+        placeholders = ', '.join('?' * len(symbols))
+        stocks = {symbol: Stock(symbol, name, sector, current_price, aggregate_fingerprint=fingerprint)
+                  for _, symbol, name, sector, current_price, fingerprint in rows}
+        for row in self.connection.execute(SELECT_METRICS.format(placeholders), symbols):
+            stocks[row[0]].year_data[row[1]] = StockMetrics(*row[1:])
+        for row in self.connection.execute(SELECT_AGGREGATES.format(placeholders), symbols):
+            stocks[row[0]].aggregate_data[row[1]] = StockAggregate(*row[1:])
+        for symbol, year, name, value in self.connection.execute(SELECT_STATISTICS.format(placeholders), symbols):
+            aggregate = stocks[symbol].aggregate_data.get(year)
+            if aggregate is not None:
+                aggregate.statistics[name] = value
+        if prices:
+            for symbol, days, values in self.connection.execute(SELECT_PRICES.format(placeholders), symbols):
+                stocks[symbol].prices = _unpack_prices(days, values)
+        return iter(stocks.values())
+
+    def _save_aggregates(self, stocks: List[Stock]) -> None:
+        self.connection.executemany(UPSERT_AGGREGATE, self._aggregate_rows(stocks))
+        self.connection.executemany('DELETE FROM aggregate_statistics WHERE symbol = ?', [(stock.symbol,) for stock in stocks])
+        self.connection.executemany(INSERT_STATISTIC, self._statistic_rows(stocks))
+        self.connection.executemany('UPDATE stocks SET aggregate_fingerprint = ? WHERE symbol = ?',
+                                    [(stock.aggregate_fingerprint, stock.symbol) for stock in stocks])
+
+    def _stock_row(self, stock: Stock) -> Tuple:
+        return stock.symbol, stock.name, stock.sector, stock.current_price, stock.aggregate_fingerprint
+
+    def _metrics_row(self, symbol: str, metrics: StockMetrics) -> Tuple:
+        return (symbol, metrics.year, metrics.market_capitalization, metrics.earnings_per_share, metrics.closing_price,
+                metrics.book_value_per_share, metrics.dividend_per_share)
+
+    def _metrics_rows(self, stocks: Iterable[Stock]) -> Iterator[Tuple]:
+        for stock in stocks:
+            for metrics in stock.year_data.values():
+                yield self._metrics_row(stock.symbol, metrics)
+
+    def _aggregate_rows(self, stocks: Iterable[Stock]) -> Iterator[Tuple]:
+        for stock in stocks:
+            for aggregate in stock.aggregate_data.values():
+                yield (stock.symbol, aggregate.year, aggregate.earnings_per_share, aggregate.pe_ratio, aggregate.growth,
+                       aggregate.price_per_book_value, aggregate.dividend_yield)
+
+    def _price_rows(self, stocks: Iterable[Stock]) -> Iterator[Tuple]:
+        for stock in stocks:
+            if stock.prices:
+                yield _pack_prices(stock.symbol, stock.prices)
+
+    def _statistic_rows(self, stocks: Iterable[Stock]) -> Iterator[Tuple]:
+        for stock in stocks:
+            for aggregate in stock.aggregate_data.values():
+                for name, value in aggregate.statistics.items():
+                    yield stock.symbol, aggregate.year, name, value
+
+
+def _pack_prices(symbol: str, prices: PriceSeries) -> Tuple[str, bytes, bytes]:
+    days, values = prices.days, prices.prices
+    if sys.byteorder == 'big':
+        days, values = array('i', days), array('d', values)
+        days.byteswap()
+        values.byteswap()
+    return symbol, days.tobytes(), values.tobytes()
+
+
+def _unpack_prices(days: bytes, prices: bytes) -> PriceSeries:
+    series = PriceSeries()
+    series.days.frombytes(days)
+    series.prices.frombytes(prices)
+    if sys.byteorder == 'big':
+        series.days.byteswap()
+        series.prices.byteswap()
+    return series
+
+
+class SqliteStockMap(MutableMapping):
+    # The stocks of a SqliteRepository as a mapping; every access reads the database. Unlike the
+    # repository's own queries the stocks come with their daily prices, since a mapping is what
+    # persistence exports.
+
+    def __init__(self, repository: SqliteRepository) -> None:
+        self.repository = repository
+
+    def __getitem__(self, symbol: str) -> Stock:
+        stock = self.repository._get_stock(symbol, True)
+        if stock is None:
+            raise KeyError(symbol)
+        return stock
+
+    def __setitem__(self, symbol: str, stock: Stock) -> None:
+        self.repository.add_stock(stock)
+
+    def __delitem__(self, symbol: str) -> None:
+        if self.repository.get_stock(symbol) is None:
+            raise KeyError(symbol)
+        self.repository._delete_stock(symbol)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([row[0] for row in self.repository.connection.execute('SELECT symbol FROM stocks ORDER BY id')])
+
+    def __len__(self) -> int:
+        return self.repository.connection.execute('SELECT COUNT(*) FROM stocks').fetchone()[0]
+
+
+class SqlitePersistence(PersistenceInterface):
+    # Saving to or loading from the database the repository already uses is a checkpoint and a
+    # no-op respectively; any other file is an export or an import into memory.
+
+    def __init__(self, repository: Optional[SqliteRepository] = None) -> None:
+        self.repository = repository
+
+    def save_portfolio(self, filename: str, portfolio: Portfolio) -> None:
+        if self._is_active(filename):
+            self.repository.checkpoint()
+            return
+        temporary_filename = f'{filename}.tmp'
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+        repository = SqliteRepository(temporary_filename)
+        try:
+            repository.connection.execute('PRAGMA journal_mode = DELETE')
+            repository.set_portfolio(portfolio)
+            repository.checkpoint()
+        finally:
+            repository.close()
+        os.replace(temporary_filename, filename)
+
+    def load_portfolio(self, filename: str) -> Portfolio:
+        if self._is_active(filename):
+            return self.repository.get_portfolio()
+        if not os.path.exists(filename):
+            raise FileNotFoundError(filename)
+        # Built once into a plain dict: an SqliteStockMap builds a new Stock on every access, so the
+        # changes an in-memory repository makes to its stocks would be lost.
+        repository = SqliteRepository(filename)
+        try:
+            return Portfolio({stock.symbol: stock for stock in repository._iter_stocks(True)})
+        finally:
+            repository.close()
+
+    def _is_active(self, filename: str) -> bool:
+        return self.repository is not None and os.path.abspath(filename) == self.repository.filename
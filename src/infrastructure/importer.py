@@ -0,0 +1,26 @@
+import csv
+import json
+import os
+from typing import Any, Dict, Iterator
+from src.application.interface import RecordReaderInterface
+
+
+class FileRecordReader(RecordReaderInterface):
+
+    def read_records(self, filename: str) -> Iterator[Dict[str, Any]]:
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.csv':
+            return self._read_csv(filename)
+        elif extension in ('.jsonl', '.ndjson'):
+            return self._read_jsonl(filename)
+        raise ValueError(f'Unsupported import format: {extension}')
+
+    def _read_csv(self, filename: str) -> Iterator[Dict[str, Any]]:
+        with open(filename, newline='') as csv_file:
+            yield from csv.DictReader(csv_file)
+
+    def _read_jsonl(self, filename: str) -> Iterator[Dict[str, Any]]:
+        with open(filename) as jsonl_file:
+            for line in jsonl_file:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,163 @@
+import functools
+import io
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+from src.application.interface import PersistenceInterface
+from src.domain.stock import Portfolio
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    total_seconds: float = 0.0
+    min_seconds: float = math.inf
+    max_seconds: float = 0.0
+    rows: int = 0
+    # Size of the files saved or loaded, journal included; what a backend actually reads or writes may
+    # be less (a lazy binary load, a database checkpoint) or more.
+    file_bytes: int = 0
+    # Latency histogram: upper bound in microseconds (a power of two) -> number of calls.
+    histogram: Dict[int, int] = field(default_factory=dict)
+
+    def add(self, seconds: float, rows: int, file_bytes: int) -> None:
+        self.calls += 1
+        self.total_seconds += seconds
+        self.min_seconds = min(self.min_seconds, seconds)
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+        self.file_bytes += file_bytes
+        bucket = 2 ** max(0, math.ceil(math.log2(max(seconds * 1e6, 1))))
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def percentile(self, fraction: float) -> float:
+        threshold = fraction * self.calls
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= threshold:
+                return min(bucket / 1e6, self.max_seconds)
+        return self.max_seconds
+
+
+class Instrumentation:
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, StageStats] = {}
+        # cProfile and pstats are imported when profiling starts and stops, not at startup.
+        self.profiler: Optional['cProfile.Profile'] = None
+
+    def record(self, name: str, seconds: float, rows: int = 0, file_bytes: int = 0) -> None:
+        self.stages.setdefault(name, StageStats()).add(seconds, rows, file_bytes)
+
+    def measure(self, name: str, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.record(name, time.perf_counter() - start, result if isinstance(result, int) and not isinstance(result, bool) else 0)
+        return result
+
+    def start_profile(self) -> None:
+        if self.profiler is None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def stop_profile(self, filename: Optional[str] = None, limit: int = 20) -> str:
+        if self.profiler is None:
+            return ''
+        if filename:
+            self.profiler.dump_stats(filename)
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+        self.profiler = None
+        return output.getvalue()
+
+    def reset(self) -> None:
+        self.stages = {}
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                'calls': stats.calls,
+                'total_seconds': stats.total_seconds,
+                'mean_seconds': stats.total_seconds / stats.calls,
+                'min_seconds': stats.min_seconds,
+                'max_seconds': stats.max_seconds,
+                'p50_seconds': stats.percentile(0.5),
+                'p95_seconds': stats.percentile(0.95),
+                'rows': stats.rows,
+                'file_bytes': stats.file_bytes,
+                'histogram_us': {str(bucket): count for bucket, count in sorted(stats.histogram.items())},
+            }
+            for name, stats in sorted(self.stages.items())
+        }
+
+    def dump(self, filename: str) -> None:
+        with open(filename, 'w') as stats_file:
+            json.dump(self.to_dict(), stats_file, indent=4)
+
+
+class InstrumentedUseCase:
+
+    def __init__(self, use_case: Any, instrumentation: Instrumentation) -> None:
+        self.use_case = use_case
+        self.instrumentation = instrumentation
+        self.name = f'use_case.{type(use_case).__name__}'
+
+    def execute(self, *args: Any, **kwargs: Any) -> Any:
+        return self.instrumentation.measure(self.name, self.use_case.execute, *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.use_case, name)
+
+
+class InstrumentedPersistence(PersistenceInterface):
+
+    def __init__(self, persistence: PersistenceInterface, instrumentation: Instrumentation) -> None:
+        self.persistence = persistence
+        self.instrumentation = instrumentation
+
+    def save_portfolio(self, filename: str, portfolio: Portfolio) -> None:
+        start = time.perf_counter()
+        self.persistence.save_portfolio(filename, portfolio)
+        seconds = time.perf_counter() - start
+        self.instrumentation.record('persistence.save_portfolio', seconds, len(portfolio.stocks), self._size(filename))
+
+    def load_portfolio(self, filename: str) -> Portfolio:
+        start = time.perf_counter()
+        portfolio = self.persistence.load_portfolio(filename)
+        seconds = time.perf_counter() - start
+        self.instrumentation.record('persistence.load_portfolio', seconds, len(portfolio.stocks), self._size(filename))
+        return portfolio
+
+    def _size(self, filename: str) -> int:
+        size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        journal = f'{filename}.journal'
+        return size + (os.path.getsize(journal) if os.path.exists(journal) else 0)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.persistence, name)
+
+
+class InstrumentedPresenter:
+
+    def __init__(self, presenter: Any, instrumentation: Instrumentation) -> None:
+        self.presenter = presenter
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.presenter, name)
+        if not name.startswith('show_') or not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def show(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            result = attribute(*args, **kwargs)
+            rows = max([len(value) for value in args if isinstance(value, (list, tuple, dict))], default=0)
+            self.instrumentation.record(f'presenter.{name}', time.perf_counter() - start, rows)
+            return result
+        return show
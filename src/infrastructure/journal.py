@@ -0,0 +1,205 @@
+import json
+import os
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+from src.application.interface import PersistenceInterface, RepositoryInterface
+from src.domain.prices import PriceSeries
+from src.domain.stock import Portfolio, Stock, StockMetrics
+from src.infrastructure.json_coder import StreamingEncoder, metrics_from_dict, prices_from_dict, stock_from_dict
+
+JournalValue = Union[Stock, Tuple[str, StockMetrics], Tuple[str, float], Tuple[str, PriceSeries]]
+
+
+class JournalPersistence(PersistenceInterface):
+    # Saves append the mutations recorded since the previous save to <filename>.journal and only
+    # rewrite the snapshot once the journal reaches compact_threshold entries. Replaying is
+    # idempotent, so a crash between replacing the snapshot and truncating the journal is harmless.
+
+    def __init__(self, snapshot: PersistenceInterface, compact_threshold: int = 1000, fsync_batch_size: int = 1) -> None:
+        self.snapshot = snapshot
+        self.compact_threshold = compact_threshold
+        self.fsync_batch_size = fsync_batch_size
+        self.filename: Optional[str] = None
+        self.pending: List[Tuple[str, JournalValue]] = []
+        self.journal_entries = 0
+        self.unsynced_entries = 0
+        self.encoder = StreamingEncoder()
+
+    def record_stock(self, stock: Stock) -> None:
+        self.pending.append(('add_stock', stock))
+
+    def record_year_data(self, symbol: str, metrics: StockMetrics) -> None:
+        self.pending.append(('add_year_data', (symbol, metrics)))
+
+    def record_current_price(self, symbol: str, current_price: float) -> None:
+        self.pending.append(('update_current_price', (symbol, current_price)))
+
+    def record_prices(self, symbol: str, prices: PriceSeries) -> None:
+        self.pending.append(('add_prices', (symbol, prices)))
+
+    def save_portfolio(self, filename: str, portfolio: Portfolio) -> None:
+        if filename != self.filename or not os.path.exists(filename):
+            self.compact(filename, portfolio)
+            return
+        if self.pending:
+            with open(self._journal_filename(filename), 'a') as journal_file:
+                for operation, value in self.pending:
+                    journal_file.write(self._encode(operation, value))
+                journal_file.flush()
+                self.unsynced_entries += len(self.pending)
+                if self.unsynced_entries >= self.fsync_batch_size:
+                    os.fsync(journal_file.fileno())
+                    self.unsynced_entries = 0
+            self.journal_entries += len(self.pending)
+            self.pending = []
+        if self.journal_entries >= self.compact_threshold:
+            self.compact(filename, portfolio)
+
+    def load_portfolio(self, filename: str) -> Portfolio:
+        portfolio = self.snapshot.load_portfolio(filename) if os.path.exists(filename) else Portfolio()
+        touched: Dict[str, Optional[Set[int]]] = {}
+        self.journal_entries = 0
+        for operation, value in self._read_journal(filename):
+            if operation == 'add_stock':
+                portfolio.stocks[value.symbol] = value
+                touched[value.symbol] = None
+            elif operation == 'update_current_price':
+                symbol, current_price = value
+                if symbol in portfolio.stocks:
+                    portfolio.stocks[symbol].current_price = current_price
+            elif operation == 'add_prices':
+                symbol, prices = value
+                stock = portfolio.stocks.get(symbol)
+                if stock is not None:
+                    if stock.prices is None:
+                        stock.prices = PriceSeries()
+                    stock.prices.extend(prices.days, prices.prices)
+            else:
+                symbol, metrics = value
+                stock = portfolio.stocks.get(symbol)
+                if stock is not None:
+                    stock.year_data[metrics.year] = metrics
+                    years = touched.setdefault(symbol, set())
+                    if years is not None:
+                        years.add(metrics.year)
+            self.journal_entries += 1
+        for symbol, years in touched.items():
+            portfolio.stocks[symbol].update_aggregation(years)
+        self.filename = filename
+        self.pending = []
+        return portfolio
+
+    def compact(self, filename: str, portfolio: Portfolio) -> None:
+        root, extension = os.path.splitext(filename)
+        temporary_filename = f'{root}.tmp{extension}'
+        self.snapshot.save_portfolio(temporary_filename, portfolio)
+        os.replace(temporary_filename, filename)
+        with open(self._journal_filename(filename), 'w') as journal_file:
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self.filename = filename
+        self.pending = []
+        self.journal_entries = 0
+        self.unsynced_entries = 0
+
+    def _read_journal(self, filename: str) -> Iterator[Tuple[str, JournalValue]]:
+        journal_filename = self._journal_filename(filename)
+        if not os.path.exists(journal_filename):
+            return
+        with open(journal_filename, 'rb+') as journal_file:
+            offset = 0
+            for line in journal_file:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('incomplete journal entry')
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append; drop it so later appends start on a clean line.
+                    journal_file.truncate(offset)
+                    return
+                offset += len(line)
+                if entry['operation'] == 'add_stock':
+                    yield 'add_stock', stock_from_dict(entry['stock'])
+                elif entry['operation'] == 'update_current_price':
+                    yield 'update_current_price', (entry['symbol'], entry['current_price'])
+                elif entry['operation'] == 'add_prices':
+                    yield 'add_prices', (entry['symbol'], prices_from_dict(entry['prices']))
+                else:
+                    yield 'add_year_data', (entry['symbol'], metrics_from_dict(entry['metrics']))
+
+    def _encode(self, operation: str, value: JournalValue) -> str:
+        if operation == 'add_stock':
+            entry = {'operation': operation, 'stock': value}
+        elif operation == 'update_current_price':
+            entry = {'operation': operation, 'symbol': value[0], 'current_price': value[1]}
+        elif operation == 'add_prices':
+            entry = {'operation': operation, 'symbol': value[0], 'prices': value[1]}
+        else:
+            entry = {'operation': operation, 'symbol': value[0], 'metrics': value[1]}
+        return self.encoder.encode(entry) + '\n'
+
+    def _journal_filename(self, filename: str) -> str:
+        return f'{filename}.journal'
+
+
+class JournalingRepository(RepositoryInterface):
+
+    def __init__(self, repository: RepositoryInterface, journal: JournalPersistence) -> None:
+        self.repository = repository
+        self.journal = journal
+
+    def add_stock(self, stock: Stock) -> None:
+        self.repository.add_stock(stock)
+        self.journal.record_stock(stock)
+
+    def add_year_data(self, symbol: str, metrics: StockMetrics) -> None:
+        if self.repository.get_stock(symbol) is not None:
+            self.repository.add_year_data(symbol, metrics)
+            self.journal.record_year_data(symbol, metrics)
+
+    def add_year_data_batch(self, entries: List[Tuple[str, StockMetrics]]) -> None:
+        for symbol, metrics in entries:
+            self.add_year_data(symbol, metrics)
+
+    def update_current_price(self, symbol: str, current_price: float) -> None:
+        if self.repository.get_stock(symbol) is not None:
+            self.repository.update_current_price(symbol, current_price)
+            self.journal.record_current_price(symbol, current_price)
+
+    def add_prices(self, symbol: str, prices: PriceSeries) -> None:
+        if self.repository.get_stock(symbol) is not None:
+            self.repository.add_prices(symbol, prices)
+            self.journal.record_prices(symbol, prices)
+
+    def get_prices(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> Optional[PriceSeries]:
+        return self.repository.get_prices(symbol, start, end)
+
+    def save_aggregate_data(self, stocks: List[Stock]) -> None:
+        self.repository.save_aggregate_data(stocks)
+
+    def get_stocks(self) -> Iterator[Stock]:
+        return self.repository.get_stocks()
+
+    def get_stock(self, symbol: str) -> Optional[Stock]:
+        return self.repository.get_stock(symbol)
+
+    def get_portfolio(self) -> Portfolio:
+        return self.repository.get_portfolio()
+
+    def set_portfolio(self, portfolio: Portfolio) -> None:
+        self.repository.set_portfolio(portfolio)
+
+    def get_dirty_years(self) -> Dict[str, Optional[Set[int]]]:
+        return self.repository.get_dirty_years()
+
+    def get_aggregate_version(self) -> int:
+        return self.repository.get_aggregate_version()
+
+    def clear_dirty(self) -> None:
+        self.repository.clear_dirty()
+
+    def get_sector_symbols(self, sector: str) -> Set[str]:
+        return self.repository.get_sector_symbols(sector)
+
+    def find_symbols(self, year: int, source: str, field: str, operator: str, value: float) -> Set[str]:
+        return self.repository.find_symbols(year, source, field, operator, value)
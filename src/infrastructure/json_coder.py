@@ -1,18 +1,82 @@
 import json
-from typing import Any, Dict
+from json.encoder import encode_basestring_ascii
+from operator import attrgetter, itemgetter
+from datetime import date
+from math import isfinite
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
+from src.domain.prices import PriceSeries
 from src.domain.stock import Portfolio, Stock, StockAggregate, StockMetrics
 
+NUMBER, STRING, RECORD, RECORDS, NUMBERS, NUMBER_LIST, DAY_LIST = 'number', 'string', 'record', 'records', 'numbers', 'number_list', 'day_list'
+
+# The layout of each record type in the file: its object tag and its fields as (key, kind, optional),
+# in the order they are written. Optional fields are left out while they are None or empty.
+SCHEMAS: Dict[type, Tuple[str, Tuple[Tuple[str, str, bool], ...]]] = {
+    StockMetrics: ('StockMetrics', (
+        ('year', NUMBER, False),
+        ('market_capitalization', NUMBER, False),
+        ('earnings_per_share', NUMBER, False),
+        ('closing_price', NUMBER, False),
+        ('book_value_per_share', NUMBER, False),
+        ('dividend_per_share', NUMBER, False),
+    )),
+    StockAggregate: ('StockAggregate', (
+        ('year', NUMBER, False),
+        ('earnings_per_share', NUMBER, False),
+        ('pe_ratio', NUMBER, False),
+        ('growth', NUMBER, False),
+        ('price_per_book_value', NUMBER, False),
+        ('dividend_yield', NUMBER, False),
+        ('statistics', NUMBERS, True),
+    )),
+    Stock: ('Stock', (
+        ('symbol', STRING, False),
+        ('name', STRING, False),
+        ('sector', STRING, False),
+        ('current_price', NUMBER, False),
+        ('year_data', RECORDS, False),
+        ('aggregate_data', RECORDS, False),
+        ('aggregate_fingerprint', STRING, True),
+        ('prices', RECORD, True),
+    )),
+    # Days are written as ISO dates.
+    PriceSeries: ('PriceSeries', (
+        ('days', DAY_LIST, False),
+        ('prices', NUMBER_LIST, False),
+    )),
+}
+# Values of fields a record may lack, because it was written before the field existed or the field
+# is left out while empty. A field added to a schema gets its default here, so older files still load.
+DEFAULTS: Dict[type, Dict[str, Any]] = {
+    StockMetrics: {'market_capitalization': None, 'book_value_per_share': None},
+    StockAggregate: {'pe_ratio': None, 'growth': None, 'price_per_book_value': None},
+    Stock: {'current_price': None},
+}
+# The version of the portfolio layout written to the file. Version 1 files carry no version and name
+# the dividend yield of an aggregate dividends_yield.
+FORMAT_VERSION = 2
+# Numbers whose repr is not what json writes for them.
+SPECIAL_NUMBERS = {'None': 'null', 'nan': 'NaN', 'inf': 'Infinity', '-inf': '-Infinity'}
+
+
+class JsonLiteral(str):
+    # Text that %r puts into a template unquoted.
+
+    def __repr__(self) -> str:
+        return str(self)
+
 
 class StockEncoder(json.JSONEncoder):
     def default(self, object: Any) -> Any:
         if isinstance(object, Portfolio):
             return {
                 'object': 'Portfolio',
-                'stocks': object.stocks
+                'version': FORMAT_VERSION,
+                'stocks': dict(object.stocks)
             }
         elif isinstance(object, Stock):
-            return {
+            encoded = {
                 'object': 'Stock',
                 'symbol': object.symbol,
                 'name': object.name,
@@ -21,6 +85,11 @@ class StockEncoder(json.JSONEncoder):
                 'year_data': object.year_data,
                 'aggregate_data': object.aggregate_data
             }
+            if object.aggregate_fingerprint is not None:
+                encoded['aggregate_fingerprint'] = object.aggregate_fingerprint
+            if object.prices:
+                encoded['prices'] = object.prices
+            return encoded
         elif isinstance(object, StockMetrics):
             return {
                 'object': 'StockMetrics',
@@ -32,28 +101,368 @@ class StockEncoder(json.JSONEncoder):
                 'dividend_per_share': object.dividend_per_share,
             }
         elif isinstance(object, StockAggregate):
-            return {
+            encoded = {
                 'object': 'StockAggregate',
                 'year': object.year,
                 'earnings_per_share': object.earnings_per_share,
                 'pe_ratio': object.pe_ratio,
                 'growth': object.growth,
                 'price_per_book_value': object.price_per_book_value,
-                'dividends_yield': object.dividend_yield,
+                'dividend_yield': object.dividend_yield,
+            }
+            if object.statistics:
+                encoded['statistics'] = object.statistics
+            return encoded
+        elif isinstance(object, PriceSeries):
+            return {
+                'object': 'PriceSeries',
+                'days': [day.isoformat() for day, _ in object],
+                'prices': list(object.prices),
             }
         else:
             return super().default(object)
-        
+
 
 def decode_stock(object: Dict) -> Portfolio:
+    # A hook does not know the version of the file, so the dicts of every version are accepted.
     if "object" in object:
         if object['object'] == 'Portfolio':
+            check_version(object.get('version', 1))
             stocks = object['stocks']
             return Portfolio(stocks)
         elif object['object'] == 'Stock':
-            return Stock(object['symbol'], object['name'], object['sector'], object['current_price'], {int(year): data for year, data in object['year_data'].items()}, {int(year): data for year, data in object['aggregate_data'].items()})
+            return Stock(object['symbol'], object['name'], object['sector'], object.get('current_price'), {int(year): data for year, data in object.get('year_data', {}).items()}, {int(year): data for year, data in object.get('aggregate_data', {}).items()}, object.get('aggregate_fingerprint'), object.get('prices'))
         elif object['object'] == 'StockMetrics':
-            return StockMetrics(object['year'], object['market_capitalization'], object['earnings_per_share'], object['closing_price'], object['book_value_per_share'], object['dividend_per_share'])
+            return metrics_from_dict(object)
+        elif object['object'] == 'PriceSeries':
+            return prices_from_dict(object)
         elif object['object'] == 'StockAggregate':
-            return StockAggregate(object['year'], object['earnings_per_share'], object['pe_ratio'], object['growth'], object['price_per_book_value'], object['dividends_yield'])
+            return aggregate_from_dict(object)
     return object
+
+
+class StreamingEncoder:
+    # Writes the same text as json.dumps(value, cls=StockEncoder, indent=indent), but fills a template
+    # per record layout instead of building a dict per object, and yields a portfolio stock by stock.
+    # Plain dicts are encoded too, so journal entries can hold stocks and metrics.
+
+    def __init__(self, indent: Optional[int] = None) -> None:
+        self.indent = indent
+        self.getters = {record_type: attrgetter(*(key for key, _, _ in fields)) for record_type, (_, fields) in SCHEMAS.items()}
+        # The required numbers a layout starts with are encoded in one pass, without the per-field dispatch.
+        self.leading_numbers = {record_type: next((index for index, (_, kind, optional) in enumerate(fields) if kind is not NUMBER or optional), len(fields))
+                                for record_type, (_, fields) in SCHEMAS.items()}
+        self.templates: Dict[Tuple[type, int, Tuple[str, ...]], str] = {}
+
+    def encode(self, value: Any) -> str:
+        return ''.join(self.iterencode(value))
+
+    def iterencode(self, value: Any) -> Iterator[str]:
+        if isinstance(value, Portfolio):
+            yield from self.iterencode_stocks(value.stocks.items())
+        else:
+            yield self._value(value, 0)
+
+    def iterencode_stocks(self, stocks: Iterable[Tuple[str, Stock]]) -> Iterator[str]:
+        # A portfolio of the given (symbol, stock) pairs, which may be produced while it is written.
+        separator = self._separator(1)
+        yield f'{{{self._newline(1)}"object": "Portfolio"{separator}"version": {FORMAT_VERSION}{separator}"stocks": '
+        first = True
+        for symbol, stock in stocks:
+            yield f'{{{self._newline(2)}' if first else self._separator(2)
+            yield f'{encode_basestring_ascii(symbol)}: {self._record(stock, 2)}'
+            first = False
+        yield f'{{}}{self._newline(0)}}}' if first else f'{self._newline(1)}}}{self._newline(0)}}}'
+
+    def _value(self, value: Any, depth: int) -> str:
+        if type(value) in SCHEMAS:
+            return self._record(value, depth)
+        elif isinstance(value, dict):
+            return self._mapping([(encode_basestring_ascii(str(key)), self._value(item, depth + 1)) for key, item in value.items()], depth)
+        return json.dumps(value)
+
+    def _record(self, value: Any, depth: int) -> str:
+        record_type = type(value)
+        fields = SCHEMAS[record_type][1]
+        values = self.getters[record_type](value)
+        leading = self.leading_numbers[record_type]
+        numbers = values[:leading]
+        if None in numbers or not all(map(isfinite, numbers)):
+            numbers = tuple(_number(item) for item in numbers)
+        encoded = []
+        present = []
+        for (key, kind, optional), item in zip(fields[leading:], values[leading:]):
+            if optional and not item:
+                continue
+            if kind is NUMBER:
+                encoded.append(_number(item))
+            elif kind is STRING:
+                encoded.append('null' if item is None else encode_basestring_ascii(item))
+            elif kind is RECORD:
+                encoded.append(self._record(item, depth + 1))
+            elif kind is DAY_LIST:
+                encoded.append(self._list([f'"{date.fromordinal(day).isoformat()}"' for day in item], depth + 1))
+            elif kind is NUMBER_LIST:
+                encoded.append(self._list([SPECIAL_NUMBERS.get(text, text) for text in map(repr, item)], depth + 1))
+            elif kind is RECORDS:
+                encoded.append(self._mapping([(f'"{key}"', self._record(record, depth + 2)) for key, record in item.items()], depth + 1))
+            else:
+                encoded.append(self._mapping([(encode_basestring_ascii(key), _number(number)) for key, number in item.items()], depth + 1))
+            present.append(key)
+        template_key = (record_type, depth, tuple(present))
+        template = self.templates.get(template_key)
+        if template is None:
+            template = self.templates[template_key] = self._template(record_type, depth, present)
+        return template % (numbers + tuple(encoded))
+
+    def _template(self, record_type: type, depth: int, keys: List[str]) -> str:
+        # The leading numbers are filled in with %r, which is how json writes finite floats and ints.
+        tag, fields = SCHEMAS[record_type]
+        items = ([f'"object": "{tag}"'] + [f'"{key}": %r' for key, _, _ in fields[:self.leading_numbers[record_type]]]
+                 + [f'"{key}": %s' for key in keys])
+        return f'{{{self._newline(depth + 1)}{self._separator(depth + 1).join(items)}{self._newline(depth)}}}'
+
+    def _mapping(self, items: Any, depth: int) -> str:
+        if not items:
+            return '{}'
+        inner = self._separator(depth + 1).join(f'{key}: {value}' for key, value in items)
+        return f'{{{self._newline(depth + 1)}{inner}{self._newline(depth)}}}'
+
+    def _list(self, items: List[str], depth: int) -> str:
+        if not items:
+            return '[]'
+        return f'[{self._newline(depth + 1)}{self._separator(depth + 1).join(items)}{self._newline(depth)}]'
+
+    def _newline(self, depth: int) -> str:
+        return '' if self.indent is None else '\n' + ' ' * (self.indent * depth)
+
+    def _separator(self, depth: int) -> str:
+        return ', ' if self.indent is None else ',' + self._newline(depth)
+
+
+def dump_portfolio(portfolio: Portfolio, output: TextIO, indent: Optional[int] = None) -> None:
+    for chunk in StreamingEncoder(indent).iterencode(portfolio):
+        output.write(chunk)
+
+
+def load_portfolio(input: TextIO) -> Portfolio:
+    # The whole document is parsed by json.load in C, which is faster than the chunked reader that
+    # migrate_portfolio uses to keep a single stock in memory.
+    return portfolio_from_dict(json.load(input))
+
+
+def check_version(version: int) -> int:
+    if version > FORMAT_VERSION:
+        raise ValueError(f'Portfolio format version {version} is newer than the supported {FORMAT_VERSION}')
+    return version
+
+
+def iterdecode_stocks(input: TextIO, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, Stock]]:
+    # The stocks of a portfolio file of any supported version, one at a time.
+    reader = PortfolioReader(input, chunk_size)
+    for symbol, data in reader:
+        yield symbol, stock_from_dict(upgrade_stock(data, reader.version))
+    # A portfolio without stocks never asked for its version, and a newer one must be refused all the same.
+    check_version(reader.header.get('version', 1))
+
+
+def migrate_portfolio(input: TextIO, output: TextIO, indent: Optional[int] = None, chunk_size: int = 1 << 20) -> int:
+    # Rewrites a portfolio file in the current version stock by stock, so at most one stock and a chunk
+    # of the input are in memory whatever the size of the file. Returns the number of stocks.
+    count = 0
+
+    def stocks() -> Iterator[Tuple[str, Stock]]:
+        nonlocal count
+        for symbol, stock in iterdecode_stocks(input, chunk_size):
+            count += 1
+            yield symbol, stock
+
+    for chunk in StreamingEncoder(indent).iterencode_stocks(stocks()):
+        output.write(chunk)
+    return count
+
+
+class PortfolioReader:
+    # Iterates over the (symbol, stock dict) pairs of a portfolio file while reading it in chunks. The
+    # json scanner parses one stock at a time, so only that stock's dicts are alive at once, and the
+    # top-level keys other than stocks are collected in header.
+
+    def __init__(self, input: TextIO, chunk_size: int = 1 << 20) -> None:
+        self.input = input
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.exhausted = False
+        self.header: Dict[str, Any] = {}
+
+    @property
+    def version(self) -> int:
+        # Known once the stocks are reached, the version is written before them.
+        return check_version(self.header.get('version', 1))
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict]]:
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'stocks':
+                yield from self._stocks()
+            else:
+                self.header[key] = self._value()
+            if self._expect(',}') == '}':
+                return
+
+    def _stocks(self) -> Iterator[Tuple[str, Dict]]:
+        self._expect('{')
+        if self._peek() == '}':
+            self.position += 1
+            return
+        while True:
+            symbol = self._value()
+            self._expect(':')
+            yield symbol, self._value()
+            if self._expect(',}') == '}':
+                return
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number cut off by the end of the chunk still parses, so a value must be followed by
+            # more text before it is taken.
+            if end < len(self.buffer) or not self._fill():
+                self.position = end
+                return value
+
+    def _peek(self) -> str:
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\n\r':
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                raise json.JSONDecodeError('Unexpected end of portfolio', self.buffer, self.position)
+
+    def _expect(self, characters: str) -> str:
+        character = self._peek()
+        if character not in characters:
+            raise json.JSONDecodeError(f'Expecting one of {characters!r}', self.buffer, self.position)
+        self.position += 1
+        return character
+
+    def _fill(self) -> bool:
+        # Reads at least as much as is buffered, so a value larger than a chunk is rescanned only a
+        # logarithmic number of times.
+        if self.exhausted:
+            return False
+        chunk = self.input.read(max(self.chunk_size, len(self.buffer) - self.position))
+        if not chunk:
+            self.exhausted = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+
+# Decoding parses with plain json and builds the objects from the known structure, instead of an
+# object_hook that is called, and branches on the tag, for every dict in the file.
+
+_STOCK_VALUES = itemgetter(*(key for key, _, _ in SCHEMAS[Stock][1][:4]))
+_METRICS_VALUES = itemgetter(*(key for key, _, _ in SCHEMAS[StockMetrics][1]))
+_AGGREGATE_VALUES = itemgetter(*(key for key, _, optional in SCHEMAS[StockAggregate][1] if not optional))
+
+
+def portfolio_from_dict(data: Dict) -> Portfolio:
+    version = check_version(data.get('version', 1))
+    if version == FORMAT_VERSION:
+        return Portfolio({symbol: stock_from_dict(stock) for symbol, stock in data['stocks'].items()})
+    return Portfolio({symbol: stock_from_dict(upgrade_stock(stock, version)) for symbol, stock in data['stocks'].items()})
+
+
+def stock_from_dict(data: Dict) -> Stock:
+    prices = prices_from_dict(data['prices']) if 'prices' in data else None
+    try:
+        # A stock written by this version has every required field, so its records are built inline.
+        return Stock(*_STOCK_VALUES(data),
+                     {int(year): StockMetrics(*_METRICS_VALUES(metrics)) for year, metrics in data['year_data'].items()},
+                     {int(year): StockAggregate(*_AGGREGATE_VALUES(aggregate), aggregate.get('statistics', {}))
+                      for year, aggregate in data['aggregate_data'].items()},
+                     data.get('aggregate_fingerprint'), prices)
+    except KeyError:
+        return Stock(*_field_values(Stock, data, 4),
+                     {int(year): metrics_from_dict(metrics) for year, metrics in data.get('year_data', {}).items()},
+                     {int(year): aggregate_from_dict(aggregate) for year, aggregate in data.get('aggregate_data', {}).items()},
+                     data.get('aggregate_fingerprint'), prices)
+
+
+def metrics_from_dict(data: Dict) -> StockMetrics:
+    try:
+        return StockMetrics(*_METRICS_VALUES(data))
+    except KeyError:
+        return StockMetrics(*_field_values(StockMetrics, data))
+
+
+def prices_from_dict(data: Dict) -> PriceSeries:
+    return PriceSeries([date.fromisoformat(day).toordinal() for day in data['days']], data['prices'])
+
+
+def aggregate_from_dict(data: Dict) -> StockAggregate:
+    try:
+        values = _AGGREGATE_VALUES(data)
+    except KeyError:
+        # Dicts without a version, from the journal or an object_hook, may still use the version 1 key.
+        values = _field_values(StockAggregate, _upgrade_aggregate_from_1(data))
+    return StockAggregate(*values, data.get('statistics', {}))
+
+
+def upgrade_stock(data: Dict, version: int) -> Dict:
+    # Brings the dict of a stock read from a file of the given version to the current layout.
+    for from_version in range(version, FORMAT_VERSION):
+        data = MIGRATIONS[from_version](data)
+    return data
+
+
+def _upgrade_from_1(data: Dict) -> Dict:
+    for aggregate in data.get('aggregate_data', {}).values():
+        _upgrade_aggregate_from_1(aggregate)
+    return data
+
+
+def _upgrade_aggregate_from_1(data: Dict) -> Dict:
+    if 'dividends_yield' in data:
+        data['dividend_yield'] = data.pop('dividends_yield')
+    return data
+
+
+# Upgrades of a stock dict from a version to the next one.
+MIGRATIONS: Dict[int, Callable[[Dict], Dict]] = {1: _upgrade_from_1}
+
+
+def _field_values(record_type: type, data: Dict, count: Optional[int] = None) -> Tuple[Any, ...]:
+    # The first count required fields of a record in schema order, defaults filled in for missing ones.
+    tag, fields = SCHEMAS[record_type]
+    defaults = DEFAULTS.get(record_type, {})
+    values = []
+    for key, _, optional in fields[:count]:
+        if optional:
+            continue
+        if key in data:
+            values.append(data[key])
+        elif key in defaults:
+            values.append(defaults[key])
+        else:
+            raise ValueError(f'{tag} without {key}')
+    return tuple(values)
+
+
+def _number(value: Any) -> JsonLiteral:
+    text = repr(value)
+    return JsonLiteral(SPECIAL_NUMBERS.get(text, text))
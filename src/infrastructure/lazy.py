@@ -0,0 +1,19 @@
+import threading
+from typing import Any, Callable
+
+
+class Lazy:
+    # Stands in for the object factory() returns and builds it on first attribute access, so its
+    # construction and the modules the factory imports are only paid for once a command uses it.
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return getattr(self._target, name)
@@ -1,15 +1,357 @@
-import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple
 from src.application.interface import PersistenceInterface
-from src.domain.stock import Portfolio
-from src.infrastructure.json_coder import StockEncoder, decode_stock
+from src.domain.prices import PriceSeries
+from src.domain.stock import Portfolio, Stock, StockAggregate, StockMetrics
+from src.infrastructure.json_coder import dump_portfolio, load_portfolio
 
 
 class JSONPersistence(PersistenceInterface):
 
     def save_portfolio(self, filename: str, portfolio: Portfolio) -> None:
         with open(filename, 'w') as json_file:
-            json.dump(portfolio, json_file, cls=StockEncoder, indent=4)
+            dump_portfolio(portfolio, json_file, indent=4)
 
     def load_portfolio(self, filename: str) -> Portfolio:
         with open(filename) as json_file:
-            return json.load(json_file, object_hook=decode_stock)
+            return load_portfolio(json_file)
+
+
+BINARY_MAGIC = b'ATTC'
+BINARY_VERSION = 3
+BINARY_HEADER = struct.Struct('<4sHI')
+BINARY_STRING = struct.Struct('<H')
+BINARY_COUNT = struct.Struct('<I')
+BINARY_STOCK = struct.Struct('<dII')
+BINARY_ALIGNMENT = 8
+METRICS_TYPECODES = 'iddddd'
+AGGREGATE_TYPECODES = 'iddddd'
+PRICE_TYPECODES = 'id'
+MAX_STATISTICS = 64
+NAN = float('nan')
+# symbol, name, sector, current price, year count, aggregate count, fingerprint, price count
+BinaryEntry = Tuple[str, str, str, float, int, int, Optional[str], int]
+
+
+class BinaryPersistence(PersistenceInterface):
+    # Layout: header, one metadata record per stock, then the year data and aggregates of all
+    # stocks as little-endian columns (int32 years followed by float64 values, NaN for None).
+    # Version 2 adds the names of the rolling statistics after the metadata records and, after the
+    # aggregate columns, a uint64 column flagging which statistics each aggregate has plus one column
+    # per name. Version 3 adds the aggregate fingerprint (empty for None) and the number of daily
+    # prices to the metadata records and, last, the days (int32 ordinals) and prices of all stocks as
+    # two more columns. A file is written with the lowest version that holds its data.
+
+    def __init__(self, lazy: bool = False) -> None:
+        self.lazy = lazy
+
+    def save_portfolio(self, filename: str, portfolio: Portfolio) -> None:
+        stocks = list(portfolio.stocks.values())
+        metrics = [metric for stock in stocks for metric in stock.year_data.values()]
+        aggregates = [aggregate for stock in stocks for aggregate in stock.aggregate_data.values()]
+        names = list(dict.fromkeys(name for aggregate in aggregates for name in aggregate.statistics))
+        if len(names) > MAX_STATISTICS:
+            raise ValueError(f'The binary format stores at most {MAX_STATISTICS} rolling statistics')
+
+        if any(stock.prices or stock.aggregate_fingerprint is not None for stock in stocks):
+            version = 3
+        elif names:
+            version = 2
+        else:
+            version = 1
+        header = bytearray(BINARY_HEADER.pack(BINARY_MAGIC, version, len(stocks)))
+        for stock in stocks:
+            for text in (stock.symbol, stock.name, stock.sector):
+                header += self._pack_string(text)
+            if version >= 3:
+                header += self._pack_string(stock.aggregate_fingerprint or '')
+            header += BINARY_STOCK.pack(self._to_float(stock.current_price), len(stock.year_data), len(stock.aggregate_data))
+            if version >= 3:
+                header += BINARY_COUNT.pack(len(stock.prices) if stock.prices else 0)
+        if version >= 2:
+            header += BINARY_COUNT.pack(len(names))
+            for name in names:
+                header += self._pack_string(name)
+
+        columns = [
+            array('i', [metric.year for metric in metrics]),
+            array('d', [self._to_float(metric.market_capitalization) for metric in metrics]),
+            array('d', [metric.earnings_per_share for metric in metrics]),
+            array('d', [metric.closing_price for metric in metrics]),
+            array('d', [self._to_float(metric.book_value_per_share) for metric in metrics]),
+            array('d', [metric.dividend_per_share for metric in metrics]),
+            array('i', [aggregate.year for aggregate in aggregates]),
+            array('d', [self._to_float(aggregate.earnings_per_share) for aggregate in aggregates]),
+            array('d', [self._to_float(aggregate.pe_ratio) for aggregate in aggregates]),
+            array('d', [self._to_float(aggregate.growth) for aggregate in aggregates]),
+            array('d', [self._to_float(aggregate.price_per_book_value) for aggregate in aggregates]),
+            array('d', [self._to_float(aggregate.dividend_yield) for aggregate in aggregates]),
+        ]
+        if names:
+            bits = {name: 1 << bit for bit, name in enumerate(names)}
+            columns.append(array('Q', [sum(bits[name] for name in aggregate.statistics) for aggregate in aggregates]))
+            columns += [array('d', [self._to_float(aggregate.statistics.get(name)) for aggregate in aggregates]) for name in names]
+        if version >= 3:
+            series = [stock.prices for stock in stocks if stock.prices]
+            columns.append(array('i', b''.join(prices.days.tobytes() for prices in series)))
+            columns.append(array('d', b''.join(prices.prices.tobytes() for prices in series)))
+
+        temporary_filename = f'{filename}.tmp'
+        with open(temporary_filename, 'wb') as binary_file:
+            binary_file.write(header)
+            offset = len(header)
+            for column in columns:
+                padding = -offset % BINARY_ALIGNMENT
+                binary_file.write(bytes(padding))
+                if sys.byteorder == 'big':
+                    column.byteswap()
+                binary_file.write(column.tobytes())
+                offset += padding + len(column) * column.itemsize
+        os.replace(temporary_filename, filename)
+
+    def load_portfolio(self, filename: str) -> Portfolio:
+        if self.lazy:
+            return Portfolio(LazyStockMap(filename))
+        with open(filename, 'rb') as binary_file:
+            data = binary_file.read()
+        entries, names, offset = read_binary_index(data)
+        year_count = sum(entry[4] for entry in entries)
+        aggregate_count = sum(entry[5] for entry in entries)
+        price_count = sum(entry[7] for entry in entries)
+        aggregate_typecodes = binary_aggregate_typecodes(names)
+        year_offsets, offset = binary_column_offsets(offset, year_count, METRICS_TYPECODES)
+        aggregate_offsets, offset = binary_column_offsets(offset, aggregate_count, aggregate_typecodes)
+        price_offsets, _ = binary_column_offsets(offset, price_count, PRICE_TYPECODES)
+        year_columns = [read_binary_column(data, column_offset, typecode, 0, year_count)
+                        for column_offset, typecode in zip(year_offsets, METRICS_TYPECODES)]
+        aggregate_columns = [read_binary_column(data, column_offset, typecode, 0, aggregate_count)
+                             for column_offset, typecode in zip(aggregate_offsets, aggregate_typecodes)]
+        price_columns = [read_binary_column(data, column_offset, typecode, 0, price_count)
+                         for column_offset, typecode in zip(price_offsets, PRICE_TYPECODES)]
+        return Portfolio({stock.symbol: stock for stock in build_binary_stocks(entries, year_columns, aggregate_columns, names, price_columns)})
+
+    def _to_float(self, value: Optional[float]) -> float:
+        return NAN if value is None else value
+
+    def _pack_string(self, text: str) -> bytes:
+        encoded = text.encode('utf-8')
+        return BINARY_STRING.pack(len(encoded)) + encoded
+
+
+class LazyStockMap(MutableMapping):
+    # Maps the binary file into memory and only builds a Stock when its symbol is first accessed.
+
+    def __init__(self, filename: str) -> None:
+        with open(filename, 'rb') as binary_file:
+            self.data = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ)
+        entries, names, offset = read_binary_index(self.data)
+        self.entries = entries
+        self.names = names
+        self.aggregate_typecodes = binary_aggregate_typecodes(names)
+        self.positions: Dict[str, Optional[int]] = {}
+        self.year_starts: List[int] = []
+        self.aggregate_starts: List[int] = []
+        self.price_starts: List[int] = []
+        year_count = 0
+        aggregate_count = 0
+        price_count = 0
+        for position, entry in enumerate(entries):
+            self.positions[entry[0]] = position
+            self.year_starts.append(year_count)
+            self.aggregate_starts.append(aggregate_count)
+            self.price_starts.append(price_count)
+            year_count += entry[4]
+            aggregate_count += entry[5]
+            price_count += entry[7]
+        self.year_offsets, offset = binary_column_offsets(offset, year_count, METRICS_TYPECODES)
+        self.aggregate_offsets, offset = binary_column_offsets(offset, aggregate_count, self.aggregate_typecodes)
+        self.price_offsets, _ = binary_column_offsets(offset, price_count, PRICE_TYPECODES)
+        self.stocks: Dict[str, Stock] = {}
+        # Concurrent queries for a stock not built yet wait for one build, so they get the same object.
+        self.lock = threading.Lock()
+
+    def __getitem__(self, symbol: str) -> Stock:
+        stock = self.stocks.get(symbol)
+        if stock is not None:
+            return stock
+        with self.lock:
+            stock = self.stocks.get(symbol)
+            return stock if stock is not None else self._build(symbol)
+
+    def _build(self, symbol: str) -> Stock:
+        position = self.positions[symbol]
+        entry = self.entries[position]
+        year_columns = [read_binary_column(self.data, column_offset, typecode, self.year_starts[position], entry[4])
+                        for column_offset, typecode in zip(self.year_offsets, METRICS_TYPECODES)]
+        aggregate_columns = [read_binary_column(self.data, column_offset, typecode, self.aggregate_starts[position], entry[5])
+                             for column_offset, typecode in zip(self.aggregate_offsets, self.aggregate_typecodes)]
+        price_columns = [read_binary_column(self.data, column_offset, typecode, self.price_starts[position], entry[7])
+                         for column_offset, typecode in zip(self.price_offsets, PRICE_TYPECODES)]
+        stock = next(build_binary_stocks([entry], year_columns, aggregate_columns, self.names, price_columns))
+        self.stocks[symbol] = stock
+        return stock
+
+    def unaggregated_symbols(self) -> List[str]:
+        # The symbols of the stocks that are not is_aggregated(), read from the index for the ones not built yet.
+        symbols = []
+        for symbol, position in self.positions.items():
+            stock = self.stocks.get(symbol)
+            if stock is not None:
+                aggregated = stock.is_aggregated()
+            else:
+                entry = self.entries[position]
+                aggregated = not entry[4] or (entry[5] > 0 and entry[6] is not None)
+            if not aggregated:
+                symbols.append(symbol)
+        return symbols
+
+    def __setitem__(self, symbol: str, stock: Stock) -> None:
+        self.positions.setdefault(symbol, None)
+        self.stocks[symbol] = stock
+
+    def __delitem__(self, symbol: str) -> None:
+        del self.positions[symbol]
+        self.stocks.pop(symbol, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.positions)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def close(self) -> None:
+        # Unmaps the file; the stocks built so far stay usable, the others can no longer be read.
+        self.data.close()
+
+
+def read_binary_index(data: bytes) -> Tuple[List[BinaryEntry], List[str], int]:
+    magic, version, count = BINARY_HEADER.unpack_from(data, 0)
+    if magic != BINARY_MAGIC:
+        raise ValueError('Not a binary portfolio file')
+    if version > BINARY_VERSION:
+        raise ValueError(f'Unsupported binary portfolio version: {version}')
+    try:
+        index = _read_binary_index(data, count, version >= 2, version >= 3, version >= 3)
+    except (struct.error, UnicodeDecodeError) as error:
+        raise ValueError(f'Corrupt binary portfolio file: {error}') from error
+    if binary_data_end(*index) != len(data):
+        raise ValueError('Corrupt binary portfolio file: its size does not match its index')
+    return index
+
+
+def _read_binary_index(data: bytes, count: int, names: bool, fingerprints: bool, prices: bool) -> Tuple[List[BinaryEntry], List[str], int]:
+    offset = BINARY_HEADER.size
+    entries = []
+    for _ in range(count):
+        texts = []
+        for _ in range(4 if fingerprints else 3):
+            text, offset = read_binary_string(data, offset)
+            texts.append(text)
+        current_price, year_total, aggregate_total = BINARY_STOCK.unpack_from(data, offset)
+        offset += BINARY_STOCK.size
+        price_total = 0
+        if prices:
+            price_total, = BINARY_COUNT.unpack_from(data, offset)
+            offset += BINARY_COUNT.size
+        fingerprint = texts[3] if fingerprints and texts[3] else None
+        entries.append((texts[0], texts[1], texts[2], current_price, year_total, aggregate_total, fingerprint, price_total))
+    statistic_names = []
+    if names:
+        name_count, = BINARY_COUNT.unpack_from(data, offset)
+        offset += BINARY_COUNT.size
+        for _ in range(name_count):
+            name, offset = read_binary_string(data, offset)
+            statistic_names.append(name)
+    return entries, statistic_names, offset
+
+
+def binary_data_end(entries: List[BinaryEntry], names: List[str], offset: int) -> int:
+    # Where the columns that follow an index read up to offset end.
+    _, offset = binary_column_offsets(offset, sum(entry[4] for entry in entries), METRICS_TYPECODES)
+    _, offset = binary_column_offsets(offset, sum(entry[5] for entry in entries), binary_aggregate_typecodes(names))
+    _, offset = binary_column_offsets(offset, sum(entry[7] for entry in entries), PRICE_TYPECODES)
+    return offset
+
+
+def read_binary_string(data: bytes, offset: int) -> Tuple[str, int]:
+    length, = BINARY_STRING.unpack_from(data, offset)
+    offset += BINARY_STRING.size
+    return bytes(data[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def binary_aggregate_typecodes(names: List[str]) -> str:
+    return AGGREGATE_TYPECODES + ('Q' + 'd' * len(names) if names else '')
+
+
+def binary_column_offsets(offset: int, count: int, typecodes: str) -> Tuple[List[int], int]:
+    offsets = []
+    for typecode in typecodes:
+        offset += -offset % BINARY_ALIGNMENT
+        offsets.append(offset)
+        offset += count * array(typecode).itemsize
+    return offsets, offset
+
+
+def read_binary_column(data: bytes, offset: int, typecode: str, start: int, count: int) -> array:
+    column = array(typecode)
+    column.frombytes(data[offset + start * column.itemsize:offset + (start + count) * column.itemsize])
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def build_binary_stocks(entries: List[BinaryEntry], year_columns: List[array], aggregate_columns: List[array],
+                        names: Optional[List[str]] = None, price_columns: Optional[List[array]] = None) -> Iterator[Stock]:
+    years, market_capitalization, earnings_per_share, closing_price, book_value_per_share, dividend_per_share = year_columns
+    metrics = list(map(StockMetrics, years, to_optional(market_capitalization), earnings_per_share, closing_price,
+                       to_optional(book_value_per_share), dividend_per_share))
+    aggregate_years = aggregate_columns[0]
+    field_count = len(AGGREGATE_TYPECODES)
+    aggregates = list(map(StockAggregate, aggregate_years, *[to_optional(column) for column in aggregate_columns[1:field_count]]))
+    if names:
+        masks = aggregate_columns[field_count]
+        values = [to_optional(column) for column in aggregate_columns[field_count + 1:]]
+        for index, mask in enumerate(masks):
+            if mask:
+                aggregates[index].statistics = {name: values[bit][index] for bit, name in enumerate(names) if mask >> bit & 1}
+    days, prices = price_columns if price_columns else (array('i'), array('d'))
+    year_start = 0
+    aggregate_start = 0
+    price_start = 0
+    for symbol, name, sector, current_price, year_total, aggregate_total, fingerprint, price_total in entries:
+        year_end = year_start + year_total
+        aggregate_end = aggregate_start + aggregate_total
+        price_end = price_start + price_total
+        yield Stock(symbol, name, sector, None if current_price != current_price else current_price,
+                    dict(zip(years[year_start:year_end], metrics[year_start:year_end])),
+                    dict(zip(aggregate_years[aggregate_start:aggregate_end], aggregates[aggregate_start:aggregate_end])), fingerprint,
+                    PriceSeries.from_arrays(days[price_start:price_end], prices[price_start:price_end]) if price_total else None)
+        year_start = year_end
+        aggregate_start = aggregate_end
+        price_start = price_end
+
+
+def to_optional(column: array) -> List[Optional[float]]:
+    return [None if value != value else value for value in column]
+
+
+class ExtensionPersistence(PersistenceInterface):
+
+    def __init__(self, backends: Dict[str, PersistenceInterface], default: PersistenceInterface) -> None:
+        self.backends = backends
+        self.default = default
+
+    def save_portfolio(self, filename: str, portfolio: Portfolio) -> None:
+        self._get_backend(filename).save_portfolio(filename, portfolio)
+
+    def load_portfolio(self, filename: str) -> Portfolio:
+        return self._get_backend(filename).load_portfolio(filename)
+
+    def _get_backend(self, filename: str) -> PersistenceInterface:
+        return self.backends.get(os.path.splitext(filename)[1].lower(), self.default)
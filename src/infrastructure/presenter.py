@@ -1,10 +1,26 @@
-from typing import Dict, List
-from prettytable import PrettyTable
+from typing import Any, Dict, List, Optional, Tuple
 from src.application.interface import PresenterInterface
-from src.domain.stock import Stock, StockAggregate, StockMetrics
+from src.application.screen import AGGREGATE, get_field_value
+from src.domain.prices import PriceSummary
+from src.domain.ranking import RANK_FIELDS, SectorMedians, StockRank
+from src.domain.stock import Stock, StockAggregate, StockMetrics, StockValuation
 from src.interface.view import ViewInterface
 
 
+FIELD_TITLES = {
+    'market_capitalization': 'Market Cap.',
+    'earnings_per_share': 'EPS',
+    'closing_price': 'Closing Price',
+    'book_value_per_share': 'BV / Share',
+    'dividend_per_share': 'Dividend',
+    'pe_ratio': 'P/E Ratio',
+    'growth': 'Growth',
+    'price_per_book_value': 'Price / BV',
+    'multiplier': 'Multiplier',
+    'dividend_yield': 'Dividend Yield',
+}
+
+
 class Presenter(PresenterInterface):
 
     def __init__(self, view: ViewInterface) -> None:
@@ -12,18 +28,96 @@ class Presenter(PresenterInterface):
 
     def show_year_data(self, year_data: List[StockMetrics]) -> None:
         header = ['Year', 'Market Cap.', 'EPS', 'Closing Price', 'P/E Ratio', 'BV / Share', 'Price / BV', 'Dividend', 'Dividend Yield']
-        rows = [self._get_year_data(data) for data in sorted(year_data, key=lambda x: x.year, reverse=True)]
+        rows = (self._get_year_data(data) for data in sorted(year_data, key=lambda x: x.year, reverse=True))
         self.view.show_tabular_data(header, rows)
 
     def show_aggregate_data(self, aggregate_data: List[StockAggregate]) -> None:
         header = ['Year', 'EPS', 'P/E Ratio', 'Growth', 'Price / BV', 'Multiplier', 'Dividend Yield']
-        rows =[self._get_aggregate_data(data) for data in sorted(aggregate_data, key=lambda x: x.year, reverse=True)]
+        names = list(dict.fromkeys(name for data in aggregate_data for name in data.statistics))
+        rows = (self._get_aggregate_data(data) + [self._format_statistic(data.statistics.get(name)) for name in names]
+                for data in sorted(aggregate_data, key=lambda x: x.year, reverse=True))
+        self.view.show_tabular_data(header + names, rows)
+
+    def show_stock_data(self, stock: Stock, valuation: Optional[StockValuation]) -> None:
+        header = ['Symbol', 'Name', 'Sector', 'Current Price', 'Year', 'P/E Ratio', 'Price / BV', 'Multiplier', 'Dividend Yield', 'Growth']
+        if valuation is None:
+            price = f'{stock.current_price:.2f}' if stock.current_price is not None else '-'
+            row = [stock.symbol, stock.name, stock.sector, price] + ['-'] * 6
+        else:
+            row = self._get_valuation(stock, valuation)
+        self.view.show_tabular_data(header, [row])
+
+    def show_valuations(self, stocks: List[Stock], valuations: List[StockValuation]) -> None:
+        header = ['Symbol', 'Name', 'Sector', 'Current Price', 'Year', 'P/E Ratio', 'Price / BV', 'Multiplier', 'Dividend Yield', 'Growth']
+        rows = (self._get_valuation(stock, valuation) for stock, valuation in zip(stocks, valuations))
+        self.view.show_tabular_data(header, rows, listing=True)
+
+    def show_screen_results(self, year: int, stocks: List[Stock], fields: List[Tuple[str, str]]) -> None:
+        header = ['Symbol', 'Name', 'Sector'] + [self._get_field_title(source, field) for source, field in fields]
+        rows = ([stock.symbol, stock.name, stock.sector] + [self._format_field(field, get_field_value(stock, year, source, field)) for source, field in fields]
+                for stock in stocks)
+        self.view.show_tabular_data(header, rows, listing=True)
+
+    def show_price_data(self, summaries: List[PriceSummary]) -> None:
+        header = ['Year', 'Close', 'Average', 'Low', 'High', 'Days']
+        rows = ([f'{summary.year}', f'{summary.close:.2f}', f'{summary.average:.2f}', f'{summary.low:.2f}', f'{summary.high:.2f}', f'{summary.days}']
+                for summary in sorted(summaries, key=lambda x: x.year, reverse=True))
+        self.view.show_tabular_data(header, rows)
+
+    def show_scenario_comparison(self, year: int, rows: List[Tuple[str, str, Optional[StockAggregate]]]) -> None:
+        header = ['Symbol', 'Scenario', 'EPS', 'P/E Ratio', 'Growth', 'Price / BV', 'Multiplier', 'Dividend Yield']
+        rows = ([symbol, scenario] + (self._get_aggregate_data(aggregate)[1:] if aggregate is not None else ['-'] * 6)
+                for symbol, scenario, aggregate in rows)
+        # Not a listing: it covers only the stocks the scenarios change, and a limit could cut a stock's
+        # base row off from its scenario rows.
         self.view.show_tabular_data(header, rows)
 
-    def show_stock_data(self, stock: Stock) -> None:
-        print(stock.year_data[2023].to_dict())
-        print(stock.aggregate_data[2023].to_dict())
-        print()
+    def show_rankings(self, year: int, ranks: List[StockRank]) -> None:
+        # Each field column holds the overall and the sector percentile.
+        header = ['Symbol', 'Sector', 'Score', 'Sector Score'] + [f'{FIELD_TITLES[field]} %' for field in RANK_FIELDS]
+        rows = ([rank.symbol, rank.sector, self._format_percentile(rank.score), self._format_percentile(rank.sector_score)]
+                + [f'{self._format_percentile(rank.percentiles.get(field))} / {self._format_percentile(rank.sector_percentiles.get(field))}'
+                   for field in RANK_FIELDS]
+                for rank in ranks)
+        self.view.show_tabular_data(header, rows, listing=True)
+
+    def show_sector_medians(self, year: int, medians: List[SectorMedians]) -> None:
+        header = ['Sector', 'Stocks'] + [f'Median {FIELD_TITLES[field]}' for field in RANK_FIELDS]
+        rows = ([entry.sector, f'{entry.stocks}'] + [self._format_field(field, entry.medians.get(field)) for field in RANK_FIELDS]
+                for entry in medians)
+        self.view.show_tabular_data(header, rows)
+
+    def show_stats(self, stats: Dict[str, Dict[str, Any]]) -> None:
+        header = ['Stage', 'Calls', 'Total (s)', 'Mean (ms)', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Rows', 'Files (KiB)']
+        rows = [[
+            name,
+            f'{stage["calls"]}',
+            f'{stage["total_seconds"]:.3f}',
+            f'{stage["mean_seconds"] * 1000:.2f}',
+            f'{stage["p50_seconds"] * 1000:.2f}',
+            f'{stage["p95_seconds"] * 1000:.2f}',
+            f'{stage["max_seconds"] * 1000:.2f}',
+            f'{stage["rows"]}',
+            f'{stage["file_bytes"] / 1024:.1f}',
+        ] for name, stage in stats.items()]
+        self.view.show_tabular_data(header, rows)
+
+    def _get_field_title(self, source: str, field: str) -> str:
+        title = FIELD_TITLES.get(field, field)
+        return title if source == AGGREGATE else f'{title} (Year)'
+
+    def _format_field(self, field: str, value: Optional[float]) -> str:
+        if value is None:
+            return '-'
+        if field == 'dividend_yield':
+            return f'{value:.2%}'
+        return f'{value:.2f}'
+
+    def _format_percentile(self, value: Optional[float]) -> str:
+        return f'{value:.0f}' if value is not None else '-'
+
+    def _format_statistic(self, value: Optional[float]) -> str:
+        return f'{value:.4g}' if value is not None else '-'
 
     def _get_year_data(self, year_data: StockMetrics) -> List[str]:
         return [
@@ -38,6 +132,20 @@ class Presenter(PresenterInterface):
             f'{year_data.dividend_yield:.2%}',
         ]
 
+    def _get_valuation(self, stock: Stock, valuation: StockValuation) -> List[str]:
+        return [
+            stock.symbol,
+            stock.name,
+            stock.sector,
+            f'{valuation.current_price:.2f}',
+            f'{valuation.year}',
+            f'{valuation.pe_ratio:.2f}' if valuation.pe_ratio is not None else '-',
+            f'{valuation.price_per_book_value:.2f}' if valuation.price_per_book_value is not None else '-',
+            f'{valuation.multiplier:.2f}' if valuation.multiplier is not None else '-',
+            f'{valuation.dividend_yield:.2%}' if valuation.dividend_yield is not None else '-',
+            f'{valuation.growth:.2f}' if valuation.growth is not None else '-',
+        ]
+
     def _get_aggregate_data(self, aggregate_data: StockAggregate) -> List[str]:
         return [
             f'{aggregate_data.year}',
@@ -0,0 +1,36 @@
+import asyncio
+import csv
+import json
+import os
+from typing import Dict, List, Optional
+from src.application.interface import QuoteProviderInterface
+
+
+class FileQuoteProvider(QuoteProviderInterface):
+    # Serves quotes from a CSV (symbol,price columns) or JSON ({"SYMBOL": price}) file so prices can be
+    # refreshed offline. The file is read again whenever it changes; latency simulates a remote source.
+
+    def __init__(self, filename: str, latency: float = 0.0) -> None:
+        self.filename = filename
+        self.latency = latency
+        self.modified: Optional[int] = None
+        self.quotes: Dict[str, float] = {}
+
+    async def fetch_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._reload()
+        return {symbol: self.quotes[symbol] for symbol in symbols if symbol in self.quotes}
+
+    def _reload(self) -> None:
+        modified = os.stat(self.filename).st_mtime_ns
+        if modified == self.modified:
+            return
+        if os.path.splitext(self.filename)[1].lower() == '.json':
+            with open(self.filename) as json_file:
+                quotes = {symbol: float(price) for symbol, price in json.load(json_file).items()}
+        else:
+            with open(self.filename, newline='') as csv_file:
+                quotes = {row['symbol']: float(row['price']) for row in csv.DictReader(csv_file)}
+        self.quotes = quotes
+        self.modified = modified
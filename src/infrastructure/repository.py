@@ -1,23 +1,60 @@
-from typing import List, Optional
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from src.application.interface import RepositoryInterface
+from src.domain.prices import PriceSeries
 from src.domain.stock import Portfolio, Stock, StockMetrics
+from src.infrastructure.persistence import LazyStockMap
+from src.infrastructure.screen_index import ScreenIndex
 
 
 class InMemoryRepository(RepositoryInterface):
 
     def __init__(self, portfolio: Portfolio) -> None:
         self.portfolio = portfolio
+        self.dirty = self._unaggregated(portfolio)
+        self.screen_index = ScreenIndex()
+        self.aggregate_version = 0
 
     def add_stock(self, stock: Stock) -> None:
+        self.screen_index.update_stock(self.get_stock(stock.symbol), stock)
         self.portfolio.stocks[stock.symbol] = stock
-        
+        self.dirty[stock.symbol] = None
+
     def add_year_data(self, symbol: str, metrics: StockMetrics) -> None:
         stock = self.get_stock(symbol)
         if stock is not None:
             stock.year_data[metrics.year] = metrics
+            self._mark_dirty(symbol, metrics.year)
+            self.screen_index.invalidate_years([metrics.year])
+
+    def add_year_data_batch(self, entries: List[Tuple[str, StockMetrics]]) -> None:
+        for symbol, metrics in entries:
+            self.add_year_data(symbol, metrics)
+
+    def update_current_price(self, symbol: str, current_price: float) -> None:
+        stock = self.get_stock(symbol)
+        if stock is not None:
+            stock.current_price = current_price
+
+    def add_prices(self, symbol: str, prices: PriceSeries) -> None:
+        stock = self.get_stock(symbol)
+        if stock is not None:
+            if stock.prices is None:
+                stock.prices = PriceSeries()
+            stock.prices.extend(prices.days, prices.prices)
+
+    def get_prices(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> Optional[PriceSeries]:
+        stock = self.get_stock(symbol)
+        if stock is None or stock.prices is None:
+            return None
+        return stock.prices.between(start, end)
+
+    def save_aggregate_data(self, stocks: List[Stock]) -> None:
+        # The aggregates were computed on the stored Stock objects themselves.
+        pass
 
-    def get_stocks(self) -> List[Stock]:
-        return list(self.portfolio.stocks.values())
+    def get_stocks(self) -> Iterator[Stock]:
+        return iter(self.portfolio.stocks.values())
 
     def get_stock(self, symbol: str) -> Optional[Stock]:
         return self.portfolio.stocks.get(symbol, None)
@@ -26,4 +63,42 @@ class InMemoryRepository(RepositoryInterface):
         return self.portfolio
 
     def set_portfolio(self, portfolio: Portfolio) -> None:
+        if isinstance(self.portfolio.stocks, LazyStockMap) and self.portfolio.stocks is not portfolio.stocks:
+            self.portfolio.stocks.close()
         self.portfolio = portfolio
+        self.dirty = self._unaggregated(portfolio)
+        self.screen_index.clear()
+        self.aggregate_version += 1
+
+    def get_dirty_years(self) -> Dict[str, Optional[Set[int]]]:
+        return self.dirty
+
+    def get_aggregate_version(self) -> int:
+        return self.aggregate_version
+
+    def clear_dirty(self) -> None:
+        for years in self.dirty.values():
+            self.screen_index.invalidate_years(years)
+        if self.dirty:
+            self.aggregate_version += 1
+        self.dirty = {}
+
+    def get_sector_symbols(self, sector: str) -> Set[str]:
+        return self.screen_index.get_sector_symbols(self.get_stocks(), sector)
+
+    def find_symbols(self, year: int, source: str, field: str, operator: str, value: float) -> Set[str]:
+        return self.screen_index.find_symbols(self.get_stocks(), year, source, field, operator, value)
+
+    def _unaggregated(self, portfolio: Portfolio) -> Dict[str, Optional[Set[int]]]:
+        # Loaded stocks keep their persisted aggregates; only the ones saved without them (older files) are dirty.
+        if isinstance(portfolio.stocks, LazyStockMap):
+            symbols = portfolio.stocks.unaggregated_symbols()
+        else:
+            symbols = [stock.symbol for stock in portfolio.stocks.values() if not stock.is_aggregated()]
+        return {symbol: None for symbol in symbols}
+
+    def _mark_dirty(self, symbol: str, year: int) -> None:
+        if symbol not in self.dirty:
+            self.dirty[symbol] = {year}
+        elif self.dirty[symbol] is not None:
+            self.dirty[symbol].add(year)
@@ -0,0 +1,74 @@
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from src.application.screen import get_field_value
+from src.domain.stock import GROWTH_PERIOD, Stock
+
+
+class ScreenIndex:
+    # Per (year, source, field) the non-null values of all stocks sorted ascending, next to the
+    # matching symbols, plus sector membership. Entries are built on first use and dropped when
+    # the years they cover change. Queries build entries under a lock, so concurrent ones wait for a
+    # single build; changes run while no query does, under the query server's write lock.
+
+    def __init__(self) -> None:
+        self.sectors: Optional[Dict[str, Set[str]]] = None
+        self.fields: Dict[Tuple[int, str, str], Tuple[List[float], List[str]]] = {}
+        self.lock = threading.Lock()
+
+    def get_sector_symbols(self, stocks: Iterable[Stock], sector: str) -> Set[str]:
+        sectors = self.sectors
+        if sectors is None:
+            with self.lock:
+                sectors = self.sectors
+                if sectors is None:
+                    sectors = {}
+                    for stock in stocks:
+                        sectors.setdefault(stock.sector.lower(), set()).add(stock.symbol)
+                    self.sectors = sectors
+        return set(sectors.get(sector.lower(), ()))
+
+    def find_symbols(self, stocks: Iterable[Stock], year: int, source: str, field: str, operator: str, value: float) -> Set[str]:
+        key = (year, source, field)
+        columns = self.fields.get(key)
+        if columns is None:
+            with self.lock:
+                columns = self.fields.get(key)
+                if columns is None:
+                    entries = sorted((field_value, stock.symbol) for stock in stocks
+                                     for field_value in [get_field_value(stock, year, source, field)]
+                                     if field_value is not None and field_value == field_value)
+                    columns = self.fields[key] = ([entry[0] for entry in entries], [entry[1] for entry in entries])
+        values, symbols = columns
+        if operator == '<':
+            return set(symbols[:bisect_left(values, value)])
+        elif operator == '<=':
+            return set(symbols[:bisect_right(values, value)])
+        elif operator == '>':
+            return set(symbols[bisect_right(values, value):])
+        elif operator == '>=':
+            return set(symbols[bisect_left(values, value):])
+        elif operator == '=':
+            return set(symbols[bisect_left(values, value):bisect_right(values, value)])
+        elif operator == '!=':
+            return set(symbols[:bisect_left(values, value)]) | set(symbols[bisect_right(values, value):])
+        raise ValueError(f'Unknown operator: {operator}')
+
+    def update_stock(self, old: Optional[Stock], new: Stock) -> None:
+        if self.sectors is not None:
+            if old is not None:
+                self.sectors.get(old.sector.lower(), set()).discard(old.symbol)
+            self.sectors.setdefault(new.sector.lower(), set()).add(new.symbol)
+        self.fields = {}
+
+    def invalidate_years(self, years: Optional[Iterable[int]]) -> None:
+        if years is None:
+            self.fields = {}
+            return
+        # A changed year feeds the aggregates of later years through the rolling windows and growth.
+        affected = {affected_year for year in years for affected_year in range(year, year + GROWTH_PERIOD + 1)}
+        self.fields = {key: value for key, value in self.fields.items() if key[0] not in affected}
+
+    def clear(self) -> None:
+        self.sectors = None
+        self.fields = {}
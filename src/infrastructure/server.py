@@ -0,0 +1,208 @@
+import contextlib
+import http.client
+import io
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional, TextIO, Tuple
+from src.infrastructure.cli import StockCmd
+
+# Commands that only read the portfolio and may run concurrently; every other command runs alone. The
+# caches they fill (valuations, screen index, ranking, lazily loaded stocks) lock their own rebuilds.
+READ_COMMANDS = frozenset({'get_stock_year_data', 'get_stock_aggregate_data', 'get_stock_current_data', 'get_stock_price_data', 'valuation', 'screen', 'rank'})
+# Commands a client handles itself instead of sending them to the server.
+LOCAL_COMMANDS = frozenset({'help', 'quit'})
+DEFAULT_HOST = '127.0.0.1'
+
+
+class ReadWriteLock:
+    # Any number of readers or a single writer. A waiting writer holds back new readers, so a steady
+    # stream of queries cannot starve an update.
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self) -> Iterator[None]:
+        with self.condition:
+            while self.writing or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self) -> Iterator[None]:
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writing or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+class RequestOutput(io.TextIOBase):
+    # Installed as sys.stdout while serving: what a thread prints while it handles a request goes to
+    # that request's buffer, everything else to the original stream.
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self.local = threading.local()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    @contextlib.contextmanager
+    def capture(self) -> Iterator[io.StringIO]:
+        self.local.buffer = io.StringIO()
+        try:
+            yield self.local.buffer
+        finally:
+            self.local.buffer = None
+
+
+class QueryServer:
+    # Keeps the portfolio of a StockCmd resident and runs the command lines POSTed to /command,
+    # answering with their output. Writes run in the controller's batch mode: a write recomputes the
+    # aggregates it made stale before it releases the lock, and the portfolio is saved at most every
+    # save_interval seconds and on shutdown.
+
+    def __init__(self, cli: StockCmd, address: Tuple[str, int], save_interval: float = 5.0) -> None:
+        self.cli = cli
+        self.controller = cli.controller
+        self.save_interval = save_interval
+        self.lock = ReadWriteLock()
+        self.output = RequestOutput(sys.stdout)
+        self.stopped = threading.Event()
+        self.server = ThreadingHTTPServer(address, QueryRequestHandler)
+        self.server.query_server = self
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def execute(self, line: str) -> str:
+        command = self.cli.parseline(line)[0]
+        if not command or command in LOCAL_COMMANDS or not hasattr(self.cli, f'do_{command}'):
+            raise ValueError(f'Unknown command: {line.strip()}')
+        lock = self.lock.read() if command in READ_COMMANDS else self.lock.write()
+        with lock, self.output.capture() as buffer:
+            self.cli.onecmd(line)
+            if command not in READ_COMMANDS and self.controller.pending_aggregation:
+                self.controller.calculate_aggregate()
+            return buffer.getvalue()
+
+    def flush(self) -> None:
+        # Saving only reads the portfolio, so queries keep running while it is written.
+        with self.lock.read():
+            self.controller.flush()
+
+    def serve_forever(self) -> None:
+        original = sys.stdout
+        sys.stdout = self.output
+        self.controller.begin_batch()
+        saver = threading.Thread(target=self._save_periodically, daemon=True)
+        saver.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.stopped.set()
+            saver.join()
+            self.server.server_close()
+            with self.lock.write():
+                self.controller.end_batch()
+            sys.stdout = original
+
+    def shutdown(self) -> None:
+        self.server.shutdown()
+
+    def _save_periodically(self) -> None:
+        while not self.stopped.wait(self.save_interval):
+            self.flush()
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection of a client open between commands; without Nagle's algorithm the
+    # body does not wait for the acknowledgement of the headers.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        if self.path != '/command':
+            self.send_error(404)
+            return
+        line = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        try:
+            status, body = 200, self.server.query_server.execute(line)
+        except Exception as error:
+            status, body = 400, f'{error}\n'
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+class QueryClient:
+
+    def __init__(self, address: Tuple[str, int], timeout: Optional[float] = None) -> None:
+        self.connection = http.client.HTTPConnection(*address, timeout=timeout)
+
+    def execute(self, line: str) -> str:
+        self.connection.request('POST', '/command', line.encode('utf-8'), {'Content-Type': 'text/plain; charset=utf-8'})
+        response = self.connection.getresponse()
+        body = response.read().decode('utf-8')
+        if response.status != 200:
+            raise ValueError(body.strip())
+        return body
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class RemoteStockCmd(StockCmd):
+    # A StockCmd without a local portfolio: commands are sent to a QueryServer and its output printed.
+
+    def __init__(self, client: QueryClient) -> None:
+        super().__init__(None)
+        self.client = client
+
+    def onecmd(self, line: str) -> bool:
+        command = self.parseline(line)[0]
+        if not command or command in LOCAL_COMMANDS or not hasattr(self, f'do_{command}'):
+            return super().onecmd(line)
+        print(self.client.execute(line), end='')
+        return False
+
+
+def parse_address(text: str) -> Tuple[str, int]:
+    # [host:]port, the host defaults to the loopback interface.
+    host, _, port = text.rpartition(':')
+    if not port.isdigit():
+        raise ValueError(f'Invalid address: {text}')
+    return host or DEFAULT_HOST, int(port)
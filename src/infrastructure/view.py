@@ -1,17 +1,68 @@
-from typing import List
-from prettytable import PrettyTable
+import csv
+import sys
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, TextIO
 from src.interface.view import ViewInterface
 
+FORMATS = ('table', 'tsv', 'csv', 'fixed')
+
 
 class CliView(ViewInterface):
+    # Rows are consumed lazily: only offset + limit rows are formatted, and tables are printed a page
+    # at a time. The tsv, csv and fixed formats write straight to the output without PrettyTable.
+    # Offset and limit page through listings of the portfolio, such as screen results; the tables of
+    # a single stock are always shown whole.
+
+    def __init__(self, format: str = 'table', limit: Optional[int] = None, offset: int = 0, page_size: int = 1000,
+                 output: Optional[TextIO] = None) -> None:
+        if format not in FORMATS:
+            raise ValueError(f'Unknown output format: {format}')
+        self.format = format
+        self.limit = limit
+        self.offset = offset
+        self.page_size = page_size
+        self.output = output
 
-    def show_tabular_data(self, header: List[str], rows: List[List[str]]) -> None:
-        table = PrettyTable()
-        table.field_names = header
-        for row in rows:
-            table.add_row(row)
-        print(table)
-        print()
+    def show_tabular_data(self, header: List[str], rows: Iterable[List[str]], listing: bool = False) -> None:
+        output = self.output or sys.stdout
+        if listing:
+            rows = islice(rows, self.offset, None if self.limit is None else self.offset + self.limit)
+        if self.format == 'tsv':
+            self._write_delimited(output, header, rows, '\t')
+        elif self.format == 'csv':
+            self._write_delimited(output, header, rows, ',')
+        elif self.format == 'fixed':
+            self._write_fixed(output, header, rows)
+        else:
+            self._write_tables(output, header, rows)
 
     def show_dict_data(self) -> None:
         ...
+
+    def _write_tables(self, output: TextIO, header: List[str], rows: Iterator[List[str]]) -> None:
+        # Imported on first use, the other formats and scripts that never print a table skip its import time.
+        from prettytable import PrettyTable
+        page = list(islice(rows, self.page_size))
+        while True:
+            table = PrettyTable()
+            table.field_names = header
+            table.add_rows(page)
+            print(table, file=output)
+            page = list(islice(rows, self.page_size))
+            if not page:
+                break
+        print(file=output)
+
+    def _write_delimited(self, output: TextIO, header: List[str], rows: Iterator[List[str]], delimiter: str) -> None:
+        writer = csv.writer(output, delimiter=delimiter, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
+
+    def _write_fixed(self, output: TextIO, header: List[str], rows: Iterator[List[str]]) -> None:
+        # Column widths come from the header and the first page; longer values further down overflow.
+        page = list(islice(rows, self.page_size))
+        widths = [max([len(title)] + [len(row[column]) for row in page]) for column, title in enumerate(header)]
+        line = '  '.join(f'{{:>{width}}}' for width in widths) + '\n'
+        output.write(line.format(*header))
+        output.writelines(line.format(*row) for row in page)
+        output.writelines(line.format(*row) for row in rows)
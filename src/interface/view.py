@@ -1,9 +1,9 @@
-from typing import Protocol
+from typing import Iterable, List, Protocol
 
 
 class ViewInterface(Protocol):
 
-    def show_tabular_data(self) -> None:
+    def show_tabular_data(self, header: List[str], rows: Iterable[List[str]], listing: bool = False) -> None:
         ...
 
     def show_dict_data(self) -> None:
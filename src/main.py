@@ -0,0 +1,174 @@
+import argparse
+import sys
+from typing import List, Optional
+
+from src.application.stock_interactor import AddStockYearDataUseCase, ApplyScenarioUseCase, BulkImportUseCase, CalculateAggregateDataUseCase, CompareScenariosUseCase, CreateStockUseCase, DropScenarioUseCase, GetPortfolioValuationUseCase, GetStockAggregateDataUseCase, GetStockCurrentDataUseCase, GetStockPriceDataUseCase, GetStockYearDataUseCase, ImportDailyPricesUseCase, LoadPortfolioUseCase, RankPortfolioUseCase, SavePortfolioUseCase, ScreenStocksUseCase, ShowStatsUseCase, UpdateCurrentPricesUseCase
+from src.application.interface import AggregationEngineInterface, PersistenceInterface, RepositoryInterface
+from src.application.scenario import Scenarios
+from src.application.valuation import ValuationCache
+from src.domain.rolling import parse_window
+from src.domain.stock import Portfolio
+from src.infrastructure.cli import StockCmd
+from src.infrastructure.controller_cli import CliController
+from src.infrastructure.lazy import Lazy
+from src.infrastructure.persistence import BinaryPersistence, ExtensionPersistence, JSONPersistence
+from src.infrastructure.presenter import Presenter
+from src.infrastructure.repository import InMemoryRepository
+from src.infrastructure.view import FORMATS, CliView
+
+# Everything only some commands or options need (numpy, sqlite3, asyncio, http, the JSON codec,
+# prettytable, cProfile) is imported by the factories below or where it is used, and the use cases
+# are built on first use, so starting a session or a script costs little more than the interpreter.
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='attic')
+    storage = parser.add_mutually_exclusive_group()
+    storage.add_argument('--journal', action='store_true', help='append changes to a journal instead of rewriting the portfolio file')
+    storage.add_argument('--database', help='keep the portfolio in this SQLite file, save commits and load is a no-op')
+    parser.add_argument('--compact-threshold', type=int, default=1000, help='journal entries before the snapshot is rewritten')
+    parser.add_argument('--workers', type=int, help='aggregate stocks in parallel with this many worker processes')
+    parser.add_argument('--chunk-size', type=int, default=100, help='stocks sent to a worker at a time')
+    parser.add_argument('--rolling', action='append', type=parse_window, metavar='FIELD:STATISTICS:LENGTHS',
+                        help='rolling statistics to keep with the aggregates, e.g. earnings_per_share:mean,stdev:3,5')
+    parser.add_argument('--quotes', help='CSV (symbol,price) or JSON file with the quotes used by update_prices')
+    parser.add_argument('--quote-concurrency', type=int, default=8, help='quote requests in flight at a time')
+    parser.add_argument('--quote-ttl', type=float, default=60.0, help='seconds before a fetched quote is refreshed again')
+    parser.add_argument('--script', help='run the commands in this file (- for stdin) without prompting and exit, or before serving')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--serve', metavar='[HOST:]PORT', help='keep the portfolio loaded and answer commands over HTTP')
+    mode.add_argument('--connect', metavar='[HOST:]PORT', help='send the commands to a server started with --serve')
+    parser.add_argument('--save-interval', type=float, default=5.0, help='seconds between saves of a server\'s pending changes')
+    parser.add_argument('--format', choices=FORMATS, default='table', help='output format, tsv, csv and fixed skip the table layout')
+    parser.add_argument('--limit', type=int, help='show at most this many rows of each portfolio listing (valuation, screen, rank)')
+    parser.add_argument('--offset', type=int, default=0, help='rows of each portfolio listing to skip')
+    parser.add_argument('--page-size', type=int, default=1000, help='rows per printed table page')
+    parser.add_argument('--instrument', action='store_true', help='record timings of commands, use cases, persistence and rendering')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = create_parser()
+    args = parser.parse_args(argv)
+
+    if args.connect is not None:
+        from src.infrastructure.server import QueryClient, RemoteStockCmd, parse_address
+        try:
+            address = parse_address(args.connect)
+        except ValueError as error:
+            parser.error(str(error))
+        return run(RemoteStockCmd(QueryClient(address)), args.script)
+
+    if args.database:
+        from src.infrastructure.database import SqlitePersistence, SqliteRepository
+        repository = SqliteRepository(args.database)
+        sqlite_persistence = Lazy(lambda: SqlitePersistence(repository))
+    else:
+        repository = InMemoryRepository(Portfolio())
+        sqlite_persistence = Lazy(create_sqlite_persistence)
+    persistence = ExtensionPersistence({'.bin': BinaryPersistence(lazy=True), '.db': sqlite_persistence, '.sqlite': sqlite_persistence},
+                                       JSONPersistence())
+    if args.journal:
+        from src.infrastructure.journal import JournalingRepository, JournalPersistence
+        persistence = JournalPersistence(persistence, args.compact_threshold)
+        repository = JournalingRepository(repository, persistence)
+    presenter = Presenter(CliView(args.format, args.limit, args.offset, args.page_size))
+    instrumentation = None
+    if args.instrument:
+        from src.infrastructure.instrumentation import Instrumentation, InstrumentedPersistence, InstrumentedPresenter, InstrumentedUseCase
+        instrumentation = Instrumentation()
+        persistence = InstrumentedPersistence(persistence, instrumentation)
+        presenter = InstrumentedPresenter(presenter, instrumentation)
+
+    def lazy(factory):
+        if instrumentation is None:
+            return Lazy(factory)
+        return Lazy(lambda: InstrumentedUseCase(factory(), instrumentation))
+
+    windows = [window for parsed in args.rolling for window in parsed] if args.rolling else None
+    valuations = ValuationCache(repository)
+    scenarios = Scenarios(repository)
+    update_current_prices_use_case = None
+    if args.quotes:
+        update_current_prices_use_case = lazy(lambda: create_update_current_prices_use_case(repository, args))
+    controller = CliController(
+        lazy(lambda: CreateStockUseCase(repository)),
+        lazy(lambda: AddStockYearDataUseCase(repository)),
+        lazy(lambda: CalculateAggregateDataUseCase(repository, create_aggregation_engine(args), windows)),
+        lazy(lambda: GetStockYearDataUseCase(repository, presenter)),
+        lazy(lambda: GetStockAggregateDataUseCase(repository, presenter)),
+        lazy(lambda: GetStockCurrentDataUseCase(repository, presenter, valuations)),
+        lazy(lambda: SavePortfolioUseCase(repository, persistence)),
+        lazy(lambda: LoadPortfolioUseCase(repository, persistence)),
+        lazy(lambda: create_bulk_import_use_case(repository, persistence)),
+        lazy(lambda: ScreenStocksUseCase(repository, presenter)),
+        lazy(lambda: GetPortfolioValuationUseCase(repository, presenter, valuations)),
+        instrumentation,
+        ShowStatsUseCase(instrumentation, presenter) if instrumentation is not None else None,
+        update_current_prices_use_case,
+        args.database,
+        lazy(lambda: create_import_daily_prices_use_case(repository)),
+        lazy(lambda: GetStockPriceDataUseCase(repository, presenter)),
+        lazy(lambda: ApplyScenarioUseCase(repository, scenarios)),
+        lazy(lambda: CompareScenariosUseCase(repository, scenarios, presenter)),
+        lazy(lambda: DropScenarioUseCase(scenarios)),
+        lazy(lambda: RankPortfolioUseCase(repository, presenter)))
+    cli = StockCmd(controller, instrumentation)
+
+    if args.serve is not None:
+        from src.infrastructure.server import QueryServer, parse_address
+        try:
+            address = parse_address(args.serve)
+        except ValueError as error:
+            parser.error(str(error))
+        if args.script is not None:
+            with open(args.script) as script_file:
+                cli.run_script(script_file)
+        server = QueryServer(cli, address, args.save_interval)
+        print(f'Serving on {server.address[0]}:{server.address[1]}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    return run(cli, args.script)
+
+
+def run(cli: StockCmd, script: Optional[str]) -> int:
+    if script == '-' or (script is None and not sys.stdin.isatty()):
+        return 1 if cli.run_script(sys.stdin) else 0
+    elif script is not None:
+        with open(script) as script_file:
+            return 1 if cli.run_script(script_file) else 0
+    cli.cmdloop()
+    return 0
+
+
+def create_aggregation_engine(args: argparse.Namespace) -> Optional[AggregationEngineInterface]:
+    from src.infrastructure.aggregation import NumpyAggregationEngine, ProcessPoolAggregationEngine
+    if args.workers is not None:
+        return ProcessPoolAggregationEngine(args.workers, args.chunk_size)
+    try:
+        return NumpyAggregationEngine()
+    except ImportError:
+        return None
+
+
+def create_update_current_prices_use_case(repository: RepositoryInterface, args: argparse.Namespace) -> UpdateCurrentPricesUseCase:
+    from src.infrastructure.quotes import FileQuoteProvider
+    return UpdateCurrentPricesUseCase(repository, FileQuoteProvider(args.quotes), concurrency=args.quote_concurrency, ttl=args.quote_ttl)
+
+
+def create_bulk_import_use_case(repository: RepositoryInterface, persistence: PersistenceInterface) -> BulkImportUseCase:
+    from src.infrastructure.importer import FileRecordReader
+    return BulkImportUseCase(repository, persistence, FileRecordReader())
+
+
+def create_import_daily_prices_use_case(repository: RepositoryInterface) -> ImportDailyPricesUseCase:
+    from src.infrastructure.importer import FileRecordReader
+    return ImportDailyPricesUseCase(repository, FileRecordReader())
+
+
+def create_sqlite_persistence() -> PersistenceInterface:
+    from src.infrastructure.database import SqlitePersistence
+    return SqlitePersistence()
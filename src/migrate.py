@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+# Brings a portfolio file to the current format. JSON files are rewritten stock by stock, so files
+# larger than memory can be upgraded, and a database is upgraded in place when it is opened. Binary
+# files of every version are read as they are and need no migration.
+
+
+def migrate_file(source: str, target: Optional[str] = None, indent: Optional[int] = 4, chunk_size: int = 1 << 20) -> int:
+    # Returns the number of stocks written, or 0 for a database, which is upgraded where it is.
+    extension = os.path.splitext(source)[1].lower()
+    if extension in ('.db', '.sqlite'):
+        from src.infrastructure.database import SqliteRepository
+        if target is not None:
+            raise ValueError('A database is upgraded in place')
+        SqliteRepository(source).close()
+        return 0
+    if extension == '.bin':
+        raise ValueError('Binary files of every version are read as they are')
+
+    from src.infrastructure.json_coder import migrate_portfolio
+    temporary_filename = f'{target or source}.tmp'
+    with open(source) as input:
+        try:
+            with open(temporary_filename, 'w') as output:
+                count = migrate_portfolio(input, output, indent, chunk_size)
+        except BaseException:
+            os.remove(temporary_filename)
+            raise
+    os.replace(temporary_filename, target or source)
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='attic-migrate', description='Upgrades a portfolio file to the current format')
+    parser.add_argument('source', help='JSON portfolio or SQLite database')
+    parser.add_argument('target', nargs='?', help='where to write the upgraded JSON portfolio, the source by default')
+    parser.add_argument('--indent', type=int, default=4, help='indentation of the written JSON, 0 for compact output')
+    parser.add_argument('--chunk-size', type=int, default=1 << 20, help='characters read from the source at a time')
+    args = parser.parse_args(argv)
+
+    try:
+        count = migrate_file(args.source, args.target, args.indent or None, args.chunk_size)
+    except (OSError, ValueError) as error:
+        print(f'Error: {error}', file=sys.stderr)
+        return 1
+    print(f'Migrated {args.source}' + (f': {count} stocks' if count else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
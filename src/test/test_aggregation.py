@@ -0,0 +1,71 @@
+import copy
+import random
+import unittest
+
+from src.domain.stock import Stock, StockAggregate, StockMetrics
+from src.infrastructure.aggregation import NumpyAggregationEngine, ProcessPoolAggregationEngine, np
+
+
+def create_stock(symbol: str, years: list, generator: random.Random) -> Stock:
+    stock = Stock(symbol, symbol, 'Technology', 10.0)
+    for year in years:
+        book_value_per_share = generator.choice([None, 0.0, round(generator.uniform(1, 20), 2)])
+        stock.year_data[year] = StockMetrics(year, generator.uniform(0.5, 5), round(generator.uniform(-2, 5), 2),
+                                             round(generator.uniform(5, 80), 2), book_value_per_share, round(generator.uniform(0, 3), 2))
+    return stock
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestNumpyAggregationEngine(unittest.TestCase):
+
+    def setUp(self) -> None:
+        generator = random.Random(7)
+        self.stocks = []
+        for index in range(40):
+            years = [year for year in range(1990, 2024) if generator.random() < 0.7]
+            generator.shuffle(years)
+            self.stocks.append(create_stock(f'S{index}', years, generator))
+        self.stocks.append(Stock('EMPTY', 'Empty', 'Energy', 1.0))
+        self.engine = NumpyAggregationEngine()
+
+    def test_matches_stock_aggregation(self) -> None:
+        expected = copy.deepcopy(self.stocks)
+        for stock in expected:
+            stock.calculate_aggregation()
+
+        self.engine.calculate_aggregation(self.stocks)
+        for stock, expected_stock in zip(self.stocks, expected):
+            self.assertEqual(list(expected_stock.aggregate_data.items()), list(stock.aggregate_data.items()))
+
+    def test_matches_with_stale_aggregates(self) -> None:
+        stock = self.stocks[0]
+        stock.aggregate_data[1980] = StockAggregate(1980, 1.5, 10.0, None, 2.0, 0.01)
+        expected = copy.deepcopy(stock)
+        expected.calculate_aggregation()
+
+        self.engine.calculate_aggregation([stock])
+        self.assertEqual(expected.aggregate_data, stock.aggregate_data)
+
+    def test_zero_closing_price(self) -> None:
+        self.stocks[0].year_data[2030] = StockMetrics(2030, 1.0, 1.0, 0.0, 1.0, 1.0)
+        with self.assertRaises(ZeroDivisionError):
+            self.engine.calculate_aggregation(self.stocks)
+
+
+class TestProcessPoolAggregationEngine(unittest.TestCase):
+
+    def test_matches_stock_aggregation(self) -> None:
+        generator = random.Random(11)
+        stocks = [create_stock(f'S{index}', list(range(2000, 2024)), generator) for index in range(9)]
+        stocks[0].aggregate_data[1990] = StockAggregate(1990, 1.5, 10.0, None, 2.0, 0.01)
+        expected = copy.deepcopy(stocks)
+        for stock in expected:
+            stock.calculate_aggregation()
+
+        ProcessPoolAggregationEngine(workers=2, chunk_size=4).calculate_aggregation(stocks)
+        for stock, expected_stock in zip(stocks, expected):
+            self.assertEqual(list(expected_stock.aggregate_data.items()), list(stock.aggregate_data.items()))
+
+
+if __name__ == '__main__':
+    unittest.main()
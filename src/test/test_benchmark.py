@@ -0,0 +1,48 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from src.benchmark.generator import generate_portfolio
+from src.benchmark.run import BenchmarkResult, find_regressions, main, run_benchmarks
+from src.benchmark import startup
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_generate_portfolio(self) -> None:
+        portfolio = generate_portfolio(3, 12, seed=5)
+        self.assertEqual(portfolio, generate_portfolio(3, 12, seed=5))
+        self.assertEqual(3, len(portfolio.stocks))
+        self.assertEqual(list(range(2012, 2024)), list(portfolio.stocks['S00000'].year_data))
+
+    def test_run_benchmarks(self) -> None:
+        results = run_benchmarks(2, 6, repeat=1, only=['json', 'binary'])
+        self.assertEqual(['json.save', 'json.load', 'json.decode_stock', 'json.decode', 'binary.save', 'binary.load'], [result.name for result in results])
+        self.assertTrue(all(result.rows == 12 for result in results))
+
+    def test_find_regressions(self) -> None:
+        results = [BenchmarkResult('json.save', 1.3, 10, 0), BenchmarkResult('json.load', 1.1, 10, 0), BenchmarkResult('binary.load', 5.0, 10, 0)]
+        self.assertEqual(['json.save'], find_regressions(results, {'json.save': 1.0, 'json.load': 1.0}, 0.2))
+
+    def test_baseline_round_trip(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            arguments = ['--stocks', '2', '--years', '6', '--repeat', '1', '--only', 'binary', '--baseline', baseline]
+            self.assertEqual(0, main(arguments + ['--save-baseline']))
+            self.assertTrue(os.path.exists(baseline))
+            self.assertEqual(0, main(arguments + ['--tolerance', '1000']))
+
+    def test_startup_defers_optional_imports(self) -> None:
+        self.assertEqual([], startup.find_deferred_imports([], 'help'))
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, 'portfolio.db')
+            self.assertEqual(['sqlite3'], startup.find_deferred_imports(['--format', 'tsv', '--database', database], 'help'))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(0, startup.main(['--repeat', '1', '--budget', '100']))
+            self.assertEqual(1, startup.main(['--repeat', '1', '--budget', '0']))
+
+
+if __name__ == '__main__':
+    unittest.main()
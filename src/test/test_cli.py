@@ -0,0 +1,80 @@
+import contextlib
+import io
+import unittest
+
+from src.application.stock_interactor import AddStockYearDataUseCase, BulkImportUseCase, CalculateAggregateDataUseCase, CreateStockUseCase, GetPortfolioValuationUseCase, GetStockAggregateDataUseCase, GetStockCurrentDataUseCase, GetStockYearDataUseCase, LoadPortfolioUseCase, SavePortfolioUseCase, ScreenStocksUseCase
+from src.application.valuation import ValuationCache
+from src.domain.stock import Portfolio
+from src.infrastructure.cli import StockCmd
+from src.infrastructure.controller_cli import CliController
+from src.infrastructure.importer import FileRecordReader
+from src.infrastructure.repository import InMemoryRepository
+from src.test.test_stock_interactor import RecordingPersistence, RecordingPresenter
+
+
+class TestStockCmdScript(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.repository = InMemoryRepository(Portfolio())
+        self.persistence = RecordingPersistence()
+        self.presenter = RecordingPresenter()
+        valuations = ValuationCache(self.repository)
+        controller = CliController(CreateStockUseCase(self.repository), AddStockYearDataUseCase(self.repository),
+                                   CalculateAggregateDataUseCase(self.repository), GetStockYearDataUseCase(self.repository, self.presenter),
+                                   GetStockAggregateDataUseCase(self.repository, self.presenter),
+                                   GetStockCurrentDataUseCase(self.repository, self.presenter, valuations),
+                                   SavePortfolioUseCase(self.repository, self.persistence), LoadPortfolioUseCase(self.repository, self.persistence),
+                                   BulkImportUseCase(self.repository, self.persistence, FileRecordReader()),
+                                   ScreenStocksUseCase(self.repository, self.presenter),
+                                   GetPortfolioValuationUseCase(self.repository, self.presenter, valuations))
+        self.cli = StockCmd(controller)
+
+    def _run(self, script: str) -> int:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return self.cli.run_script(script.splitlines())
+
+    def test_defers_aggregation_and_saving(self) -> None:
+        errors = self._run('''
+            # comments and blank lines are skipped
+            save portfolio.json
+
+            create_stock ANDR Andritz Industrials 54.25
+            add_stock_year_data ANDR 2020 3.897 2.08 37.48 12.64 1.00
+            add_stock_year_data ANDR 2021 - 2.50 40.00 - 1.10
+        ''')
+
+        self.assertEqual(0, errors)
+        self.assertEqual([2], self.persistence.saves)
+        stock = self.repository.get_stock('ANDR')
+        self.assertIsNone(stock.year_data[2021].market_capitalization)
+        self.assertEqual([2020, 2021], list(stock.aggregate_data))
+        self.assertEqual({}, self.repository.get_dirty_years())
+
+    def test_reads_see_pending_changes(self) -> None:
+        errors = self._run('''
+            create_stock ANDR Andritz Industrials 54.25
+            add_stock_year_data ANDR 2020 3.897 2.08 37.48 12.64 1.00
+            screen 2020 "pe_ratio < 20" "pe_ratio desc" 5
+            screen 2020 "pe_ratio > 20"
+        ''')
+
+        self.assertEqual(0, errors)
+        self.assertEqual([2020, 2020], [year for year, _, _ in self.presenter.screens])
+        self.assertEqual(['ANDR'], self.presenter.screens[0][1])
+        self.assertEqual([], self.persistence.saves)
+
+    def test_counts_failed_commands(self) -> None:
+        errors = self._run('''
+            unknown_command
+            add_stock_year_data ANDR
+            create_stock ANDR Andritz Industrials 54.25
+            quit
+            create_stock OMV OMV Energy 48.10
+        ''')
+
+        self.assertEqual(2, errors)
+        self.assertEqual(['ANDR'], [stock.symbol for stock in self.repository.get_stocks()])
+
+
+if __name__ == '__main__':
+    unittest.main()
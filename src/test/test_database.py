@@ -0,0 +1,145 @@
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from datetime import date
+
+from src.application.screen import AGGREGATE, AGGREGATE_FIELDS, METRICS, METRICS_FIELDS
+from src.application import stock_interactor
+from src.application.stock_interactor import CalculateAggregateDataUseCase
+from src.domain.prices import PriceSeries
+from src.domain.stock import Portfolio, Stock, StockMetrics
+from src.infrastructure.database import DATABASE_VERSION, SqlitePersistence, SqliteRepository
+from src.infrastructure.persistence import JSONPersistence
+from src.infrastructure.repository import InMemoryRepository
+from src.migrate import migrate_file
+from src.test.test_aggregation import create_stock
+
+
+class TestSqliteRepository(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'portfolio.db')
+        self.repository = SqliteRepository(self.filename)
+        self.memory = InMemoryRepository(Portfolio())
+        generator = random.Random(5)
+        for index in range(20):
+            years = [year for year in range(2000, 2024) if generator.random() < 0.8]
+            generator.shuffle(years)
+            stock = create_stock(f'S{index}', years, generator)
+            stock.sector = generator.choice(['Energy', 'Technology'])
+            for repository in (self.repository, self.memory):
+                repository.add_stock(Stock(stock.symbol, stock.name, stock.sector, stock.current_price, dict(stock.year_data)))
+
+    def tearDown(self) -> None:
+        self.repository.close()
+        self.directory.cleanup()
+
+    def _calculate(self) -> None:
+        CalculateAggregateDataUseCase(self.repository).execute()
+        CalculateAggregateDataUseCase(self.memory).execute()
+
+    def test_matches_in_memory_repository(self) -> None:
+        self._calculate()
+        for repository in (self.repository, self.memory):
+            repository.add_year_data('S3', StockMetrics(2010, None, 1.5, 20.0, None, 0.4))
+            repository.add_year_data_batch([('S4', StockMetrics(2024, 2.0, 2.5, 30.0, 12.0, 1.0)),
+                                            ('MISSING', StockMetrics(2024, 2.0, 2.5, 30.0, 12.0, 1.0))])
+            repository.update_current_price('S5', 42.0)
+            repository.add_prices('S6', PriceSeries([738890, 738886], [10.0, 9.5]))
+            repository.add_prices('S6', PriceSeries([738890, 738891], [10.5, 11.0]))
+        self.repository.add_year_data('S3', StockMetrics(2010, None, 1.5, 20.0, None, 0.4))
+        self.assertEqual({'S3': {2010}, 'S4': {2024}}, self.repository.get_dirty_years())
+        self.assertEqual(2, self.repository.connection.execute('SELECT COUNT(*) FROM dirty').fetchone()[0])
+        self._calculate()
+
+        self.assertEqual({}, self.repository.get_dirty_years())
+        self.assertEqual(self.memory.get_portfolio(), self.repository.get_portfolio())
+        self.assertIsNone(self.repository.get_stock('S6').prices)
+        self.assertEqual(PriceSeries([738886, 738890, 738891], [9.5, 10.5, 11.0]), self.repository.get_prices('S6'))
+        self.assertEqual(PriceSeries([738890], [10.5]), self.repository.get_prices('S6', date.fromordinal(738887), date.fromordinal(738890)))
+        self.assertIsNone(self.repository.get_prices('S7'))
+        self.assertEqual(self.memory.get_stock('S4'), self.repository.get_stock('S4'))
+        self.assertIsNone(self.repository.get_stock('MISSING'))
+
+    def test_calculates_in_chunks(self) -> None:
+        with mock.patch.object(stock_interactor, 'CHUNK_SIZE', 3):
+            CalculateAggregateDataUseCase(self.repository).execute()
+        CalculateAggregateDataUseCase(self.memory).execute()
+        self.assertEqual({}, self.repository.get_dirty_years())
+        self.assertEqual(list(self.memory.get_stocks()), list(self.repository.get_stocks()))
+
+    def test_find_symbols(self) -> None:
+        self._calculate()
+        fields = [(AGGREGATE, field) for field in AGGREGATE_FIELDS] + [(METRICS, field) for field in METRICS_FIELDS]
+        for source, field in fields:
+            for operator in ('<', '<=', '>', '>=', '=', '!='):
+                self.assertEqual(self.memory.find_symbols(2015, source, field, operator, 1.0),
+                                 self.repository.find_symbols(2015, source, field, operator, 1.0), (source, field, operator))
+        self.assertEqual(self.memory.get_sector_symbols('energy'), self.repository.get_sector_symbols('energy'))
+
+    def test_checkpoint_and_export(self) -> None:
+        self._calculate()
+        persistence = SqlitePersistence(self.repository)
+        persistence.save_portfolio(self.filename, self.repository.get_portfolio())
+        self.assertIs(self.repository, persistence.load_portfolio(self.filename).stocks.repository)
+
+        reopened = SqliteRepository(self.filename)
+        self.assertEqual(list(self.memory.get_stocks()), list(reopened.get_stocks()))
+        reopened.close()
+
+        exported = os.path.join(self.directory.name, 'export.db')
+        json_filename = os.path.join(self.directory.name, 'export.json')
+        persistence.save_portfolio(exported, self.memory.get_portfolio())
+        JSONPersistence().save_portfolio(json_filename, persistence.load_portfolio(exported))
+        self.assertEqual(self.memory.get_portfolio(), JSONPersistence().load_portfolio(json_filename))
+
+    def test_imported_stocks_keep_changes(self) -> None:
+        self.repository.checkpoint()
+        memory = InMemoryRepository(SqlitePersistence().load_portfolio(self.filename))
+        memory.add_year_data('S0', StockMetrics(2030, 1.0, 2.0, 30.0, 10.0, 1.0))
+        memory.update_current_price('S0', 99.0)
+        CalculateAggregateDataUseCase(memory).execute()
+        stock = memory.get_stock('S0')
+        self.assertEqual(99.0, stock.current_price)
+        self.assertIn(2030, stock.year_data)
+        self.assertIn(2030, stock.aggregate_data)
+
+    def test_upgrades_version_1_database(self) -> None:
+        filename = os.path.join(self.directory.name, 'old.db')
+        connection = sqlite3.connect(filename)
+        connection.execute('CREATE TABLE stocks (id INTEGER PRIMARY KEY, symbol TEXT NOT NULL UNIQUE, name TEXT NOT NULL, sector TEXT NOT NULL, current_price REAL)')
+        connection.execute("INSERT INTO stocks (symbol, name, sector, current_price) VALUES ('AAPL', 'Apple', 'Technology', 150.0)")
+        connection.commit()
+        connection.close()
+
+        migrate_file(filename)
+        repository = SqliteRepository(filename)
+        self.assertEqual(DATABASE_VERSION, repository.connection.execute('PRAGMA user_version').fetchone()[0])
+        self.assertEqual([Stock('AAPL', 'Apple', 'Technology', 150.0, {}, {})], list(repository.get_stocks()))
+        repository.connection.execute(f'PRAGMA user_version = {DATABASE_VERSION + 1}')
+        repository.close()
+        with self.assertRaises(ValueError):
+            SqliteRepository(filename)
+
+    def test_upgrades_daily_price_rows(self) -> None:
+        self.repository.close()
+        connection = sqlite3.connect(self.filename)
+        connection.execute('DROP TABLE price_series')
+        connection.execute('CREATE TABLE prices (symbol TEXT NOT NULL, day INTEGER NOT NULL, price REAL NOT NULL, PRIMARY KEY (symbol, day)) WITHOUT ROWID')
+        connection.executemany('INSERT INTO prices VALUES (?, ?, ?)', [('S1', 738887, 2.0), ('S1', 738886, 1.0), ('S2', 738886, 3.0)])
+        connection.execute('PRAGMA user_version = 2')
+        connection.commit()
+        connection.close()
+
+        self.repository = SqliteRepository(self.filename)
+        self.assertEqual(PriceSeries([738886, 738887], [1.0, 2.0]), self.repository.get_prices('S1'))
+        self.assertEqual(PriceSeries([738886], [3.0]), self.repository.get_prices('S2'))
+        self.assertIsNone(self.repository.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'prices'").fetchone())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.domain.stock import Portfolio, Stock
+from src.infrastructure.instrumentation import Instrumentation, InstrumentedPersistence, InstrumentedPresenter, InstrumentedUseCase
+from src.infrastructure.persistence import JSONPersistence
+
+
+class CountingUseCase:
+
+    def execute(self, count: int) -> int:
+        return count
+
+
+class ListPresenter:
+
+    def __init__(self) -> None:
+        self.shown = []
+
+    def show_screen_results(self, year: int, stocks: list, fields: list) -> None:
+        self.shown.append(stocks)
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.instrumentation = Instrumentation()
+
+    def test_record(self) -> None:
+        self.instrumentation.record('stage', 0.001, rows=3)
+        self.instrumentation.record('stage', 0.003, rows=2)
+
+        stats = self.instrumentation.to_dict()['stage']
+        self.assertEqual(2, stats['calls'])
+        self.assertEqual(5, stats['rows'])
+        self.assertAlmostEqual(0.002, stats['mean_seconds'])
+        self.assertAlmostEqual(0.001, stats['min_seconds'])
+        self.assertAlmostEqual(0.003, stats['max_seconds'])
+        self.assertEqual({'1024': 1, '4096': 1}, stats['histogram_us'])
+        self.assertLessEqual(stats['p50_seconds'], stats['p95_seconds'])
+        self.assertAlmostEqual(0.003, stats['p95_seconds'])
+
+        self.instrumentation.reset()
+        self.assertEqual({}, self.instrumentation.to_dict())
+
+    def test_use_case_and_presenter(self) -> None:
+        use_case = InstrumentedUseCase(CountingUseCase(), self.instrumentation)
+        presenter = InstrumentedPresenter(ListPresenter(), self.instrumentation)
+
+        self.assertEqual(7, use_case.execute(7))
+        presenter.show_screen_results(2023, ['a', 'b'], [])
+
+        stats = self.instrumentation.to_dict()
+        self.assertEqual(7, stats['use_case.CountingUseCase']['rows'])
+        self.assertEqual(2, stats['presenter.show_screen_results']['rows'])
+        self.assertEqual([['a', 'b']], presenter.shown)
+
+    def test_persistence_and_dump(self) -> None:
+        persistence = InstrumentedPersistence(JSONPersistence(), self.instrumentation)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'portfolio.json')
+            persistence.save_portfolio(filename, Portfolio({'ANDR': Stock('ANDR', 'Andritz', 'Industrials', 54.25)}))
+            portfolio = persistence.load_portfolio(filename)
+            stats_filename = os.path.join(directory, 'stats.json')
+            self.instrumentation.dump(stats_filename)
+            with open(stats_filename) as stats_file:
+                stats = json.load(stats_file)
+
+            size = os.path.getsize(filename)
+        self.assertEqual(['ANDR'], list(portfolio.stocks))
+        self.assertEqual(size, stats['persistence.save_portfolio']['file_bytes'])
+        self.assertEqual(size, stats['persistence.load_portfolio']['file_bytes'])
+        self.assertEqual(1, stats['persistence.load_portfolio']['rows'])
+
+    def test_profile(self) -> None:
+        self.assertEqual('', self.instrumentation.stop_profile())
+        self.instrumentation.start_profile()
+        self.instrumentation.profiler.enable()
+        sorted(range(1000), reverse=True)
+        self.instrumentation.profiler.disable()
+
+        report = self.instrumentation.stop_profile()
+        self.assertIn('function calls', report)
+        self.assertIsNone(self.instrumentation.profiler)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from src.domain.prices import PriceSeries
+from src.domain.stock import Portfolio, Stock, StockMetrics
+from src.infrastructure.journal import JournalingRepository, JournalPersistence
+from src.infrastructure.persistence import JSONPersistence
+from src.infrastructure.repository import InMemoryRepository
+
+
+class TestJournalPersistence(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'portfolio.json')
+        self.persistence = JournalPersistence(JSONPersistence(), compact_threshold=5)
+        self.repository = JournalingRepository(InMemoryRepository(Portfolio()), self.persistence)
+        self.repository.add_stock(Stock('ANDR', 'Andritz', 'Industrials', 54.25))
+        self.persistence.save_portfolio(self.filename, self.repository.get_portfolio())
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _journal_lines(self) -> int:
+        with open(f'{self.filename}.journal') as journal_file:
+            return len(journal_file.readlines())
+
+    def test_appends_mutations_to_journal(self) -> None:
+        snapshot_time = os.stat(self.filename).st_mtime_ns
+        self.repository.add_year_data('ANDR', StockMetrics(2020, 3.897, 2.08, 37.48, 12.64, 1.00))
+        self.repository.add_year_data('GOOG', StockMetrics(2020, 1.0, 1.0, 1.0, 1.0, 1.0))
+        self.persistence.save_portfolio(self.filename, self.repository.get_portfolio())
+        self.repository.add_year_data('ANDR', StockMetrics(2019, 3.993, 1.27, 38.40, 12.05, 0.50))
+        self.persistence.save_portfolio(self.filename, self.repository.get_portfolio())
+
+        self.assertEqual(2, self._journal_lines())
+        self.assertEqual(snapshot_time, os.stat(self.filename).st_mtime_ns)
+        loaded = JournalPersistence(JSONPersistence()).load_portfolio(self.filename)
+        self.assertEqual([2020, 2019], list(loaded.stocks['ANDR'].year_data))
+        self.assertEqual([2020, 2019], list(loaded.stocks['ANDR'].aggregate_data))
+
+    def test_replays_current_price_updates(self) -> None:
+        self.repository.update_current_price('ANDR', 57.10)
+        self.repository.update_current_price('GOOG', 1.0)
+        self.persistence.save_portfolio(self.filename, self.repository.get_portfolio())
+
+        self.assertEqual(1, self._journal_lines())
+        loaded = JournalPersistence(JSONPersistence()).load_portfolio(self.filename)
+        self.assertEqual(57.10, loaded.stocks['ANDR'].current_price)
+
+    def test_replays_daily_prices(self) -> None:
+        self.repository.add_prices('ANDR', PriceSeries([738886, 738887], [54.0, 54.5]))
+        self.repository.add_prices('ANDR', PriceSeries([738887, 738888], [55.0, 55.5]))
+        self.persistence.save_portfolio(self.filename, self.repository.get_portfolio())
+
+        self.assertEqual(2, self._journal_lines())
+        loaded = JournalPersistence(JSONPersistence()).load_portfolio(self.filename)
+        self.assertEqual(PriceSeries([738886, 738887, 738888], [54.0, 55.0, 55.5]), loaded.stocks['ANDR'].prices)
+
+    def test_compacts_at_threshold(self) -> None:
+        for year in range(2015, 2021):
+            self.repository.add_year_data('ANDR', StockMetrics(year, 4.0, 2.0, 40.0, 12.0, 1.0))
+            self.persistence.save_portfolio(self.filename, self.repository.get_portfolio())
+
+        self.assertEqual(1, self._journal_lines())
+        self.assertEqual(5, len(JSONPersistence().load_portfolio(self.filename).stocks['ANDR'].year_data))
+        self.assertEqual(6, len(JournalPersistence(JSONPersistence()).load_portfolio(self.filename).stocks['ANDR'].year_data))
+
+    def test_replay_is_idempotent_and_ignores_torn_line(self) -> None:
+        self.repository.add_stock(Stock('OMV', 'OMV', 'Energy', 48.10))
+        self.repository.add_year_data('OMV', StockMetrics(2020, 12.0, 4.0, 45.0, 30.0, 2.0))
+        self.persistence.save_portfolio(self.filename, self.repository.get_portfolio())
+        JSONPersistence().save_portfolio(self.filename, self.repository.get_portfolio())
+        with open(f'{self.filename}.journal', 'a') as journal_file:
+            journal_file.write('{"operation": "add_year')
+
+        loaded = JournalPersistence(JSONPersistence()).load_portfolio(self.filename)
+        self.assertEqual(self.repository.get_portfolio().stocks['OMV'].year_data, loaded.stocks['OMV'].year_data)
+        self.assertEqual(2, self._journal_lines())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,23 +1,27 @@
+import io
+import os
+import tempfile
 import unittest
 import json
 from src.domain.stock import Portfolio, Stock, StockAggregate, StockMetrics
-from src.infrastructure.json_coder import StockEncoder, decode_stock
+from src.migrate import main as migrate
+from src.infrastructure.json_coder import StockEncoder, PortfolioReader, StreamingEncoder, aggregate_from_dict, decode_stock, dump_portfolio, load_portfolio, metrics_from_dict, migrate_portfolio, stock_from_dict
 
 class TestEncoders(unittest.TestCase):
 
     def test_portfolio_encoder(self) -> None:
         portfolio = Portfolio({
-            'AAPL': Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 4.34, 6.43)}),
+            'AAPL': Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 0.05, 4.34, 6.43)}),
             'GOOG': Stock('GOOG', 'Alphabet', 'Technology', 2500.0, {}, {})
         })
-        expected_encoded_portfolio = '{"object": "Portfolio", "stocks": {"AAPL": {"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, "year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, "aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "price_per_book_value": 4.34, "dividends_yield": 6.43}}}, "GOOG": {"object": "Stock", "symbol": "GOOG", "name": "Alphabet", "sector": "Technology", "current_price": 2500.0, "year_data": {}, "aggregate_data": {}}}}'
+        expected_encoded_portfolio = '{"object": "Portfolio", "version": 2, "stocks": {"AAPL": {"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, "year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, "aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "growth": 0.05, "price_per_book_value": 4.34, "dividend_yield": 6.43}}}, "GOOG": {"object": "Stock", "symbol": "GOOG", "name": "Alphabet", "sector": "Technology", "current_price": 2500.0, "year_data": {}, "aggregate_data": {}}}}'
         
         actual_encoded_portfolio = json.dumps(portfolio, cls=StockEncoder)
         self.assertEqual(actual_encoded_portfolio, expected_encoded_portfolio)
         
     def test_stock_encoder(self) -> None:
-        stock = Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 4.34, 6.43)})
-        expected_encoded_stock = '{"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, "year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, "aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "price_per_book_value": 4.34, "dividends_yield": 6.43}}}'
+        stock = Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 0.05, 4.34, 6.43)})
+        expected_encoded_stock = '{"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, "year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, "aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "growth": 0.05, "price_per_book_value": 4.34, "dividend_yield": 6.43}}}'
 
         actual_encoded_stock = json.dumps(stock, cls=StockEncoder)
         self.assertEqual(actual_encoded_stock, expected_encoded_stock)
@@ -30,8 +34,8 @@ class TestEncoders(unittest.TestCase):
         self.assertEqual(actual_encoded_stock_metrics, expected_encoded_stock_metrics)
 
     def test_stock_aggregate_encoder(self) -> None:
-        stock_aggregate = StockAggregate(2020, 1.20, 2.40, 4.34, 6.43)
-        expected_encoded_stock_aggregate = '{"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "price_per_book_value": 4.34, "dividends_yield": 6.43}'
+        stock_aggregate = StockAggregate(2020, 1.20, 2.40, 0.05, 4.34, 6.43)
+        expected_encoded_stock_aggregate = '{"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "growth": 0.05, "price_per_book_value": 4.34, "dividend_yield": 6.43}'
         
         actual_encoded_stock_aggregate = json.dumps(stock_aggregate, cls=StockEncoder)
         self.assertEqual(actual_encoded_stock_aggregate, expected_encoded_stock_aggregate)
@@ -40,9 +44,9 @@ class TestEncoders(unittest.TestCase):
 class TestDecoders(unittest.TestCase):
 
     def test_portfolio_decoder(self) -> None:
-        encoded_portfolio = '{"object": "Portfolio", "stocks": {"AAPL": {"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, "year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, "aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "price_per_book_value": 4.34, "dividends_yield": 6.43}}}, "GOOG": {"object": "Stock", "symbol": "GOOG", "name": "Alphabet Inc.", "sector": "Technology", "current_price": 2500.0, "year_data": {}, "aggregate_data": {}}}}'
+        encoded_portfolio = '{"object": "Portfolio", "stocks": {"AAPL": {"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, "year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, "aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "growth": 0.05, "price_per_book_value": 4.34, "dividend_yield": 6.43}}}, "GOOG": {"object": "Stock", "symbol": "GOOG", "name": "Alphabet Inc.", "sector": "Technology", "current_price": 2500.0, "year_data": {}, "aggregate_data": {}}}}'
         expected_portfolio = Portfolio({
-            'AAPL': Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 4.34, 6.43)}),
+            'AAPL': Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 0.05, 4.34, 6.43)}),
             'GOOG': Stock('GOOG', 'Alphabet Inc.', 'Technology', 2500.0, {}, {})
         })
 
@@ -50,8 +54,8 @@ class TestDecoders(unittest.TestCase):
         self.assertEqual(decoded_portfolio, expected_portfolio)
 
     def test_stock_decoder(self) -> None:
-        encoded_stock = '{"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, "year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, "aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "price_per_book_value": 4.34, "dividends_yield": 6.43}}}'
-        expected_stock = Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 4.34, 6.43)})
+        encoded_stock = '{"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, "year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, "aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "growth": 0.05, "price_per_book_value": 4.34, "dividend_yield": 6.43}}}'
+        expected_stock = Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 0.05, 4.34, 6.43)})
 
         decoded_stock = json.loads(encoded_stock, object_hook=decode_stock)
         self.assertEqual(decoded_stock, expected_stock)
@@ -64,11 +68,98 @@ class TestDecoders(unittest.TestCase):
         self.assertEqual(decoded_stock_metrics, expected_encoded_stock_metrics)
 
     def test_stock_aggregate_decoder(self) -> None:
-        encoded_stock_aggregate = '{"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "price_per_book_value": 4.34, "dividends_yield": 6.43}'
-        expected_stock_aggregate = StockAggregate(2020, 1.20, 2.40, 4.34, 6.43)
+        encoded_stock_aggregate = '{"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "growth": 0.05, "price_per_book_value": 4.34, "dividends_yield": 6.43}'
+        expected_stock_aggregate = StockAggregate(2020, 1.20, 2.40, 0.05, 4.34, 6.43)
 
         decoded_stock_aggregate = json.loads(encoded_stock_aggregate, object_hook=decode_stock)
         self.assertEqual(decoded_stock_aggregate, expected_stock_aggregate)
 
+
+class TestSchemaCodec(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.portfolio = Portfolio({
+            'AAPL': Stock('AAPL', 'Apple', 'Technology', 150.0, {2021: StockMetrics(2021, 4.1, -0.5, 30.1, None, 0.0), 2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)},
+                          {2022: StockAggregate(2022, 1.20, None, float('inf'), 4.34, 6.43, {'earnings_per_share.mean.3': 1.5, 'closing_price.stdev.3': None})}, 'a1b2'),
+            'ÖMV': Stock('ÖMV', 'OMV "AG"', 'Energy', 48, {}, {})
+        })
+
+    def test_streaming_encoder_writes_what_stock_encoder_writes(self) -> None:
+        for indent in (None, 4):
+            for value in (self.portfolio, Portfolio(), self.portfolio.stocks['AAPL'], {'operation': 'add_stock', 'stock': self.portfolio.stocks['ÖMV']}):
+                self.assertEqual(json.dumps(value, cls=StockEncoder, indent=indent), StreamingEncoder(indent).encode(value))
+
+    def test_round_trip(self) -> None:
+        output = io.StringIO()
+        dump_portfolio(self.portfolio, output, indent=4)
+        output.seek(0)
+        self.assertEqual(self.portfolio, load_portfolio(output))
+        self.assertEqual(self.portfolio, json.loads(output.getvalue(), object_hook=decode_stock))
+
+    def test_portfolio_reader_across_chunks(self) -> None:
+        for indent in (None, 4):
+            reader = PortfolioReader(io.StringIO(StreamingEncoder(indent).encode(self.portfolio)), chunk_size=7)
+            self.assertEqual(self.portfolio, Portfolio({symbol: stock_from_dict(data) for symbol, data in reader}))
+            self.assertEqual({'object': 'Portfolio', 'version': 2}, reader.header)
+        self.assertEqual([], list(PortfolioReader(io.StringIO('{"object": "Portfolio", "stocks": {}}'), chunk_size=3)))
+        with self.assertRaises(json.JSONDecodeError):
+            list(PortfolioReader(io.StringIO('{"object": "Portfolio", "stocks": {"AAPL": {"object": ')))
+
+    def test_reads_legacy_dividend_yield_key(self) -> None:
+        encoded = '{"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "growth": 0.05, "price_per_book_value": 4.34, "dividends_yield": 6.43}'
+        self.assertEqual(StockAggregate(2020, 1.20, 2.40, 0.05, 4.34, 6.43), aggregate_from_dict(json.loads(encoded)))
+
+
+class TestMigration(unittest.TestCase):
+    # A version 1 file: no version, and the aggregates name the dividend yield dividends_yield.
+    legacy = ('{"object": "Portfolio", "stocks": {'
+              '"AAPL": {"object": "Stock", "symbol": "AAPL", "name": "Apple", "sector": "Technology", "current_price": 150.0, '
+              '"year_data": {"2022": {"object": "StockMetrics", "year": 2022, "market_capitalization": 4.335, "earnings_per_share": 2.59, "closing_price": 34.2, "book_value_per_share": 5.43, "dividend_per_share": 8.65}}, '
+              '"aggregate_data": {"2020": {"object": "StockAggregate", "year": 2020, "earnings_per_share": 1.2, "pe_ratio": 2.4, "growth": 0.05, "price_per_book_value": 4.34, "dividends_yield": 6.43}}}, '
+              '"GOOG": {"object": "Stock", "symbol": "GOOG", "name": "Alphabet", "sector": "Technology", "current_price": 2500.0, "year_data": {}, "aggregate_data": {}}}}')
+    portfolio = Portfolio({
+        'AAPL': Stock('AAPL', 'Apple', 'Technology', 150.0, {2022: StockMetrics(2022, 4.335, 2.59, 34.20, 5.43, 8.65)}, {2020: StockAggregate(2020, 1.20, 2.40, 0.05, 4.34, 6.43)}),
+        'GOOG': Stock('GOOG', 'Alphabet', 'Technology', 2500.0, {}, {})
+    })
+
+    def test_loads_version_1(self) -> None:
+        self.assertEqual(self.portfolio, load_portfolio(io.StringIO(self.legacy)))
+
+    def test_migrates_version_1(self) -> None:
+        for indent in (None, 4):
+            output = io.StringIO()
+            self.assertEqual(2, migrate_portfolio(io.StringIO(self.legacy), output, indent, chunk_size=16))
+            self.assertEqual(StreamingEncoder(indent).encode(self.portfolio), output.getvalue())
+        output = io.StringIO()
+        self.assertEqual(0, migrate_portfolio(io.StringIO('{"object": "Portfolio", "stocks": {}}'), output))
+        self.assertEqual(Portfolio(), load_portfolio(io.StringIO(output.getvalue())))
+
+    def test_migrates_file_in_place(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'portfolio.json')
+            with open(filename, 'w') as legacy_file:
+                legacy_file.write(self.legacy)
+            self.assertEqual(0, migrate([filename, '--chunk-size', '64']))
+            with open(filename) as migrated_file:
+                self.assertEqual(StreamingEncoder(4).encode(self.portfolio), migrated_file.read())
+            self.assertEqual(['portfolio.json'], os.listdir(directory))
+
+    def test_missing_fields_take_defaults(self) -> None:
+        self.assertEqual(StockMetrics(2022, None, 2.59, 34.2, None, 8.65),
+                         metrics_from_dict({'year': 2022, 'earnings_per_share': 2.59, 'closing_price': 34.2, 'dividend_per_share': 8.65, 'shares': 10}))
+        self.assertEqual(Stock('AAPL', 'Apple', 'Technology', None, {}, {}), stock_from_dict({'symbol': 'AAPL', 'name': 'Apple', 'sector': 'Technology'}))
+        with self.assertRaises(ValueError):
+            metrics_from_dict({'year': 2022, 'earnings_per_share': 2.59})
+
+    def test_rejects_newer_version(self) -> None:
+        newer = '{"object": "Portfolio", "version": 3, "stocks": {"GOOG": {"symbol": "GOOG"}}}'
+        with self.assertRaises(ValueError):
+            load_portfolio(io.StringIO(newer))
+        with self.assertRaises(ValueError):
+            json.loads(newer, object_hook=decode_stock)
+        with self.assertRaises(ValueError):
+            migrate_portfolio(io.StringIO('{"object": "Portfolio", "stocks": {}, "version": 3}'), io.StringIO())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,135 @@
+import os
+import struct
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.domain.prices import PriceSeries
+from src.domain.stock import Portfolio, Stock, StockAggregate, StockMetrics
+from src.infrastructure.persistence import BinaryPersistence, ExtensionPersistence, JSONPersistence
+from src.infrastructure.repository import InMemoryRepository
+
+
+class TestBinaryPersistence(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'portfolio.bin')
+        self.portfolio = Portfolio({
+            'ANDR': Stock('ANDR', 'Andritz', 'Industrials', 54.25,
+                          {2020: StockMetrics(2020, 3.897, 2.08, 37.48, 12.64, 1.00), 2019: StockMetrics(2019, None, 1.27, 38.40, None, 0.50)},
+                          {2020: StockAggregate(2020, 1.85, 20.26, None, 3.08, 0.0285), 2019: StockAggregate(2019, 1.27, None, 0.12, None, 0.013)}),
+            'ÖMV': Stock('ÖMV', 'Österreichische Mineralölverwaltung', 'Energy', 48.10),
+        })
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_round_trip(self) -> None:
+        persistence = BinaryPersistence()
+        persistence.save_portfolio(self.filename, self.portfolio)
+        loaded = persistence.load_portfolio(self.filename)
+        self.assertEqual(self.portfolio, loaded)
+        self.assertEqual(list(self.portfolio.stocks), list(loaded.stocks))
+        self.assertEqual([2020, 2019], list(loaded.stocks['ANDR'].year_data))
+        self.assertFalse(os.path.exists(f'{self.filename}.tmp'))
+
+    def test_round_trip_fingerprint(self) -> None:
+        andritz = self.portfolio.stocks['ANDR']
+        andritz.aggregate_fingerprint = andritz.calculate_fingerprint()
+        BinaryPersistence().save_portfolio(self.filename, self.portfolio)
+        for persistence in (BinaryPersistence(), BinaryPersistence(lazy=True)):
+            loaded = persistence.load_portfolio(self.filename)
+            self.assertEqual(andritz.aggregate_fingerprint, loaded.stocks['ANDR'].aggregate_fingerprint)
+            self.assertIsNone(loaded.stocks['ÖMV'].aggregate_fingerprint)
+
+    def test_round_trip_prices(self) -> None:
+        self.portfolio.stocks['ÖMV'].prices = PriceSeries([738886, 738887, 738890], [48.1, 47.9, 49.0])
+        json_filename = os.path.join(self.directory.name, 'portfolio.json')
+        BinaryPersistence().save_portfolio(self.filename, self.portfolio)
+        JSONPersistence().save_portfolio(json_filename, self.portfolio)
+        for loaded in (BinaryPersistence().load_portfolio(self.filename), BinaryPersistence(lazy=True).load_portfolio(self.filename),
+                       JSONPersistence().load_portfolio(json_filename)):
+            self.assertEqual(self.portfolio.stocks['ÖMV'], loaded.stocks['ÖMV'])
+            self.assertIsNone(loaded.stocks['ANDR'].prices)
+
+    def test_lazy_load(self) -> None:
+        BinaryPersistence().save_portfolio(self.filename, self.portfolio)
+        loaded = BinaryPersistence(lazy=True).load_portfolio(self.filename)
+        self.assertEqual(['ANDR', 'ÖMV'], list(loaded.stocks))
+        self.assertEqual({}, loaded.stocks.stocks)
+
+        self.assertEqual(self.portfolio.stocks['ANDR'], loaded.stocks['ANDR'])
+        self.assertIs(loaded.stocks['ANDR'], loaded.stocks.get('ANDR'))
+        self.assertEqual(['ANDR'], list(loaded.stocks.stocks))
+        self.assertIsNone(loaded.stocks.get('GOOG'))
+
+        loaded.stocks['GOOG'] = Stock('GOOG', 'Alphabet', 'Technology', 2500.0)
+        BinaryPersistence().save_portfolio(self.filename, Portfolio({'GOOG': loaded.stocks['GOOG']}))
+        self.assertEqual(self.portfolio.stocks['ÖMV'], loaded.stocks['ÖMV'])
+        self.assertEqual(['ANDR', 'ÖMV', 'GOOG'], [stock.symbol for stock in loaded.stocks.values()])
+
+    def test_replaced_lazy_portfolio_is_closed(self) -> None:
+        BinaryPersistence().save_portfolio(self.filename, self.portfolio)
+        loaded = BinaryPersistence(lazy=True).load_portfolio(self.filename)
+        repository = InMemoryRepository(loaded)
+        andritz = repository.get_stock('ANDR')
+        repository.set_portfolio(loaded)
+        self.assertFalse(loaded.stocks.data.closed)
+        repository.set_portfolio(Portfolio())
+        self.assertTrue(loaded.stocks.data.closed)
+        self.assertEqual(self.portfolio.stocks['ANDR'], andritz)
+
+    def test_lazy_load_from_threads(self) -> None:
+        BinaryPersistence().save_portfolio(self.filename, self.portfolio)
+        loaded = BinaryPersistence(lazy=True).load_portfolio(self.filename)
+        with ThreadPoolExecutor(8) as executor:
+            stocks = list(executor.map(lambda _: loaded.stocks['ANDR'], range(32)))
+        self.assertTrue(all(stock is stocks[0] for stock in stocks))
+        self.assertEqual(self.portfolio.stocks['ANDR'], stocks[0])
+
+    def test_versions(self) -> None:
+        andritz = self.portfolio.stocks['ANDR']
+        andritz.aggregate_data[2020].statistics = {'earnings_per_share.mean.3': 1.5}
+        BinaryPersistence().save_portfolio(self.filename, self.portfolio)
+        self.assertEqual(2, self._version())
+        self.assertEqual(self.portfolio, BinaryPersistence().load_portfolio(self.filename))
+        andritz.aggregate_fingerprint = andritz.calculate_fingerprint()
+        BinaryPersistence().save_portfolio(self.filename, self.portfolio)
+        self.assertEqual(3, self._version())
+
+    def _version(self) -> int:
+        with open(self.filename, 'rb') as binary_file:
+            return struct.unpack('<4sH', binary_file.read(6))[1]
+
+    def test_invalid_file(self) -> None:
+        with open(self.filename, 'wb') as binary_file:
+            binary_file.write(b'{"object": "Portfolio"}')
+        with self.assertRaises(ValueError):
+            BinaryPersistence().load_portfolio(self.filename)
+
+    def test_truncated_file(self) -> None:
+        BinaryPersistence().save_portfolio(self.filename, self.portfolio)
+        with open(self.filename, 'rb') as binary_file:
+            data = binary_file.read()
+        for size in (len(data) - 8, 20):
+            with open(self.filename, 'wb') as binary_file:
+                binary_file.write(data[:size])
+            for persistence in (BinaryPersistence(), BinaryPersistence(lazy=True)):
+                with self.assertRaises(ValueError):
+                    persistence.load_portfolio(self.filename)
+
+
+class TestExtensionPersistence(unittest.TestCase):
+
+    def test_selects_backend_by_extension(self) -> None:
+        binary = BinaryPersistence()
+        json = JSONPersistence()
+        persistence = ExtensionPersistence({'.bin': binary}, json)
+        self.assertIs(binary, persistence._get_backend('data/portfolio.BIN'))
+        self.assertIs(json, persistence._get_backend('data/portfolio.json'))
+        self.assertIs(json, persistence._get_backend('data/portfolio'))
+
+
+if __name__ == '__main__':
+    unittest.main()
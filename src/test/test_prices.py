@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+from src.application.stock_interactor import AddDailyPricesUseCase, ImportDailyPricesUseCase
+from src.domain.prices import PriceSeries, PriceSummary
+from src.domain.stock import Portfolio, Stock, StockMetrics
+from src.infrastructure.importer import FileRecordReader
+from src.infrastructure.repository import InMemoryRepository
+
+
+def days(start: date, count: int) -> list:
+    return [(start + timedelta(days=offset)).toordinal() for offset in range(count)]
+
+
+class TestPriceSeries(unittest.TestCase):
+
+    def test_extend_appends_and_merges(self) -> None:
+        series = PriceSeries(days(date(2023, 12, 30), 3), [10.0, 11.0, 12.0])
+        series.extend(days(date(2024, 1, 2), 2), [13.0, 14.0])
+        self.assertEqual(5, len(series))
+        series.extend(days(date(2023, 12, 29), 2), [9.0, 10.5])
+        self.assertEqual([(date(2023, 12, 29), 9.0), (date(2023, 12, 30), 10.5), (date(2023, 12, 31), 11.0)], list(series)[:3])
+        self.assertEqual(6, len(series))
+        with self.assertRaises(ValueError):
+            series.extend([1, 2], [1.0])
+
+    def test_between_and_summarize(self) -> None:
+        series = PriceSeries(days(date(2023, 12, 30), 4), [10.0, 12.0, 11.0, 15.0])
+        self.assertEqual([date(2023, 12, 31), date(2024, 1, 1)], [day for day, _ in series.between(date(2023, 12, 31), date(2024, 1, 1))])
+        self.assertEqual(4, len(series.between()))
+        self.assertEqual(0, len(series.between(date(2025, 1, 1))))
+        self.assertEqual([PriceSummary(2023, 12.0, 11.0, 10.0, 12.0, 2), PriceSummary(2024, 15.0, 13.0, 11.0, 15.0, 2)], series.summarize())
+        self.assertEqual([PriceSummary(2024, 15.0, 13.0, 11.0, 15.0, 2)], series.summarize([2024, 2025]))
+        self.assertEqual([], PriceSeries().summarize())
+
+
+class TestDailyPricesUseCases(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.repository = InMemoryRepository(Portfolio({
+            'ANDR': Stock('ANDR', 'Andritz', 'Industrials', 54.25, {2023: StockMetrics(2023, 3.897, 2.08, 37.48, 12.64, 1.00)}),
+        }))
+        self.repository.clear_dirty()
+
+    def test_add_daily_prices_updates_closing_prices(self) -> None:
+        summaries = AddDailyPricesUseCase(self.repository).execute('ANDR', PriceSeries(days(date(2023, 12, 30), 3), [40.0, 41.5, 42.0]))
+        self.assertEqual([2023, 2024], [summary.year for summary in summaries])
+        stock = self.repository.get_stock('ANDR')
+        self.assertEqual(41.5, stock.year_data[2023].closing_price)
+        self.assertEqual(2.08, stock.year_data[2023].earnings_per_share)
+        self.assertNotIn(2024, stock.year_data)
+        self.assertEqual({'ANDR': {2023}}, self.repository.get_dirty_years())
+        self.assertEqual([], AddDailyPricesUseCase(self.repository).execute('GOOG', PriceSeries([1], [1.0])))
+
+    def test_import_daily_prices(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'prices.csv')
+            with open(filename, 'w') as csv_file:
+                csv_file.write('symbol,date,close\nANDR,2023-12-28,39.0\nANDR,2023-12-29,40.5\nGOOG,2023-12-29,1.0\n')
+            self.assertEqual(3, ImportDailyPricesUseCase(self.repository, FileRecordReader()).execute(filename))
+            self.assertEqual(40.5, self.repository.get_stock('ANDR').year_data[2023].closing_price)
+            self.assertEqual(2, len(self.repository.get_stock('ANDR').prices))
+
+            with open(filename, 'w') as csv_file:
+                csv_file.write('symbol,date,close\nANDR,2023-12-30,\n')
+            with self.assertRaisesRegex(ValueError, 'Record 1: missing close'):
+                ImportDailyPricesUseCase(self.repository, FileRecordReader()).execute(filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from src.application.ranking import RankingCache
+from src.application.stock_interactor import CalculateAggregateDataUseCase, RankPortfolioUseCase
+from src.domain.ranking import LOWER_IS_BETTER, RANK_FIELDS, SectorMedians, StockRank, rank_portfolio
+from src.domain.stock import Portfolio, StockMetrics
+from src.infrastructure.repository import InMemoryRepository
+from src.test.test_aggregation import create_stock
+
+
+class RankingPresenter:
+
+    def __init__(self) -> None:
+        self.ranks: List[StockRank] = []
+        self.medians: List[SectorMedians] = []
+
+    def show_rankings(self, year: int, ranks: List[StockRank]) -> None:
+        self.ranks = ranks
+
+    def show_sector_medians(self, year: int, medians: List[SectorMedians]) -> None:
+        self.medians = medians
+
+
+class TestRanking(unittest.TestCase):
+
+    def setUp(self) -> None:
+        generator = random.Random(17)
+        self.repository = InMemoryRepository(Portfolio())
+        for index in range(40):
+            stock = create_stock(f'S{index}', [year for year in range(2015, 2025) if generator.random() < 0.8], generator)
+            stock.sector = generator.choice(['Energy', 'Technology', 'Utilities'])
+            self.repository.add_stock(stock)
+        CalculateAggregateDataUseCase(self.repository).execute()
+
+    def test_matches_pairwise_ranks(self) -> None:
+        ranking = rank_portfolio(self.repository.get_stocks())
+        stocks = list(self.repository.get_stocks())
+        for year, ranks in ranking.ranks.items():
+            self.assertEqual({stock.symbol for stock in stocks if year in stock.aggregate_data}, set(ranks))
+            for field in RANK_FIELDS:
+                values = {stock.symbol: getattr(stock.aggregate_data[year], field) for stock in stocks if year in stock.aggregate_data}
+                values = {symbol: value for symbol, value in values.items() if value is not None}
+                for symbol, rank in ranks.items():
+                    peers = [value for other, value in values.items() if ranks[other].sector == rank.sector]
+                    if symbol not in values:
+                        self.assertNotIn(field, rank.percentiles)
+                        continue
+                    value = values[symbol]
+                    for percentile, group in ((rank.percentiles[field], list(values.values())), (rank.sector_percentiles[field], peers)):
+                        below = sum(other < value for other in group)
+                        equal = sum(other == value for other in group)
+                        self.assertAlmostEqual((below + equal / 2) / len(group) * 100, percentile)
+                for sector, entry in ranking.medians[year].items():
+                    peers = [value for other, value in values.items() if ranks[other].sector == sector]
+                    self.assertEqual(sum(rank.sector == sector for rank in ranks.values()), entry.stocks)
+                    if peers:
+                        self.assertAlmostEqual(statistics.median(peers), entry.medians[field])
+            for rank in ranks.values():
+                oriented = [100 - value if field in LOWER_IS_BETTER else value for field, value in rank.percentiles.items()]
+                self.assertAlmostEqual(sum(oriented) / len(oriented), rank.score)
+
+    def test_cached_until_aggregates_change(self) -> None:
+        rankings = RankingCache(self.repository)
+        first = rankings.get_ranking()
+        self.assertIs(first, rankings.get_ranking())
+        self.repository.add_year_data('S0', StockMetrics(2025, 1.0, 2.0, 30.0, 10.0, 1.0))
+        CalculateAggregateDataUseCase(self.repository).execute()
+        second = rankings.get_ranking()
+        self.assertIsNot(first, second)
+        self.assertIn('S0', second.ranks[2025])
+
+    def test_concurrent_queries_rank_once(self) -> None:
+        calls = []
+        get_stocks = self.repository.get_stocks
+
+        def slow_get_stocks():
+            calls.append(None)
+            time.sleep(0.05)
+            return get_stocks()
+        self.repository.get_stocks = slow_get_stocks
+        rankings = RankingCache(self.repository)
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: rankings.get_ranking(), range(8)))
+        self.assertEqual(1, len(calls))
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_rank_portfolio_use_case(self) -> None:
+        presenter = RankingPresenter()
+        use_case = RankPortfolioUseCase(self.repository, presenter)
+        self.assertEqual(5, use_case.execute(2020, 'energy', 5))
+        scores = [rank.score for rank in presenter.ranks]
+        self.assertEqual(sorted(scores, reverse=True), scores)
+        self.assertEqual({'Energy'}, {rank.sector for rank in presenter.ranks})
+        self.assertEqual(['Energy'], [entry.sector for entry in presenter.medians])
+        use_case.execute(2020)
+        self.assertEqual(['Energy', 'Technology', 'Utilities'], [entry.sector for entry in presenter.medians])
+        self.assertEqual(0, use_case.execute(1990))
+
+
+if __name__ == '__main__':
+    unittest.main()
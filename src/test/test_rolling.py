@@ -0,0 +1,158 @@
+import os
+import random
+import statistics
+import tempfile
+import unittest
+
+from src.application.stock_interactor import CalculateAggregateDataUseCase
+from src.domain.rolling import RollingWindow, calculate_rolling_statistics, parse_window
+from src.domain.stock import GROWTH_PERIOD, Portfolio, Stock, StockMetrics
+from src.infrastructure.database import SqlitePersistence
+from src.infrastructure.persistence import BinaryPersistence, JSONPersistence
+from src.infrastructure.repository import InMemoryRepository
+from src.test.test_aggregation import create_stock
+
+
+def brute_force(stock: Stock, window: RollingWindow, year: int):
+    points = [(data_year, getattr(stock.year_data[data_year], window.field)) for data_year in sorted(stock.year_data)
+              if year - window.length < data_year <= year]
+    values = [value for _, value in points if value is not None]
+    if not values:
+        return None
+    if window.statistic == 'mean':
+        return statistics.mean(values)
+    if window.statistic == 'median':
+        return statistics.median(values)
+    if window.statistic == 'stdev':
+        return statistics.stdev(values) if len(values) > 1 else None
+    if window.statistic == 'min':
+        return min(values)
+    if window.statistic == 'max':
+        return max(values)
+    (first_year, first), (last_year, last) = points[0], points[-1]
+    if last_year == first_year or first <= 0 or last <= 0:
+        return None
+    return (last / first) ** (1 / (last_year - first_year)) - 1
+
+
+class TestRollingStatistics(unittest.TestCase):
+
+    def setUp(self) -> None:
+        generator = random.Random(17)
+        self.stocks = []
+        for index in range(10):
+            years = [year for year in range(2000, 2024) if generator.random() < 0.7]
+            generator.shuffle(years)
+            stock = create_stock(f'S{index}', years, generator)
+            for metrics in stock.year_data.values():
+                metrics.earnings_per_share = generator.uniform(-2, 10)
+                if generator.random() < 0.2:
+                    metrics.book_value_per_share = None
+            stock.calculate_aggregation()
+            self.stocks.append(stock)
+        self.windows = (parse_window('earnings_per_share:mean,median,cagr,stdev,min,max:1,3,5')
+                        + parse_window('book_value_per_share:median,max:4'))
+
+    def test_matches_brute_force(self) -> None:
+        for stock in self.stocks:
+            calculate_rolling_statistics(stock, self.windows)
+            for year, aggregate in stock.aggregate_data.items():
+                for window in self.windows:
+                    expected = brute_force(stock, window, year)
+                    value = aggregate.statistics[window.name]
+                    if expected is None:
+                        self.assertIsNone(value, window.name)
+                    else:
+                        self.assertAlmostEqual(expected, value, places=9, msg=window.name)
+
+    def test_mixed_magnitudes(self) -> None:
+        stock = Stock('BIG', 'Big', 'Energy', 1.0)
+        for year, market_capitalization in zip(range(2000, 2006), [5.3e11, 4.1e11, 2.0e9, 2.0e9 + 1e3, 2.0e9, 1.0]):
+            stock.year_data[year] = StockMetrics(year, market_capitalization, 1.0, 10.0, 5.0, 1.0)
+        stock.calculate_aggregation()
+        windows = parse_window('market_capitalization:mean,stdev:3') + parse_window('earnings_per_share:stdev:2')
+        calculate_rolling_statistics(stock, windows)
+        for year, aggregate in stock.aggregate_data.items():
+            for window in windows:
+                expected = brute_force(stock, window, year)
+                if expected is None:
+                    self.assertIsNone(aggregate.statistics[window.name])
+                else:
+                    self.assertAlmostEqual(expected, aggregate.statistics[window.name], delta=abs(expected) * 1e-12)
+        self.assertAlmostEqual(577.350269, stock.aggregate_data[2004].statistics['market_capitalization.stdev.3'], places=5)
+        self.assertEqual(0.0, stock.aggregate_data[2003].statistics['earnings_per_share.stdev.2'])
+
+    def test_ties_and_long_windows(self) -> None:
+        generator = random.Random(5)
+        stock = Stock('TIE', 'Ties', 'Energy', 1.0)
+        for year in range(1900, 2024):
+            if generator.random() < 0.8:
+                stock.year_data[year] = StockMetrics(year, 1.0, float(generator.randint(-3, 3)), 10.0, 5.0, 1.0)
+        stock.calculate_aggregation()
+        windows = parse_window('earnings_per_share:mean,median,stdev:2,7,30')
+        calculate_rolling_statistics(stock, windows)
+        for year, aggregate in stock.aggregate_data.items():
+            for window in windows:
+                expected = brute_force(stock, window, year)
+                if expected is None:
+                    self.assertIsNone(aggregate.statistics[window.name])
+                else:
+                    self.assertAlmostEqual(expected, aggregate.statistics[window.name], places=12, msg=window.name)
+
+    def test_parse_window(self) -> None:
+        self.assertEqual([RollingWindow('closing_price', 'mean', 3), RollingWindow('closing_price', 'mean', 5),
+                          RollingWindow('closing_price', 'max', 3), RollingWindow('closing_price', 'max', 5)],
+                         parse_window('closing_price:mean,max:3,5'))
+        for text in ('closing_price:mean', 'price:mean:3', 'closing_price:mode:3', 'closing_price:mean:0'):
+            with self.assertRaises(ValueError):
+                parse_window(text)
+
+    def test_incremental_update_keeps_stored_windows(self) -> None:
+        repository = InMemoryRepository(Portfolio())
+        stock = self.stocks[0]
+        repository.add_stock(Stock(stock.symbol, stock.name, stock.sector, stock.current_price, dict(stock.year_data)))
+        windows = parse_window('closing_price:mean,cagr:3')
+        CalculateAggregateDataUseCase(repository, windows=windows).execute()
+
+        repository.add_year_data(stock.symbol, StockMetrics(2024, 1.0, 2.0, 50.0, 10.0, 1.0))
+        CalculateAggregateDataUseCase(repository).execute()
+        updated = repository.get_stock(stock.symbol)
+        self.assertEqual(['closing_price.mean.3', 'closing_price.cagr.3'], list(updated.aggregate_data[2024].statistics))
+        self.assertAlmostEqual(brute_force(updated, windows[0], 2024), updated.aggregate_data[2024].statistics['closing_price.mean.3'])
+
+        CalculateAggregateDataUseCase(repository, windows=[]).execute()
+        repository.add_year_data(stock.symbol, StockMetrics(2025, 1.0, 2.0, 50.0, 10.0, 1.0))
+        CalculateAggregateDataUseCase(repository, windows=[]).execute()
+        self.assertEqual({}, repository.get_stock(stock.symbol).aggregate_data[2025].statistics)
+
+    def test_compare_year(self) -> None:
+        for stock in self.stocks:
+            for year in stock.aggregate_data:
+                expected = year - GROWTH_PERIOD
+                while expected not in stock.aggregate_data:
+                    expected += 1
+                self.assertEqual(expected, stock.get_compare_year(year))
+
+    def test_round_trips(self) -> None:
+        for stock in self.stocks:
+            calculate_rolling_statistics(stock, self.windows)
+        self.stocks[1].aggregate_data[next(iter(self.stocks[1].aggregate_data))].statistics = {}
+        portfolio = Portfolio({stock.symbol: stock for stock in self.stocks})
+        with tempfile.TemporaryDirectory() as directory:
+            for name, persistence in (('portfolio.json', JSONPersistence()), ('portfolio.bin', BinaryPersistence()),
+                                      ('portfolio.db', SqlitePersistence())):
+                filename = os.path.join(directory, name)
+                persistence.save_portfolio(filename, portfolio)
+                loaded = persistence.load_portfolio(filename)
+                for stock in self.stocks:
+                    loaded_stock = loaded.stocks[stock.symbol]
+                    for year, aggregate in stock.aggregate_data.items():
+                        self.assertEqual(aggregate.statistics, loaded_stock.aggregate_data[year].statistics, name)
+                    self.assertEqual(list(stock.aggregate_data), list(loaded_stock.aggregate_data))
+
+    def test_binary_without_statistics_stays_version_one(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'portfolio.bin')
+            BinaryPersistence().save_portfolio(filename, Portfolio({stock.symbol: stock for stock in self.stocks}))
+            with open(filename, 'rb') as binary_file:
+                self.assertEqual(b'ATTC\x01\x00', binary_file.read(6))
@@ -0,0 +1,119 @@
+import copy
+import random
+import unittest
+from dataclasses import replace
+from typing import List, Optional, Tuple
+
+from src.application.scenario import ScenarioRepository, Scenarios, parse_changes
+from src.application.stock_interactor import ApplyScenarioUseCase, CalculateAggregateDataUseCase, CompareScenariosUseCase
+from src.domain.stock import Portfolio, StockAggregate, StockMetrics
+from src.infrastructure.repository import InMemoryRepository
+from src.test.test_aggregation import create_stock
+
+
+class ScenarioPresenter:
+
+    def __init__(self) -> None:
+        self.rows: List[Tuple[str, str, Optional[StockAggregate]]] = []
+
+    def show_scenario_comparison(self, year: int, rows: List[Tuple[str, str, Optional[StockAggregate]]]) -> None:
+        self.rows = rows
+
+
+class TestScenario(unittest.TestCase):
+
+    def setUp(self) -> None:
+        generator = random.Random(13)
+        self.repository = InMemoryRepository(Portfolio())
+        for index in range(20):
+            stock = create_stock(f'S{index}', [year for year in range(2010, 2025) if generator.random() < 0.9], generator)
+            stock.sector = 'Energy' if index % 2 else 'Technology'
+            self.repository.add_stock(stock)
+        CalculateAggregateDataUseCase(self.repository).execute()
+        self.original = copy.deepcopy(self.repository.get_portfolio())
+        self.scenarios = Scenarios(self.repository)
+
+    def _expected(self, year: int, factor: float, sector: str) -> Portfolio:
+        # What changing a deep copy of the portfolio and recomputing everything gives.
+        expected = copy.deepcopy(self.original)
+        for stock in expected.stocks.values():
+            if stock.sector == sector and year in stock.year_data:
+                metrics = stock.year_data[year]
+                stock.year_data[year] = replace(metrics, earnings_per_share=metrics.earnings_per_share * factor)
+                stock.aggregate_data = {}
+                stock.calculate_aggregation()
+        return expected
+
+    def test_apply_changes_only_the_scenario(self) -> None:
+        changed = ApplyScenarioUseCase(self.repository, self.scenarios).execute('recession', 2024, 'earnings_per_share *= 80%', 'sector = energy')
+        scenario = self.scenarios.get('recession')
+
+        expected = self._expected(2024, 0.8, 'Energy')
+        self.assertEqual(len(scenario.stocks), changed)
+        self.assertEqual({symbol for symbol, stock in expected.stocks.items() if stock.sector == 'Energy' and 2024 in stock.year_data}, set(scenario.stocks))
+        for stock in scenario.get_stocks():
+            self.assertEqual(expected.stocks[stock.symbol].aggregate_data, stock.aggregate_data, stock.symbol)
+        self.assertEqual(self.original, self.repository.get_portfolio())
+        for symbol, stock in scenario.stocks.items():
+            base = self.repository.get_stock(symbol)
+            self.assertIs(base.year_data, stock.year_data.maps[1])
+            self.assertEqual([2024], list(stock.year_data.maps[0]))
+        unchanged = next(symbol for symbol in self.original.stocks if symbol not in scenario.stocks)
+        self.assertIs(self.repository.get_stock(unchanged), scenario.get_stock(unchanged))
+
+    def test_scenarios_side_by_side(self) -> None:
+        apply = ApplyScenarioUseCase(self.repository, self.scenarios)
+        apply.execute('mild', 2024, 'earnings_per_share *= 0.9', 'sector = energy')
+        apply.execute('severe', 2024, 'earnings_per_share *= 0.5', 'sector = energy')
+        mild = self._expected(2024, 0.9, 'Energy')
+        severe = self._expected(2024, 0.5, 'Energy')
+
+        presenter = ScenarioPresenter()
+        CompareScenariosUseCase(self.repository, self.scenarios, presenter).execute(2024)
+        symbols = sorted(self.scenarios.get('mild').stocks)
+        self.assertEqual([(symbol, name) for symbol in symbols for name in ('base', 'mild', 'severe')],
+                         [(symbol, name) for symbol, name, _ in presenter.rows])
+        for symbol, name, aggregate in presenter.rows:
+            portfolio = {'base': self.original, 'mild': mild, 'severe': severe}[name]
+            self.assertEqual(portfolio.stocks[symbol].aggregate_data[2024], aggregate, (symbol, name))
+        with self.assertRaises(ValueError):
+            CompareScenariosUseCase(self.repository, self.scenarios, presenter).execute(2024, ['missing'])
+
+    def test_follows_changes_of_the_base(self) -> None:
+        ApplyScenarioUseCase(self.repository, self.scenarios).execute('recession', 2024, 'earnings_per_share *= 80%', 'sector = energy')
+        scenario = self.scenarios.get('recession')
+        symbol = next(iter(scenario.stocks))
+        self.repository.add_year_data(symbol, StockMetrics(2023, 1.0, 9.0, 30.0, 10.0, 1.0))
+        CalculateAggregateDataUseCase(self.repository).execute()
+
+        CompareScenariosUseCase(self.repository, self.scenarios, ScenarioPresenter()).execute(2024)
+        expected = copy.deepcopy(self.repository.get_stock(symbol))
+        metrics = expected.year_data[2024]
+        expected.year_data[2024] = replace(metrics, earnings_per_share=metrics.earnings_per_share * 0.8)
+        expected.aggregate_data = {}
+        expected.calculate_aggregation()
+        self.assertEqual(expected.aggregate_data, scenario.get_stock(symbol).aggregate_data)
+
+    def test_screens_the_scenario(self) -> None:
+        scenario = ScenarioRepository(self.repository)
+        symbol = next(symbol for symbol, stock in self.original.stocks.items() if 2024 in stock.year_data)
+        scenario.add_year_data(symbol, replace(self.original.stocks[symbol].year_data[2024], earnings_per_share=1000.0))
+        CalculateAggregateDataUseCase(scenario).execute()
+        self.assertEqual({symbol}, scenario.find_symbols(2024, 'aggregate', 'earnings_per_share', '>', 100.0))
+        self.assertEqual(set(), self.repository.find_symbols(2024, 'aggregate', 'earnings_per_share', '>', 100.0))
+        self.assertEqual(self.repository.get_sector_symbols('energy'), scenario.get_sector_symbols('energy'))
+
+    def test_parse_changes(self) -> None:
+        changes = parse_changes('earnings_per_share *= 80% and dividend_per_share = 0 AND closing_price -= 2')
+        metrics = StockMetrics(2024, 1.0, 2.0, 30.0, None, 1.5)
+        for change in changes:
+            metrics = change.apply(metrics)
+        self.assertEqual(StockMetrics(2024, 1.0, 1.6, 28.0, None, 0.0), metrics)
+        self.assertIsNone(parse_changes('book_value_per_share *= 2')[0].apply(metrics).book_value_per_share)
+        for expression in ('pe_ratio *= 2', 'earnings_per_share < 2', 'earnings_per_share *= x'):
+            with self.assertRaises(ValueError):
+                parse_changes(expression)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from src.application.screen import Condition, SortKey, parse_filter, parse_sort
+
+
+class TestScreenExpressions(unittest.TestCase):
+
+    def test_parse_filter(self) -> None:
+        conditions = parse_filter('pe_ratio < 10 and dividend_yield>5% AND metrics.closing_price >= 20 and sector = "Oil & Gas"')
+        self.assertEqual([
+            Condition('aggregate', 'pe_ratio', '<', 10.0),
+            Condition('aggregate', 'dividend_yield', '>', 0.05),
+            Condition('metrics', 'closing_price', '>=', 20.0),
+            Condition('sector', 'sector', '=', 'Oil & Gas'),
+        ], conditions)
+        self.assertEqual([], parse_filter('  '))
+
+    def test_parse_filter_errors(self) -> None:
+        for expression in ['pe_ratio 10', 'pe_ratio <', 'pe_ratio < 10 or growth > 0', 'pe_ratio < 10 and', 'volume > 10',
+                           'pe_ratio < ten', 'sector > Energy']:
+            with self.assertRaises(ValueError, msg=expression):
+                parse_filter(expression)
+
+    def test_parse_sort(self) -> None:
+        self.assertEqual([SortKey('aggregate', 'dividend_yield', True), SortKey('metrics', 'closing_price', False)],
+                         parse_sort('dividend_yield desc, closing_price'))
+        with self.assertRaises(ValueError):
+            parse_sort('pe_ratio sideways')
+
+
+if __name__ == '__main__':
+    unittest.main()
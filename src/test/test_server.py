@@ -0,0 +1,130 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.application.stock_interactor import AddStockYearDataUseCase, BulkImportUseCase, CalculateAggregateDataUseCase, CreateStockUseCase, GetPortfolioValuationUseCase, GetStockAggregateDataUseCase, GetStockCurrentDataUseCase, GetStockYearDataUseCase, LoadPortfolioUseCase, SavePortfolioUseCase, ScreenStocksUseCase
+from src.application.valuation import ValuationCache
+from src.domain.stock import Portfolio
+from src.infrastructure.cli import StockCmd
+from src.infrastructure.controller_cli import CliController
+from src.infrastructure.importer import FileRecordReader
+from src.infrastructure.presenter import Presenter
+from src.infrastructure.repository import InMemoryRepository
+from src.infrastructure.server import QueryClient, QueryServer, ReadWriteLock, RemoteStockCmd, parse_address
+from src.infrastructure.view import CliView
+from src.test.test_stock_interactor import RecordingPersistence
+
+
+class TestQueryServer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.repository = InMemoryRepository(Portfolio())
+        self.persistence = RecordingPersistence()
+        presenter = Presenter(CliView('tsv'))
+        valuations = ValuationCache(self.repository)
+        controller = CliController(CreateStockUseCase(self.repository), AddStockYearDataUseCase(self.repository),
+                                   CalculateAggregateDataUseCase(self.repository), GetStockYearDataUseCase(self.repository, presenter),
+                                   GetStockAggregateDataUseCase(self.repository, presenter),
+                                   GetStockCurrentDataUseCase(self.repository, presenter, valuations),
+                                   SavePortfolioUseCase(self.repository, self.persistence), LoadPortfolioUseCase(self.repository, self.persistence),
+                                   BulkImportUseCase(self.repository, self.persistence, FileRecordReader()),
+                                   ScreenStocksUseCase(self.repository, presenter),
+                                   GetPortfolioValuationUseCase(self.repository, presenter, valuations), filename='portfolio.json')
+        self.server = QueryServer(StockCmd(controller), ('127.0.0.1', 0), save_interval=60.0)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.client = QueryClient(self.server.address)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        if self.thread.is_alive():
+            self._stop()
+
+    def _stop(self) -> None:
+        self.server.shutdown()
+        self.thread.join()
+
+    def test_writes_are_visible_to_reads_and_saved_in_batches(self) -> None:
+        self.client.execute('create_stock ANDR Andritz Industrials 54.25')
+        self.client.execute('add_stock_year_data ANDR 2020 3.897 2.08 37.48 12.64 1.00')
+        self.client.execute('add_stock_year_data ANDR 2021 - 2.50 40.00 - 1.10')
+
+        output = self.client.execute('get_stock_aggregate_data ANDR')
+        self.assertEqual(['Year', '2021', '2020'], [line.split('\t')[0] for line in output.splitlines()])
+        self.assertEqual({}, self.repository.get_dirty_years())
+        self.assertEqual([], self.persistence.saves)
+
+        self.server.flush()
+        self.assertEqual([2], self.persistence.saves)
+        self.client.execute('create_stock OMV OMV Energy 48.10')
+        self._stop()
+        self.assertEqual([2, 2], self.persistence.saves)
+
+    def test_concurrent_reads(self) -> None:
+        self.client.execute('create_stock ANDR Andritz Industrials 54.25')
+        self.client.execute('add_stock_year_data ANDR 2020 3.897 2.08 37.48 12.64 1.00')
+
+        def query(_: int) -> str:
+            client = QueryClient(self.server.address)
+            try:
+                return client.execute('screen 2020 "pe_ratio < 20"')
+            finally:
+                client.close()
+
+        with ThreadPoolExecutor(8) as executor:
+            outputs = list(executor.map(query, range(32)))
+        self.assertEqual(1, len(set(outputs)))
+        self.assertIn('ANDR\tAndritz', outputs[0])
+
+    def test_errors(self) -> None:
+        for line in ('unknown_command', 'quit', 'add_stock_year_data ANDR'):
+            with self.assertRaises(ValueError):
+                self.client.execute(line)
+        self.assertEqual('', self.client.execute('get_stock_year_data ANDR'))
+
+    def test_remote_stock_cmd(self) -> None:
+        cli = RemoteStockCmd(self.client)
+        errors = cli.run_script(['create_stock ANDR Andritz Industrials 54.25', 'unknown_command', 'quit', 'create_stock OMV OMV Energy 48.10'])
+        self.assertEqual(1, errors)
+        self.assertEqual(['ANDR'], [stock.symbol for stock in self.repository.get_stocks()])
+
+
+class TestReadWriteLock(unittest.TestCase):
+
+    def test_writer_excludes_readers(self) -> None:
+        lock = ReadWriteLock()
+        events = []
+
+        def write() -> None:
+            with lock.write():
+                events.append('write start')
+                time.sleep(0.02)
+                events.append('write end')
+
+        with lock.read():
+            writer = threading.Thread(target=write)
+            writer.start()
+            time.sleep(0.01)
+            events.append('read')
+
+        def read() -> None:
+            with lock.read():
+                events.append('late read')
+
+        time.sleep(0.005)
+        reader = threading.Thread(target=read)
+        reader.start()
+        writer.join()
+        reader.join()
+        self.assertEqual(['read', 'write start', 'write end', 'late read'], events)
+
+    def test_parse_address(self) -> None:
+        self.assertEqual(('127.0.0.1', 8765), parse_address('8765'))
+        self.assertEqual(('0.0.0.0', 80), parse_address('0.0.0.0:80'))
+        with self.assertRaises(ValueError):
+            parse_address('localhost')
+
+
+if __name__ == '__main__':
+    unittest.main()
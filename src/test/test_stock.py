@@ -1,6 +1,7 @@
+import copy
 import unittest
 
-from src.domain.stock import Stock, StockMetrics
+from src.domain.stock import Stock, StockAggregate, StockMetrics
 
 
 class TestStock(unittest.TestCase):
@@ -33,6 +34,22 @@ class TestStock(unittest.TestCase):
         self.assertAlmostEqual(0.0130, self.metrics[2019].dividend_yield, 4)
         self.assertAlmostEqual(0.0386, self.metrics[2018].dividend_yield, 4)
 
+    def test_ratios_follow_input_changes(self) -> None:
+        metrics = self.metrics[2020]
+        self.assertAlmostEqual(18.02, metrics.pe_ratio, 2)
+        metrics.earnings_per_share = 0.0
+        self.assertIsNone(metrics.pe_ratio)
+        metrics.closing_price = 25.28
+        metrics.book_value_per_share = None
+        self.assertIsNone(metrics.price_per_book_value)
+        self.assertAlmostEqual(0.0396, metrics.dividend_yield, 4)
+        self.assertFalse(hasattr(metrics, '__dict__'))
+
+        aggregate = StockAggregate(2020, 1.85, 20.26, None, 3.08, 0.0285)
+        self.assertAlmostEqual(62.40, aggregate.multiplier, 2)
+        aggregate.price_per_book_value = None
+        self.assertIsNone(aggregate.multiplier)
+
     def test_aggregation(self) -> None:
         aggregation = self.stock.create_aggregation(2020)
         self.assertEqual(2020, aggregation.year)
@@ -50,6 +67,17 @@ class TestStock(unittest.TestCase):
         self.assertIn(2019, self.stock.aggregate_data)
         self.assertIn(2020, self.stock.aggregate_data)
 
+    def test_update_aggregation(self):
+        self.stock.calculate_aggregation()
+        self.stock.year_data[2014] = StockMetrics(year=2014, market_capitalization=4.1, earnings_per_share=2.31, closing_price=41.02, book_value_per_share=11.2, dividend_per_share=1.2)
+        self.stock.year_data[2017] = StockMetrics(year=2017, market_capitalization=4.896, earnings_per_share=2.61, closing_price=47.09, book_value_per_share=None, dividend_per_share=1.55)
+        expected = copy.deepcopy(self.stock)
+        expected.calculate_aggregation()
+
+        self.stock.update_aggregation([2014, 2017])
+        self.assertEqual(expected.aggregate_data, self.stock.aggregate_data)
+        self.assertEqual(list(expected.aggregate_data), list(self.stock.aggregate_data))
+
     def test_growth(self):
         self.stock.calculate_aggregation()
         self.assertAlmostEqual(0.3636, self.stock.growth, 4)
@@ -0,0 +1,323 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import date
+from typing import Dict, List, Tuple
+
+from src.application.stock_interactor import AddStockYearDataUseCase, BulkImportUseCase, CalculateAggregateDataUseCase, CreateStockUseCase, ScreenStocksUseCase, UpdateCurrentPricesUseCase
+from src.domain.prices import PriceSeries
+from src.domain.rolling import parse_window
+from src.domain.stock import Portfolio, Stock, StockMetrics
+from src.infrastructure.database import SqliteRepository
+from src.infrastructure.importer import FileRecordReader
+from src.infrastructure.persistence import BinaryPersistence, JSONPersistence
+from src.infrastructure.quotes import FileQuoteProvider
+from src.infrastructure.repository import InMemoryRepository
+
+
+class RecordingPersistence:
+
+    def __init__(self) -> None:
+        self.saves: List[int] = []
+
+    def save_portfolio(self, filename: str, portfolio: Portfolio) -> None:
+        self.saves.append(sum(len(stock.year_data) for stock in portfolio.stocks.values()))
+
+    def load_portfolio(self, filename: str) -> Portfolio:
+        return Portfolio()
+
+
+class RecordingPresenter:
+
+    def __init__(self) -> None:
+        self.screens: List[Tuple[int, List[str], List[Tuple[str, str]]]] = []
+
+    def show_screen_results(self, year: int, stocks: List[Stock], fields: List[Tuple[str, str]]) -> None:
+        self.screens.append((year, [stock.symbol for stock in stocks], fields))
+
+
+class FlakyQuoteProvider:
+
+    def __init__(self, quotes: Dict[str, float], failures: int) -> None:
+        self.quotes = quotes
+        self.failures = failures
+        self.requests: List[List[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        self.requests.append(symbols)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('quote source unavailable')
+        return {symbol: self.quotes[symbol] for symbol in symbols if symbol in self.quotes}
+
+
+class TestCalculateAggregateDataUseCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.repository = InMemoryRepository(Portfolio())
+        CreateStockUseCase(self.repository).execute('ANDR', 'Andritz', 'Industrials', 54.25)
+        CreateStockUseCase(self.repository).execute('OMV', 'OMV', 'Energy', 48.10)
+        self.add_year_data = AddStockYearDataUseCase(self.repository)
+        for year in range(2010, 2021):
+            self.add_year_data.execute('ANDR', year, 4.0, 2.0 + year % 3, 40.0, 12.0, 1.5)
+            self.add_year_data.execute('OMV', year, 12.0, 4.0 + year % 4, 45.0, 30.0, 2.0)
+        self.use_case = CalculateAggregateDataUseCase(self.repository)
+        self.use_case.execute()
+
+    def test_clears_dirty_years(self) -> None:
+        self.assertEqual({}, self.repository.get_dirty_years())
+
+    def test_recomputes_only_affected_years(self) -> None:
+        andritz = self.repository.get_stock('ANDR')
+        omv = self.repository.get_stock('OMV')
+        before = dict(andritz.aggregate_data)
+        omv_before = dict(omv.aggregate_data)
+
+        self.add_year_data.execute('ANDR', 2012, 4.0, 1.0, 38.0, 11.0, 1.0)
+        self.assertEqual({'ANDR': {2012}}, self.repository.get_dirty_years())
+        self.use_case.execute()
+
+        for year in range(2010, 2012):
+            self.assertIs(before[year], andritz.aggregate_data[year])
+        for year in range(2012, 2017):
+            self.assertIsNot(before[year], andritz.aggregate_data[year])
+        for year in range(2017, 2021):
+            self.assertIs(before[year], andritz.aggregate_data[year])
+        self.assertEqual(omv_before, omv.aggregate_data)
+        for year in omv_before:
+            self.assertIs(omv_before[year], omv.aggregate_data[year])
+
+    def test_skips_stocks_with_matching_fingerprint(self) -> None:
+        andritz = self.repository.get_stock('ANDR')
+        self.assertEqual(andritz.calculate_fingerprint(), andritz.aggregate_fingerprint)
+        self.repository.set_portfolio(JSONPersistence().load_portfolio(self._save()))
+        self.assertEqual({}, self.repository.get_dirty_years())
+        omv = self.repository.get_stock('OMV')
+        omv.year_data[2020].closing_price = 50.0
+        before = dict(self.repository.get_stock('ANDR').aggregate_data)
+        omv_before = dict(omv.aggregate_data)
+
+        self.repository.add_stock(self.repository.get_stock('ANDR'))
+        self.repository.add_stock(omv)
+        self.use_case.execute()
+        for year in before:
+            self.assertIs(before[year], self.repository.get_stock('ANDR').aggregate_data[year])
+        self.assertIsNot(omv_before[2020], omv.aggregate_data[2020])
+        self.assertEqual(omv.calculate_fingerprint(), omv.aggregate_fingerprint)
+
+        self.repository.add_stock(self.repository.get_stock('ANDR'))
+        CalculateAggregateDataUseCase(self.repository, windows=parse_window('closing_price:mean:3')).execute()
+        self.assertIn('closing_price.mean.3', self.repository.get_stock('ANDR').aggregate_data[2020].statistics)
+
+    def test_load_marks_only_unaggregated_stocks(self) -> None:
+        self.repository.get_stock('OMV').aggregate_fingerprint = None
+        CreateStockUseCase(self.repository).execute('EQU', 'Equinor', 'Energy', 30.0)
+        self.repository.set_portfolio(BinaryPersistence(lazy=True).load_portfolio(self._save('portfolio.bin')))
+        self.addCleanup(self.repository.get_portfolio().stocks.close)
+        self.assertEqual({'OMV': None}, self.repository.get_dirty_years())
+        self.assertEqual(set(), set(self.repository.get_portfolio().stocks.stocks))
+
+        self.add_year_data.execute('ANDR', 2021, 4.0, 2.0, 40.0, 12.0, 1.5)
+        self.use_case.execute()
+        self.assertEqual({'ANDR', 'OMV'}, set(self.repository.get_portfolio().stocks.stocks))
+        self.assertIn(2021, self.repository.get_stock('ANDR').aggregate_data)
+
+    def _save(self, name: str = 'portfolio.json') -> str:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        filename = os.path.join(directory.name, name)
+        (BinaryPersistence() if name.endswith('.bin') else JSONPersistence()).save_portfolio(filename, self.repository.get_portfolio())
+        return filename
+
+
+class TestScreenStocksUseCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.repository = InMemoryRepository(Portfolio())
+        self.presenter = RecordingPresenter()
+        create_stock = CreateStockUseCase(self.repository)
+        add_year_data = AddStockYearDataUseCase(self.repository)
+        for symbol, sector, earnings_per_share, dividend_per_share in [('ANDR', 'Industrials', 4.0, 2.0), ('OMV', 'Energy', 5.0, 3.0),
+                                                                       ('EQU', 'Energy', 1.0, 0.5), ('VER', 'Utilities', 2.0, 1.0)]:
+            create_stock.execute(symbol, symbol, sector, 40.0)
+            add_year_data.execute(symbol, 2023, 1.0, earnings_per_share, 40.0, 20.0, dividend_per_share)
+        self.add_year_data = add_year_data
+        CalculateAggregateDataUseCase(self.repository).execute()
+        self.use_case = ScreenStocksUseCase(self.repository, self.presenter)
+
+    def test_filter_and_sort(self) -> None:
+        self.use_case.execute(2023, 'pe_ratio < 20 and dividend_yield >= 5%', 'dividend_yield desc')
+        year, symbols, fields = self.presenter.screens[-1]
+        self.assertEqual(['OMV', 'ANDR'], symbols)
+        self.assertEqual(('aggregate', 'pe_ratio'), fields[1])
+
+        self.use_case.execute(2023, 'sector = energy', 'metrics.closing_price, earnings_per_share desc', limit=1)
+        year, symbols, fields = self.presenter.screens[-1]
+        self.assertEqual(['OMV'], symbols)
+        self.assertIn(('metrics', 'closing_price'), fields)
+
+    def test_index_follows_recomputed_aggregates(self) -> None:
+        self.use_case.execute(2023, 'pe_ratio > 30')
+        self.assertEqual(['EQU'], self.presenter.screens[-1][1])
+
+        self.add_year_data.execute('VER', 2023, 1.0, 1.0, 40.0, 20.0, 1.0)
+        CalculateAggregateDataUseCase(self.repository).execute()
+        self.use_case.execute(2023, 'pe_ratio > 30')
+        self.assertEqual(['EQU', 'VER'], self.presenter.screens[-1][1])
+
+        CreateStockUseCase(self.repository).execute('VER', 'VER', 'Energy', 40.0)
+        self.use_case.execute(2023, 'sector = Energy and pe_ratio > 0')
+        self.assertEqual(['EQU', 'OMV'], self.presenter.screens[-1][1])
+
+
+    def test_lists_only_stocks_with_aggregates_for_the_year(self) -> None:
+        CreateStockUseCase(self.repository).execute('SBO', 'SBO', 'Energy', 40.0)
+        self.add_year_data.execute('SBO', 2022, 1.0, 2.0, 40.0, 20.0, 1.0)
+        CalculateAggregateDataUseCase(self.repository).execute()
+        for filter_expression in ('', 'sector = Energy'):
+            self.use_case.execute(2023, filter_expression)
+            self.assertNotIn('SBO', self.presenter.screens[-1][1])
+        self.assertEqual(['EQU', 'OMV'], self.presenter.screens[-1][1])
+
+
+class TestUpdateCurrentPricesUseCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.repository = InMemoryRepository(Portfolio())
+        self.quotes = {}
+        for number in range(10):
+            CreateStockUseCase(self.repository).execute(f'S{number}', f'Stock {number}', 'Energy', 10.0)
+            self.quotes[f'S{number}'] = 20.0 + number
+        self.time = 0.0
+
+    def test_batches_with_bounded_concurrency(self) -> None:
+        provider = FlakyQuoteProvider(self.quotes, failures=0)
+        use_case = UpdateCurrentPricesUseCase(self.repository, provider, batch_size=3, concurrency=2, retry_delay=0)
+
+        self.assertEqual(10, use_case.execute())
+        self.assertEqual([3, 3, 3, 1], [len(request) for request in provider.requests])
+        self.assertEqual(2, provider.max_in_flight)
+        self.assertEqual(29.0, self.repository.get_stock('S9').current_price)
+
+    def test_retries_and_reports_missing_quotes(self) -> None:
+        del self.quotes['S4']
+        provider = FlakyQuoteProvider(self.quotes, failures=2)
+        use_case = UpdateCurrentPricesUseCase(self.repository, provider, batch_size=10, retries=2, retry_delay=0)
+
+        self.assertEqual(9, use_case.execute())
+        self.assertEqual(3, len(provider.requests))
+        self.assertEqual(['S4'], use_case.failed)
+        self.assertEqual(10.0, self.repository.get_stock('S4').current_price)
+
+        provider.failures = 3
+        self.assertEqual(0, use_case.execute(['S4']))
+        self.assertEqual(['S4'], use_case.failed)
+
+    def test_skips_symbols_within_ttl(self) -> None:
+        provider = FlakyQuoteProvider(self.quotes, failures=0)
+        use_case = UpdateCurrentPricesUseCase(self.repository, provider, ttl=60, clock=lambda: self.time)
+        use_case.execute(['S1', 'S2'])
+        self.time = 30.0
+        use_case.execute()
+        self.time = 90.0
+        use_case.execute(['S1'])
+
+        self.assertEqual([['S1', 'S2'], ['S0', 'S3', 'S4', 'S5', 'S6', 'S7', 'S8', 'S9'], ['S1']], provider.requests)
+
+    def test_file_provider(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'quotes.csv')
+            with open(filename, 'w') as quotes_file:
+                quotes_file.write('symbol,price\nS1,12.5\nS2,13\n')
+            provider = FileQuoteProvider(filename)
+
+            self.assertEqual({'S1': 12.5}, asyncio.run(provider.fetch_quotes(['S1', 'S3'])))
+            with open(filename, 'w') as quotes_file:
+                quotes_file.write('symbol,price\nS1,14.0\n')
+            os.utime(filename, ns=(0, 1))
+            self.assertEqual({'S1': 14.0}, asyncio.run(provider.fetch_quotes(['S1', 'S2'])))
+
+
+class TestBulkImportUseCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.repository = InMemoryRepository(Portfolio())
+        self.persistence = RecordingPersistence()
+        self.use_case = BulkImportUseCase(self.repository, self.persistence, FileRecordReader(), batch_size=2)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _write(self, name: str, content: str) -> str:
+        filename = os.path.join(self.directory.name, name)
+        with open(filename, 'w') as import_file:
+            import_file.write(content)
+        return filename
+
+    def test_import_csv(self) -> None:
+        filename = self._write('stocks.csv', 'symbol,name,sector,current_price,year,market_capitalization,earnings_per_share,closing_price,book_value_per_share,dividend_per_share\n'
+                                             'ANDR,Andritz,Industrials,54.25,,,,,,\n'
+                                             'ANDR,,,,2020,3.897,2.08,37.48,12.64,1.00\n'
+                                             'ANDR,,,,2019,,1.27,38.40,,0.50\n'
+                                             'ANDR,,,,2018,4.172,2.20,40.12,13.02,1.55\n')
+
+        self.assertEqual(4, self.use_case.execute(filename, 'portfolio.json', checkpoint_interval=2))
+        stock = self.repository.get_stock('ANDR')
+        self.assertEqual('Andritz', stock.name)
+        self.assertEqual(StockMetrics(2019, None, 1.27, 38.40, None, 0.50), stock.year_data[2019])
+        self.assertEqual([1, 3], self.persistence.saves)
+
+    def test_import_jsonl_keeps_existing_year_data(self) -> None:
+        CreateStockUseCase(self.repository).execute('OMV', 'OMV', 'Energy', 48.10)
+        AddStockYearDataUseCase(self.repository).execute('OMV', 2019, 12.0, 4.0, 45.0, 30.0, 2.0)
+        filename = self._write('stocks.jsonl', '{"symbol": "OMV", "name": "OMV AG", "sector": "Energy", "current_price": 49.5}\n'
+                                               '\n'
+                                               '{"symbol": "OMV", "year": 2020, "earnings_per_share": 4.5, "closing_price": 41.0, "dividend_per_share": 2.3}\n')
+
+        self.assertEqual(2, self.use_case.execute(filename))
+        stock = self.repository.get_stock('OMV')
+        self.assertEqual('OMV AG', stock.name)
+        self.assertEqual([2019, 2020], list(stock.year_data))
+        self.assertEqual([], self.persistence.saves)
+
+    def test_redefinition_keeps_prices_and_fingerprint(self) -> None:
+        filename = self._write('stocks.csv', 'symbol,name,sector,current_price\nOMV,OMV AG,Energy,49.5\n')
+        database = SqliteRepository(os.path.join(self.directory.name, 'portfolio.db'))
+        self.addCleanup(database.close)
+        for repository in (InMemoryRepository(Portfolio()), database):
+            CreateStockUseCase(repository).execute('OMV', 'OMV', 'Energy', 48.10)
+            AddStockYearDataUseCase(repository).execute('OMV', 2019, 12.0, 4.0, 45.0, 30.0, 2.0)
+            CalculateAggregateDataUseCase(repository).execute()
+            repository.add_prices('OMV', PriceSeries([date(2024, 1, 2).toordinal()], [47.5]))
+            fingerprint = repository.get_stock('OMV').aggregate_fingerprint
+
+            BulkImportUseCase(repository, self.persistence, FileRecordReader()).execute(filename)
+            stock = repository.get_stock('OMV')
+            self.assertEqual(('OMV AG', 49.5, fingerprint), (stock.name, stock.current_price, stock.aggregate_fingerprint))
+            self.assertEqual([(date(2024, 1, 2), 47.5)], list(repository.get_prices('OMV')))
+
+    def test_invalid_record(self) -> None:
+        filename = self._write('stocks.jsonl', '{"symbol": "OMV", "year": 2020, "earnings_per_share": "n/a"}\n')
+        with self.assertRaisesRegex(ValueError, 'Record 1'):
+            self.use_case.execute(filename)
+
+    def test_unknown_symbol(self) -> None:
+        filename = self._write('stocks.jsonl', '{"symbol": "OMV", "name": "OMV AG", "sector": "Energy", "current_price": 49.5}\n'
+                                               '{"symbol": "OMV", "year": 2020, "earnings_per_share": 4.5, "closing_price": 41.0, "dividend_per_share": 2.3}\n'
+                                               '{"symbol": "VOE", "year": 2020, "earnings_per_share": 1.5, "closing_price": 30.0, "dividend_per_share": 1.0}\n'
+                                               '{"symbol": "OMV", "year": 2021, "earnings_per_share": 4.6, "closing_price": 42.0, "dividend_per_share": 2.4}\n')
+        with self.assertRaisesRegex(ValueError, 'Record 3: unknown symbol VOE'):
+            self.use_case.execute(filename)
+        self.assertEqual([2020], list(self.repository.get_stock('OMV').year_data))
+
+
+if __name__ == '__main__':
+    unittest.main()
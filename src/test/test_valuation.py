@@ -0,0 +1,86 @@
+import random
+import unittest
+from typing import List
+
+from src.application.stock_interactor import CalculateAggregateDataUseCase, GetPortfolioValuationUseCase
+from src.application.valuation import ValuationCache
+from src.domain.stock import Portfolio, Stock, StockMetrics, StockValuation
+from src.infrastructure.repository import InMemoryRepository
+from src.test.test_aggregation import create_stock
+
+
+class ValuationPresenter:
+
+    def __init__(self) -> None:
+        self.valuations: List[StockValuation] = []
+
+    def show_valuations(self, stocks: List[Stock], valuations: List[StockValuation]) -> None:
+        self.valuations = valuations
+
+
+class TestValuation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        generator = random.Random(11)
+        self.repository = InMemoryRepository(Portfolio())
+        for index in range(30):
+            stock = create_stock(f'S{index}', [year for year in range(2000, 2024) if generator.random() < 0.8], generator)
+            stock.current_price = generator.choice([None, round(generator.uniform(5, 80), 2)])
+            self.repository.add_stock(stock)
+        self.repository.add_stock(Stock('EMPTY', 'Empty', 'Energy', 1.0))
+        CalculateAggregateDataUseCase(self.repository).execute()
+
+    def test_calculate_valuation(self) -> None:
+        stock = Stock('ANDR', 'Andritz', 'Industrials', 60.0)
+        stock.year_data[2021] = StockMetrics(2021, 3.0, 2.0, 40.0, 12.0, 1.5)
+        stock.year_data[2022] = StockMetrics(2022, 3.0, 4.0, 50.0, 15.0, 3.0)
+        stock.calculate_aggregation()
+
+        self.assertEqual(StockValuation('ANDR', 2022, 60.0, 20.0, 4.0, 80.0, 0.05, stock.aggregate_data[2022].growth),
+                         stock.calculate_valuation())
+        self.assertIsNone(Stock('EMPTY', 'Empty', 'Energy', 1.0).calculate_valuation())
+
+    def test_cache_follows_prices_and_aggregates(self) -> None:
+        valuations = ValuationCache(self.repository)
+        first = valuations.get_valuations()
+        symbol, other = list(first)[:2]
+
+        self.repository.update_current_price(symbol, 99.0)
+        second = valuations.get_valuations()
+        self.assertEqual(99.0, second[symbol].current_price)
+        self.assertIs(first[other], second[other])
+
+        self.repository.add_year_data(other, StockMetrics(2024, 1.0, 2.0, 30.0, 10.0, 1.0))
+        CalculateAggregateDataUseCase(self.repository).execute()
+        third = valuations.get_valuations()
+        self.assertEqual(2024, third[other].year)
+        self.assertIsNot(second[symbol], third[symbol])
+        self.assertEqual(second[symbol], third[symbol])
+
+    def test_single_valuation(self) -> None:
+        valuations = ValuationCache(self.repository)
+        symbol = next(iter(valuations.get_valuations()))
+        self.assertIs(valuations.get_valuations()[symbol], valuations.get_valuation(symbol))
+
+        replaced = create_stock(symbol, [2000, 2001], random.Random(3))
+        replaced.current_price = 10.0
+        self.repository.add_stock(replaced)
+        replaced.calculate_aggregation()
+        self.assertEqual(replaced.calculate_valuation(), valuations.get_valuation(symbol))
+
+        del self.repository.get_portfolio().stocks[symbol]
+        self.assertIsNone(valuations.get_valuation(symbol))
+        self.assertNotIn(symbol, valuations.get_valuations())
+        self.assertNotIn(symbol, valuations.entries)
+
+    def test_portfolio_valuation(self) -> None:
+        presenter = ValuationPresenter()
+        shown = GetPortfolioValuationUseCase(self.repository, presenter, ValuationCache(self.repository)).execute()
+
+        expected = [stock.calculate_valuation() for stock in self.repository.get_stocks()]
+        self.assertEqual([valuation for valuation in expected if valuation is not None], presenter.valuations)
+        self.assertEqual(len(presenter.valuations), shown)
+
+
+if __name__ == '__main__':
+    unittest.main()
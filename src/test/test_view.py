@@ -0,0 +1,54 @@
+import io
+import unittest
+
+from src.infrastructure.presenter import Presenter
+from src.infrastructure.view import CliView
+
+
+def generate_rows(count: int):
+    for number in range(count):
+        yield [f'S{number}', f'{number * 1.5:.2f}']
+
+
+class TestCliView(unittest.TestCase):
+
+    def _show(self, view: CliView, count: int) -> str:
+        view.output = io.StringIO()
+        view.show_tabular_data(['Symbol', 'Value'], generate_rows(count))
+        return view.output.getvalue()
+
+    def test_delimited_formats(self) -> None:
+        self.assertEqual('Symbol\tValue\nS0\t0.00\nS1\t1.50\n', self._show(CliView('tsv'), 2))
+        self.assertEqual('Symbol,Value\nS0,0.00\n', self._show(CliView('csv'), 1))
+
+    def test_fixed_width(self) -> None:
+        self.assertEqual('Symbol  Value\n    S0   0.00\n    S1   1.50\n', self._show(CliView('fixed'), 2))
+
+    def test_limit_and_offset(self) -> None:
+        rows = generate_rows(1000)
+        view = CliView('csv', limit=2, offset=3, output=io.StringIO())
+        view.show_tabular_data(['Symbol', 'Value'], rows, listing=True)
+
+        self.assertEqual('Symbol,Value\nS3,4.50\nS4,6.00\n', view.output.getvalue())
+        self.assertEqual(['S5', '7.50'], next(rows))
+        self.assertEqual('Symbol,Value\nS0,0.00\nS1,1.50\nS2,3.00\nS3,4.50\n', self._show(view, 4))
+
+    def test_scenario_comparison_is_not_sliced(self) -> None:
+        view = CliView('csv', limit=1, output=io.StringIO())
+        Presenter(view).show_scenario_comparison(2024, [('OMV', 'base', None), ('OMV', 'rates', None)])
+        self.assertEqual(['OMV,base,-,-,-,-,-,-', 'OMV,rates,-,-,-,-,-,-'], view.output.getvalue().splitlines()[1:])
+
+    def test_table_pages(self) -> None:
+        output = self._show(CliView(page_size=2), 5)
+
+        self.assertEqual(3, output.count('| Symbol | Value |'))
+        self.assertIn('|   S4   |  6.00 |', output)
+        self.assertEqual(1, self._show(CliView(), 0).count('| Symbol | Value |'))
+
+    def test_unknown_format(self) -> None:
+        with self.assertRaises(ValueError):
+            CliView('xml')
+
+
+if __name__ == '__main__':
+    unittest.main()